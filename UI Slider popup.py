@@ -1,38 +1,127 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, simpledialog
-import rasterio
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.patches import Rectangle
+from matplotlib.patches import Rectangle, PathPatch
 import matplotlib.patheffects as plt_effects
-import warnings
-import re, subprocess
 import ttkbootstrap as ttkb
 import tkinter.messagebox
 import os
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 import sys
+import json
+import subprocess
+from types import SimpleNamespace
 
 import Gen_reportV2
+from thermal_core import format_decimal_degrees, format_date_taken, clip_box
+from frame_cache import FramePrefetcher
+from thermal_batch import collect_images
+from colormap_lut import LutRenderer
+from ui_scheduler import FrameScheduler
+from blit_layer import BlitManager
+from annotation_store import AnnotationStore
+from history import (History, AddAnnotations, DeleteAnnotations, MoveAnnotation, RenameAnnotation,
+                     SetRange)
+from annotation_layer import (AnnotationLayer, record_items, mask_outline_path, TEXT_SIZE_SMALL, LINE_THICKNESS,
+                              BOX_LINE_THICKNESS, STROKE_THICKNESS)
+from matplotlib.cm import ScalarMappable
+from matplotlib.colors import Normalize
+from exiftool_daemon import get_metadata
+from export_renderer import render_view, PNG_COMPRESS_LEVEL
+from raster_source import RasterSource
+from job_queue import JobQueue
+import annotation_sidecar
+import batch_report
+import site_report
+import roi_series
+import hotspot_detect
+import mosaic_hotspots
+import region_grow
+from PIL import Image
+import thermal_core
 
 # Global variables for annotations
-annotations = []
+annotation_store = AnnotationStore()  # All box and point annotations of the image
 is_drawing = False
 rect_start = None
 current_rect = None
 annotation_mode = False
 is_panning = False
 
+# Annotation selected with Shift + click (moved by dragging, removed with Delete)
+selected_key = None
+selection_rect = None
+move_origin = None  # (cursor x, y, annotation x, y) when the drag started
+
+# Min / avg / max and hot spot of the box being drawn, shown next to the cursor
+live_stats_text = None
+live_hot_spot = None
+
 # Add canvas_widget to global variables at the top
 canvas_widget = None
 
+# Redraws rubber band, live readouts and pan steps without a full figure draw
+blit_manager = None
+annotation_layer = None  # Draws all box / point annotations (keyed by annotation_store keys)
+
+# Image being viewed. Normal frames are held in memory as `thermal_data`;
+# orthomosaics are read lazily and `thermal_data` is None. `view_data` is what
+# is currently displayed, covering `view_bounds` (x0, y0, x1, y1) in full
+# resolution pixel coordinates at `view_factor` (decimation): only the
+# visible window at about screen resolution is ever colormapped and drawn.
+raster_source = None
+current_frame = None  # frame_cache.Frame of the image (its index and hot-spot proposals)
+thermal_data = None
+view_data = None
+view_bounds = None
+view_factor = 1
+
+# Summed-area tables and min / max pyramids of the in-memory image for fast
+# box statistics (None for orthomosaics, whose boxes are read and scanned)
+roi_index = None
+
+# Mosaics whose overviews could not be built, already reported to the user
+overview_warnings = set()
+
+# Folder navigation: all TIFFs next to the opened file, with decoded
+# neighbours prefetched in the background
+folder_images = []
+current_index = -1
+frame_loader = FramePrefetcher()
+
+# Hot-spot detection settings (threshold °C or None, ΔT), as last validated
+hotspot_settings = (None, hotspot_detect.DELTA_T)
+frame_loader.detect = hotspot_settings
+
 # Add to global variables at the top
 point_annotation_mode = False
-point_annotations = []
 
-# Replace single undo tracking with undo stack
-undo_stack = []  # List to store all actions for undo
+# Region mode: a left click grows a region from the clicked pixel (see
+# region_grow.py), previewed live while the tolerance changes until added
+region_mode = False
+region_seed = None  # (x, y, window x0, window y0, window pixels) of the clicked pixel
+region_preview = None  # (x, y, mask, stats) of the grown region
+region_outline = None  # Blitted PathPatch of the preview
+
+# Temperature table: one Treeview row per annotation (iid = store key), kept
+# in step with the store by update_temperature_table()
+TABLE_COLUMNS = ('name', 'min', 'avg', 'max', 'delta')
+TABLE_HEADINGS = {'name': "Name", 'min': "Min", 'avg': "Avg", 'max': "Max", 'delta': "ΔT"}
+table_rows = {}  # key -> values shown in its row
+table_sort = None  # (column, descending), None for creation order
+
+# Hot-spot proposals of the image (hotspot_detect.py), shown as dashed boxes
+# until accepted (they become box annotations) or rejected
+PROPOSAL_COLUMNS = ('name', 'area', 'min', 'avg', 'max')
+PROPOSAL_HEADINGS = {'name': "Name", 'area': "Px", 'min': "Min", 'avg': "Avg", 'max': "Max"}
+hotspot_proposals = {}  # Row id -> hotspot_detect.Proposal
+proposal_rects = {}  # Row id -> dashed Rectangle (blitted)
+
+# Undo / redo of annotation edits and range changes (see history.py)
+history = History()
+applied_range = None  # (vmin, vmax) of the sliders as last recorded
 
 # At the top, define your 4:3 box size (in pixels)
 BOX_WIDTH = 800
@@ -40,17 +129,14 @@ BOX_HEIGHT = 600
 
 # Add at the top of your file:
 colorbar = None
-export_path = None  # Add this line to store export path
-
-# Style configuration variables
-TEXT_SIZE_SMALL = 8  # For temperature values
-TEXT_SIZE_MEDIUM = 9  # For annotation names
-CIRCLE_RADIUS =  2 # For point markers
-LINE_LENGTH = 7  # For crosshair lines
-LINE_GAP = 5  # For crosshair gap
-LINE_THICKNESS = 2  # For all lines
-BOX_LINE_THICKNESS = 2  # For box borders
-STROKE_THICKNESS = 3  # For text and shape outlines
+# Folder for exported views (Export Folder button, or THERMAL_EXPORT_DIR)
+export_path = os.environ.get('THERMAL_EXPORT_DIR', os.path.join(os.path.expanduser("~"), "Thermal Export PNG"))
+
+# Style configuration variables are shared with the annotation layer
+# (see annotation_layer.py)
+
+# Percentiles computed for every box annotation (besides the median)
+BOX_PERCENTILES = (5, 95)
 
 # Add at the top with other global variables
 defect_types = [
@@ -95,55 +181,48 @@ def test_pdf(thermal_path: str, thermal_img_path: str, project_name: str, projec
 #BY KUNNOP KOETYAEM 06/18/2025
 def open_file():
     global file_path
-    file_path = filedialog.askopenfilename(filetypes=[("TIFF files", "*.tif;*.tiff")])
-    if file_path:
-        file_label.config(text=f"📁 File: {file_path.split('/')[-1]}")  # Show only file name
-        print(file_path)
-        process_thermal_image(file_path)
+    selected_path = filedialog.askopenfilename(filetypes=[("TIFF files", "*.tif;*.tiff")])
+    if selected_path:
+        # Navigate within the folder of the selected image
+        folder_images[:] = collect_images([os.path.dirname(selected_path)])
+        selected = os.path.normcase(os.path.abspath(selected_path))
+        index = next((i for i, path in enumerate(folder_images)
+                      if os.path.normcase(os.path.abspath(path)) == selected), None)
+        if index is None:
+            folder_images[:] = [selected_path]
+            index = 0
+        show_image(index)
+
+def show_image(index):
+    global file_path, current_index
+    current_index = index
+    file_path = folder_images[index]
+    file_label.config(text=f"📁 File: {os.path.basename(file_path)} ({index + 1}/{len(folder_images)})")  # Show only file name
+    print(file_path)
+    process_thermal_image(file_path)
+
+def show_next_image(event=None):
+    if _typing_in(event):
+        return
+    if 0 <= current_index < len(folder_images) - 1:
+        show_image(current_index + 1)
 
-def convert_to_decimal_degrees(gps_str):
-    try:
-        # Split the string into lat and lon parts by comma
-        lat_str, lon_str = gps_str.split(',')
-        
-        # Process latitude
-        lat_parts = lat_str.strip().split()
-        lat_deg = float(lat_parts[0])
-        lat_min = float(lat_parts[2].replace("'", ""))
-        lat_sec = float(lat_parts[3].replace('"', ""))
-        lat_dir = lat_parts[4]
-        
-        # Process longitude
-        lon_parts = lon_str.strip().split()
-        lon_deg = float(lon_parts[0])
-        lon_min = float(lon_parts[2].replace("'", ""))
-        lon_sec = float(lon_parts[3].replace('"', ""))
-        lon_dir = lon_parts[4]
-        
-        # Convert to decimal degrees
-        lat_decimal = lat_deg + (lat_min / 60) + (lat_sec / 3600)
-        lon_decimal = lon_deg + (lon_min / 60) + (lon_sec / 3600)
-        
-        # Apply direction
-        if lat_dir == 'S':
-            lat_decimal = -lat_decimal
-        if lon_dir == 'W':
-            lon_decimal = -lon_decimal
-            
-        return f"{lat_decimal:.6f}°, {lon_decimal:.6f}°"
-    except Exception as e:
-        print(f"Error converting GPS coordinates: {e}")
-    return "GPS: Unknown"
+def show_previous_image(event=None):
+    if _typing_in(event):
+        return
+    if current_index > 0:
+        show_image(current_index - 1)
+
+def _typing_in(event):
+    # Arrow keys belong to entry fields while the user is typing in one
+    return event is not None and isinstance(event.widget, (tk.Entry, tk.Text, ttk.Entry))
 
 def get_gps_position(tiff_path):
     try:
-        result = subprocess.run(["exiftool", tiff_path], capture_output=True, text=True)
-        output = result.stdout
-        
-        gps_match = re.search(r"GPS Position\s+: (.+)", output)
-        if gps_match:
-            gps_str = gps_match.group(1)
-            decimal_coords = convert_to_decimal_degrees(gps_str)
+        # Served from the shared exiftool daemon, cached per path/mtime
+        metadata = get_metadata(tiff_path)
+        if metadata['lat'] is not None and metadata['lon'] is not None:
+            decimal_coords = format_decimal_degrees(metadata['lat'], metadata['lon'])
             gps_text.config(state='normal')  # Enable editing
             gps_text.delete("1.0", tk.END)
             gps_text.insert("1.0", f"{decimal_coords}")
@@ -159,26 +238,12 @@ def get_gps_position(tiff_path):
 
 def get_date_taken(tiff_path):
     try:
-        result = subprocess.run(["exiftool", tiff_path], capture_output=True, text=True)
-        output = result.stdout
-        
-        # Try to find the date in different EXIF tags
-        date_match = re.search(r"Date/Time Original\s+: (.+)", output)
-        if not date_match:
-            date_match = re.search(r"Create Date\s+: (.+)", output)
-        if not date_match:
-            date_match = re.search(r"Modify Date\s+: (.+)", output)
-            
-        if date_match:
-            date_str = date_match.group(1)
+        date_str = get_metadata(tiff_path)['date_taken']
+        if date_str:
             # Parse the date string (assuming format like "2024:02:13 15:30:45")
             try:
-                # Split the date and time parts
-                date_part, time_part = date_str.split()
-                # Split the date into year, month, day
-                year, month, day = date_part.split(':')
                 # Format as DD/MM/YYYY HH:mm:ss
-                formatted_date = f"{day}/{month}/{year} {time_part}"
+                formatted_date = format_date_taken(date_str)
                 
                 date_text.config(state='normal')
                 date_text.delete("1.0", tk.END)
@@ -201,46 +266,111 @@ def get_date_taken(tiff_path):
         date_text.config(state='disabled')
     return "Date: Unknown"
 
-def reset_view():
-    ax.set_xlim(0, thermal_data.shape[1])
-    ax.set_ylim(thermal_data.shape[0], 0)  # Keep Y-axis inverted for correct image orientation
+# In-memory windows extend this fraction of the view beyond each side, so
+# panning rarely needs a new window (slicing them is free)
+VIEW_MARGIN = 0.5
+
+# Zoom levels within this fraction of a whole screen-pixels-per-image-pixel
+# ratio snap to it, where pixels are drawn exactly with nearest neighbour
+ZOOM_SNAP = 0.05
 
+def reset_view():
+    height, width = raster_source.shape
+    ax.set_xlim(0, width)
+    ax.set_ylim(height, 0)  # Keep Y-axis inverted for correct image orientation
+    refresh_view_window()
+    canvas.draw_idle()
+
+def schedule_view_refresh():
+    # Fetch the visible window at most once per frame
+    if raster_source is None:
+        return
+    scheduler.request('view_refresh', refresh_view_window)
+
+def request_render():
+    # Redraw the image with the current sliders / colormap in the next frame
+    scheduler.request('render', update_image)
+
+def refresh_view_window():
+    # Fetch the window intersecting the current view at the decimation level
+    # matching the zoom; skipped while the displayed window still covers it.
+    # The work per frame thus depends on the canvas size, not the image size.
+    global view_data, view_bounds, view_factor
+    x0, x1 = sorted(ax.get_xlim())
+    y0, y1 = sorted(ax.get_ylim())
+    scale = (x1 - x0) / max(1.0, ax.bbox.width)
+    factor = raster_source.factor_for_scale(scale)
+
+    # Nearest neighbour where every data pixel covers a whole number of screen
+    # pixels, otherwise matplotlib's antialiasing
+    magnification = factor / scale
+    whole = max(1, round(magnification))
+    integer_zoom = abs(magnification / whole - 1) < 0.01
+    img_display.set_interpolation('nearest' if integer_zoom else 'antialiased')
+
+    if (factor == view_factor and view_bounds is not None and
+            view_bounds[0] <= max(0, x0) and view_bounds[1] <= max(0, y0) and
+            view_bounds[2] >= min(raster_source.width, x1) and view_bounds[3] >= min(raster_source.height, y1)):
+        return
+    if raster_source.in_memory:
+        margin_x, margin_y = (x1 - x0) * VIEW_MARGIN, (y1 - y0) * VIEW_MARGIN
+        x0, x1, y0, y1 = x0 - margin_x, x1 + margin_x, y0 - margin_y, y1 + margin_y
+    view_data, view_bounds = raster_source.read_window(x0, y0, x1, y1, scale)
+    view_factor = factor
     update_image()
+    canvas.draw_idle()
 
 img_display = None
 
-def update_image():
-    global img_display, fig, ax, canvas, canvas_widget, colorbar
+# The image is drawn as RGBA through a colormap lookup table: temperatures are
+# quantized once per displayed array, colormap / range changes only rebuild
+# the table. The colorbar follows its own ScalarMappable.
+lut_renderer = LutRenderer()
+colorbar_mappable = None
+data_range = (0.0, 1.0)  # Temperature range of the whole image
+
+def update_image(event=None):
+    global img_display, fig, ax, canvas, canvas_widget, colorbar, colorbar_mappable, blit_manager, annotation_layer
 
     vmin = vmin_slider.get()
     vmax = vmax_slider.get()
     cmap = cmap_var.get()
-    display_data = np.clip(thermal_data, vmin, vmax)
+    if lut_renderer.data is not view_data:
+        lut_renderer.set_data(view_data, *data_range)
+    x0, y0, x1, y1 = view_bounds
+    extent = (x0 - 0.5, x1 - 0.5, y1 - 0.5, y0 - 0.5)
 
-    # Only recreate the figure/canvas if the shape changes
-    if (not hasattr(update_image, 'current_shape')) or (update_image.current_shape != display_data.shape):
-        update_image.current_shape = display_data.shape
+    # Only recreate the figure/canvas if the image shape changes
+    if (not hasattr(update_image, 'current_shape')) or (update_image.current_shape != raster_source.shape):
+        update_image.current_shape = raster_source.shape
 
         if canvas_widget is not None:
             canvas_widget.destroy()
 
         fig, ax = plt.subplots()
         fig.subplots_adjust(left=0.1, right=0.85, top=1, bottom=0, wspace=0, hspace=0)
-        img_display = ax.imshow(display_data, cmap=cmap, vmin=vmin, vmax=vmax, interpolation='nearest')
-        ax.set_xlim(0, thermal_data.shape[1])
-        ax.set_ylim(thermal_data.shape[0], 0)
+        img_display = ax.imshow(lut_renderer.render(cmap, vmin, vmax), interpolation='nearest',
+                                extent=extent)
+        ax.set_xlim(0, raster_source.width)
+        ax.set_ylim(raster_source.height, 0)
         ax.set_aspect('equal')
         ax.axis("off")
 
         # Create colorbar with height matching the image
         divider = make_axes_locatable(ax)
         cax = divider.append_axes("right", size="5%", pad=0.05)
-        colorbar = fig.colorbar(img_display, cax=cax)
+        colorbar_mappable = ScalarMappable(norm=Normalize(vmin, vmax), cmap=cmap)
+        colorbar = fig.colorbar(colorbar_mappable, cax=cax)
         colorbar.ax.tick_params(labelsize=10)
 
         canvas = FigureCanvasTkAgg(fig, master=frame)
         canvas_widget = canvas.get_tk_widget()
         canvas_widget.pack(fill=tk.BOTH, expand=True)
+        blit_manager = BlitManager(canvas, ax, img_display)
+        if annotation_layer is None:
+            annotation_layer = AnnotationLayer(ax)
+        else:
+            annotation_layer.attach(ax)
 
         # Re-bind events
         canvas.mpl_connect("button_press_event", on_mouse_press)
@@ -248,18 +378,36 @@ def update_image():
         canvas.mpl_connect("button_release_event", on_mouse_release)
         canvas_widget.bind("<MouseWheel>", on_scroll)
     else:
-        img_display.set_data(display_data)
-        img_display.set_cmap(cmap)
-        img_display.set_clim(vmin, vmax)
-        if colorbar is not None:
-            colorbar.update_normal(img_display)
-            colorbar.ax.figure.canvas.draw_idle()
+        # Render straight into the image's own RGBA buffer (no copies) when
+        # the displayed array keeps its shape
+        buffer = np.ma.getdata(img_display.get_array())
+        if buffer.shape[:2] == lut_renderer.indices.shape:
+            lut_renderer.render(cmap, vmin, vmax, out=buffer)
+            img_display.changed()
+        else:
+            img_display.set_data(lut_renderer.render(cmap, vmin, vmax))
+        img_display.set_extent(extent)
+        colorbar_mappable.set_cmap(cmap)
+        colorbar_mappable.set_clim(vmin, vmax)  # The colorbar follows the mappable
+        colorbar.ax.figure.canvas.draw_idle()
 
 def on_mouse_press(event):
-    global is_drawing, rect_start, current_rect, is_panning
+    global is_drawing, rect_start, current_rect, is_panning, live_stats_text, live_hot_spot
     if event.inaxes != ax:  # Ignore clicks outside the axes
         return
         
+    # Shift + left click selects the annotation under the cursor (drag to move it)
+    if event.button == 1 and shift_held(event):
+        if event.xdata is not None and event.ydata is not None:
+            select_annotation_at(event.xdata, event.ydata)
+        return
+        
+    # Region mode (left click on the seed pixel)
+    if region_mode and event.button == 1:
+        if event.xdata is not None and event.ydata is not None:
+            start_region(event.xdata, event.ydata)
+        return
+        
     # Point annotation mode (left click)
     if point_annotation_mode and event.button == 1:
         if event.xdata is not None and event.ydata is not None:
@@ -274,7 +422,16 @@ def on_mouse_press(event):
         current_rect = Rectangle(rect_start, 0, 0, fill=False, edgecolor='white', linewidth=BOX_LINE_THICKNESS)
         current_rect.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
         ax.add_patch(current_rect)
-        canvas.draw_idle()
+        remove_live_box_stats()
+        live_stats_text = ax.annotate('', xy=rect_start, xytext=(12, -12), textcoords='offset points',
+                                      color='white', fontsize=TEXT_SIZE_SMALL, va='top', visible=False)
+        live_stats_text.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
+        live_hot_spot, = ax.plot([], [], marker='+', color='red', markersize=10,
+                                 markeredgewidth=LINE_THICKNESS, linestyle='none')
+        # Drawn by blitting on top of the cached figure while dragging
+        for artist in (current_rect, live_stats_text, live_hot_spot):
+            blit_manager.add_artist(artist)
+        blit_manager.update()
     # Left click for temperature display and panning
     elif event.button == 1 and not point_annotation_mode:
         #if event.xdata is not None and event.ydata is not None:
@@ -285,128 +442,339 @@ def on_mouse_press(event):
         # Start pan operation
         canvas_widget.old_coords = event.x, event.y
         is_panning = True
+        blit_manager.begin_pan()
 
 def on_mouse_motion(event):
     global current_rect
     if event.inaxes != ax:  # Ignore motion outside the axes
         return
         
+    # Motion events arrive much faster than frames; the work is done once per
+    # frame by the scheduler with the latest position
     # Handle annotation drawing (right-click drag)
     if annotation_mode and is_drawing and rect_start is not None:
         if event.xdata is not None and event.ydata is not None:
-            width = event.xdata - rect_start[0]
-            height = event.ydata - rect_start[1]
-            current_rect.set_width(width)
-            current_rect.set_height(height)
-            canvas.draw_idle()  # Use draw_idle instead of draw for smoother updates
+            scheduler.request('rubber_band', resize_rubber_band, event.xdata, event.ydata)
+    # Handle moving the selected annotation (Shift + left-click drag)
+    elif move_origin is not None and event.xdata is not None and event.ydata is not None:
+        scheduler.request('move', drag_selection, event.xdata, event.ydata)
     # Handle panning (left-click drag)
     elif is_panning and hasattr(canvas_widget, 'old_coords') and event.x is not None and event.y is not None:
-        dx = event.x - canvas_widget.old_coords[0]
-        dy = event.y - canvas_widget.old_coords[1]
-        xlim = ax.get_xlim()
-        ylim = ax.get_ylim()
-        
-        # Calculate new limits
-        new_xlim = [x - dx for x in xlim]
-        new_ylim = [y + dy for y in ylim]  # Changed minus to plus to invert
-        
-        # Clamp the new limits to image boundaries
-        width = thermal_data.shape[1]
-        height = thermal_data.shape[0]
-        
-        # Calculate the visible width and height
-        visible_width = new_xlim[1] - new_xlim[0]
-        visible_height = abs(new_ylim[1] - new_ylim[0])  # Use abs() since y-axis is inverted
-        
-        # Clamp x limits
-        if new_xlim[0] < 0:
-            new_xlim[0] = 0
-            new_xlim[1] = visible_width
-        elif new_xlim[1] > width:
-            new_xlim[1] = width
-            new_xlim[0] = width - visible_width
-            
-        # Clamp y limits (note: y-axis is inverted, so ylim[0] > ylim[1])
-        if new_ylim[0] > height:  # Top edge (smaller y value)
-            new_ylim[0] = height
-            new_ylim[1] = height - visible_height
-        elif new_ylim[1] < 0:  # Bottom edge (larger y value)
-            new_ylim[1] = 0
-            new_ylim[0] = visible_height
-        
-        # Apply the clamped limits
-        ax.set_xlim(new_xlim)
-        ax.set_ylim(new_ylim)
-        canvas_widget.old_coords = event.x, event.y
-        canvas.draw_idle()  # Use draw_idle instead of draw for smoother updates
+        scheduler.request('pan', pan_to, event.x, event.y)
     
     # Always show temperature on hover
     if event.xdata is not None and event.ydata is not None:
-        x, y = int(event.xdata), int(event.ydata)
-        if 0 <= x < thermal_data.shape[1] and 0 <= y < thermal_data.shape[0]:
-            temp = thermal_data[y, x]
-            hover_label.config(text=f"🎯 Temp: {temp:.2f} °C")
-
-def find_min_max_temps(x_start, y_start, width, height):
-    # Convert to integer coordinates
-    x1 = max(0, int(x_start))
-    y1 = max(0, int(y_start))
-    x2 = min(thermal_data.shape[1], int(x_start + width))
-    y2 = min(thermal_data.shape[0], int(y_start + height))
-    
-    # Get the region of interest
-    region = thermal_data[y1:y2, x1:x2]
+        scheduler.request('hover', update_hover_label, event.xdata, event.ydata)
+
+def resize_rubber_band(xdata, ydata):
+    if current_rect is None or not is_drawing:
+        return
+    current_rect.set_width(xdata - rect_start[0])
+    current_rect.set_height(ydata - rect_start[1])
+    update_live_box_stats(xdata, ydata)
+    blit_manager.update()  # Only the rubber band and readouts are redrawn
+
+def live_box_statistics(x_start, y_start, width, height):
+    # Min / mean / max and hot spot of a box, cheap enough to run every frame.
+    # In-memory images use the ROI index; mosaics use the displayed window,
+    # which is full resolution when zoomed in and an overview otherwise.
+    if roi_index is not None:
+        return roi_index.query(x_start, y_start, width, height)
+    x0, y0 = view_bounds[0], view_bounds[1]
+    box = ((x_start - x0) / view_factor, (y_start - y0) / view_factor,
+           width / view_factor, height / view_factor)
+    min_point, max_point = thermal_core.find_min_max_temps(view_data, *box)
+    if max_point[0] is None:
+        return None
+    return {
+        'min': float(min_point[2]),
+        'max': float(max_point[2]),
+        'max_pos': (x0 + max_point[0] * view_factor, y0 + max_point[1] * view_factor),
+        'mean': float(thermal_core.find_box_average_temp(view_data, *box)),
+    }
+
+def update_live_box_stats(xdata, ydata):
+    if live_stats_text is None:
+        return
+    x_start, y_start = min(rect_start[0], xdata), min(rect_start[1], ydata)
+    stats = live_box_statistics(x_start, y_start, abs(xdata - rect_start[0]), abs(ydata - rect_start[1]))
+    if stats is None:
+        live_stats_text.set_visible(False)
+        live_hot_spot.set_data([], [])
+        return
+    approx = "≈ " if roi_index is None and view_factor > 1 else ""
+    live_stats_text.set_text(f"{approx}Min: {stats['min']:.1f}°C\n"
+                             f"{approx}Avg: {stats['mean']:.1f}°C\n"
+                             f"{approx}Max: {stats['max']:.1f}°C at ({stats['max_pos'][0]}, {stats['max_pos'][1]})")
+    live_stats_text.xy = (xdata, ydata)
+    live_stats_text.set_visible(True)
+    live_hot_spot.set_data([stats['max_pos'][0]], [stats['max_pos'][1]])
+
+def remove_live_box_stats():
+    global live_stats_text, live_hot_spot
+    for artist in (live_stats_text, live_hot_spot):
+        if artist is not None:
+            blit_manager.remove_artist(artist)
+    live_stats_text = live_hot_spot = None
+
+def pan_to(screen_x, screen_y):
+    if not is_panning or not hasattr(canvas_widget, 'old_coords'):
+        return
+    xlim = ax.get_xlim()
+    ylim = ax.get_ylim()
+    # Screen pixels -> image pixels, so the image follows the cursor at any zoom
+    image_per_screen = (xlim[1] - xlim[0]) / max(1.0, ax.bbox.width)
+    dx = (screen_x - canvas_widget.old_coords[0]) * image_per_screen
+    dy = (screen_y - canvas_widget.old_coords[1]) * image_per_screen
     
-    if region.size == 0:
-        return (None, None, None), (None, None, None)
+    # Calculate new limits
+    new_xlim = [x - dx for x in xlim]
+    new_ylim = [y + dy for y in ylim]  # Changed minus to plus to invert
     
-    # Find min and max temperatures and their positions
-    min_temp = np.min(region)
-    max_temp = np.max(region)
+    # Clamp the new limits to image boundaries
+    height, width = raster_source.shape
     
-    # Get coordinates of min and max points
-    min_pos = np.where(region == min_temp)
-    max_pos = np.where(region == max_temp)
+    # Calculate the visible width and height
+    visible_width = new_xlim[1] - new_xlim[0]
+    visible_height = abs(new_ylim[1] - new_ylim[0])  # Use abs() since y-axis is inverted
     
-    if len(min_pos[0]) == 0 or len(max_pos[0]) == 0:
-        return (None, None, None), (None, None, None)
+    # Clamp x limits
+    if new_xlim[0] < 0:
+        new_xlim[0] = 0
+        new_xlim[1] = visible_width
+    elif new_xlim[1] > width:
+        new_xlim[1] = width
+        new_xlim[0] = width - visible_width
         
-    # Convert back to image coordinates
-    min_y, min_x = min_pos[0][0] + y1, min_pos[1][0] + x1
-    max_y, max_x = max_pos[0][0] + y1, max_pos[1][0] + x1
-    
-    return (min_x, min_y, min_temp), (max_x, max_y, max_temp)
-
-def find_box_average_temp(x_start, y_start, width, height):
-    # Convert to integer coordinates
-    x1 = max(0, int(x_start))
-    y1 = max(0, int(y_start))
-    x2 = min(thermal_data.shape[1], int(x_start + width))
-    y2 = min(thermal_data.shape[0], int(y_start + height))
-    
-    # Get the region of interest
-    region = thermal_data[y1:y2, x1:x2]
+    # Clamp y limits (note: y-axis is inverted, so ylim[0] > ylim[1])
+    if new_ylim[0] > height:  # Top edge (smaller y value)
+        new_ylim[0] = height
+        new_ylim[1] = height - visible_height
+    elif new_ylim[1] < 0:  # Bottom edge (larger y value)
+        new_ylim[1] = 0
+        new_ylim[0] = visible_height
     
-    if region.size == 0:
-        return None
-    
-    # Calculate average temperature
-    avg_temp = np.mean(region)
-    return avg_temp
+    # Apply the clamped limits
+    ax.set_xlim(new_xlim)
+    ax.set_ylim(new_ylim)
+    canvas_widget.old_coords = screen_x, screen_y
+    blit_manager.pan_update()  # Shift the cached bitmap, render the exposed strips
+    schedule_view_refresh()
+
+def update_hover_label(xdata, ydata):
+    x, y = int(xdata), int(ydata)
+    if 0 <= x < raster_source.width and 0 <= y < raster_source.height:
+        temp = raster_source.sample(x, y)
+        hover_label.config(text=f"🎯 Temp: {temp:.2f} °C")
+
+def read_box_region(x_start, y_start, width, height):
+    # Full resolution pixels of a box (a view for in-memory frames, a windowed
+    # read for mosaics) plus the image coordinates of its top-left corner
+    x1, y1, x2, y2 = clip_box(raster_source.shape, x_start, y_start, width, height)
+    return raster_source.read_region(x1, y1, max(x1, x2), max(y1, y2)), x1, y1
+
+def box_statistics(x_start, y_start, width, height):
+    # Min / max with positions, mean, std, median, percentiles and pixel count
+    # of a box (None if the box holds no data). In-memory images answer from
+    # the index and only the median / percentiles scan the box; mosaic boxes
+    # are read and scanned once.
+    if roi_index is not None:
+        stats = roi_index.query(x_start, y_start, width, height)
+        if stats is not None:
+            stats.update(thermal_core.roi_percentiles(thermal_data, x_start, y_start, width, height,
+                                                      BOX_PERCENTILES))
+        return stats
+    region, x1, y1 = read_box_region(x_start, y_start, width, height)
+    return thermal_core.roi_statistics(region, [(0, 0, region.shape[1], region.shape[0])],
+                                       BOX_PERCENTILES, offset=(x1, y1))[0]
+
+def region_statistics(x, y, mask):
+    # Statistics of the pixels of a region's mask placed at (x, y) (None if
+    # they hold no data); the part outside the image is left out
+    region, x1, y1 = read_box_region(x, y, mask.shape[1], mask.shape[0])
+    dx, dy = x1 - int(x), y1 - int(y)
+    return thermal_core.mask_statistics(region, mask[dy:dy + region.shape[0], dx:dx + region.shape[1]],
+                                        BOX_PERCENTILES, offset=(x1, y1))
+
+def shift_held(event):
+    # Shift modifier bit of the Tk mouse event
+    return event.guiEvent is not None and bool(getattr(event.guiEvent, 'state', 0) & 0x0001)
+
+def set_selection(key):
+    # Outline the selected annotation (blitted, so selecting doesn't redraw the figure)
+    global selected_key, selection_rect
+    if selection_rect is not None:
+        blit_manager.remove_artist(selection_rect)
+        selection_rect = None
+    selected_key = key
+    if key is not None:
+        x1, y1, x2, y2 = annotation_store.get(key).bounds()
+        selection_rect = Rectangle((x1, y1), x2 - x1, y2 - y1, fill=False, edgecolor='yellow',
+                                   linewidth=1.5, linestyle='--')
+        ax.add_patch(selection_rect)
+        blit_manager.add_artist(selection_rect)
+    blit_manager.update()
+
+def select_annotation_at(xdata, ydata):
+    # Select the annotation under the cursor (or clear the selection) and
+    # start dragging it
+    global move_origin
+    image_per_screen = (ax.get_xlim()[1] - ax.get_xlim()[0]) / max(1.0, ax.bbox.width)
+    annotation = annotation_store.hit_test(xdata, ydata, tolerance=4 * image_per_screen)
+    set_selection(annotation.key if annotation else None)
+    move_origin = (xdata, ydata, annotation.x, annotation.y) if annotation else None
+
+def dragged_position(xdata, ydata):
+    # Where the dragged annotation goes, kept inside the image
+    cursor_x, cursor_y, start_x, start_y = move_origin
+    x = min(max(start_x + xdata - cursor_x, 0), raster_source.width - 1)
+    y = min(max(start_y + ydata - cursor_y, 0), raster_source.height - 1)
+    return x, y
+
+def drag_selection(xdata, ydata):
+    # Only the selection outline follows the cursor; the annotation moves on release
+    if move_origin is None or selection_rect is None:
+        return
+    annotation = annotation_store.get(selected_key)
+    x, y = dragged_position(xdata, ydata)
+    x1, y1 = annotation.bounds()[:2]
+    selection_rect.set_xy((x + x1 - annotation.x, y + y1 - annotation.y))
+    blit_manager.update()
+
+def finish_move(xdata, ydata):
+    global move_origin
+    annotation = annotation_store.get(selected_key)
+    before = placement(annotation)
+    new_position = dragged_position(xdata, ydata)
+    move_origin = None
+    if new_position == before[:2]:
+        return
+    move_annotation(annotation.key, *new_position)
+    history.push(MoveAnnotation(annotation.key, before, placement(annotation)))
+
+def move_annotation(key, x, y):
+    # Move an annotation and measure again at its new place
+    if annotation_store.get(key).kind == 'region':
+        x, y = int(x), int(y)  # Masks stay on the pixel grid
+    annotation = annotation_store.move(key, x, y)
+    if annotation.kind == 'box':
+        annotation.stats = box_statistics(*annotation.coords)
+    elif annotation.kind == 'region':
+        annotation.stats = region_statistics(annotation.x, annotation.y, annotation.mask)
+    else:
+        annotation.temp = raster_source.sample(x, y)
+    annotation_layer.add(key, record_items(annotation))
+    if key == selected_key:
+        set_selection(key)
+    canvas.draw_idle()
+    scheduler.request('table', update_temperature_table)  # Changed rows only, once per frame
+
+def delete_annotations(records):
+    # Remove annotations as one undoable edit
+    if not records:
+        return
+    remove_annotations(records)
+    history.push(DeleteAnnotations(records))
+    canvas.draw_idle()
+    scheduler.request('table', update_temperature_table)  # Changed rows only, once per frame
+
+def delete_selected_annotation(event=None):
+    if _typing_in(event) or selected_key is None:
+        return
+    delete_annotations([annotation_store.get(selected_key)])
+
+def rename_selected_annotation(event=None):
+    if _typing_in(event) or selected_key is None:
+        return
+    annotation = annotation_store.get(selected_key)
+    name = get_annotation_name("Rename", f"Enter a new name for {annotation.name}:")
+    if name is None or name.strip() == "" or name == annotation.name:
+        return
+    history.push(RenameAnnotation(annotation.key, annotation.name, name))
+    rename_annotation(annotation.key, name)
+    canvas.draw_idle()
+    scheduler.request('table', update_temperature_table)  # Changed rows only, once per frame
+
+# Edits applied by undo / redo. They only change the annotations involved
+# and are not recorded again.
+
+def insert_annotations(records):
+    for record in records:
+        annotation_store.insert(record)
+    annotation_layer.add_many({record.key: record_items(record) for record in records})
+
+def remove_annotations(records):
+    keys = [record.key for record in records]
+    for key in keys:
+        annotation_store.remove(key)
+    annotation_layer.remove(*keys)
+    if selected_key in keys:
+        set_selection(None)
+
+def placement(annotation):
+    # Position and measurements of an annotation (stored by moves)
+    measured = annotation.temp if annotation.kind == 'point' else annotation.stats
+    return annotation.x, annotation.y, measured
+
+def place_annotation(key, placement):
+    x, y, measured = placement
+    annotation = annotation_store.move(key, x, y)
+    if annotation.kind == 'point':
+        annotation.temp = measured
+    else:
+        annotation.stats = measured
+    annotation_layer.add(key, record_items(annotation))
+    if key == selected_key:
+        set_selection(key)
+
+def rename_annotation(key, name):
+    annotation = annotation_store.rename(key, name)
+    annotation_layer.add(key, record_items(annotation))
+
+def set_display_range(vmin, vmax):
+    global applied_range
+    applied_range = (vmin, vmax)
+    vmin_slider.set(vmin)
+    vmax_slider.set(vmax)
+    update_slider_label(vmin, "vmin")
+    update_slider_label(vmax, "vmax")
+
+history_editor = SimpleNamespace(insert=insert_annotations, remove=remove_annotations, place=place_annotation,
+                                 rename=rename_annotation, set_range=set_display_range)
 
 def on_mouse_release(event):
-    global is_drawing, current_rect, rect_start, is_panning, undo_stack
+    global is_drawing, current_rect, rect_start, is_panning, move_origin
+    
+    # Apply the last pan / rubber-band step still waiting for its frame
+    scheduler.flush('pan')
+    scheduler.flush('rubber_band')
+    
+    # Handle left-click release of a dragged annotation
+    if event.button == 1 and move_origin is not None:
+        scheduler.flush('move')
+        if event.xdata is not None and event.ydata is not None:
+            finish_move(event.xdata, event.ydata)
+        else:
+            move_origin = None  # Released outside the image: leave it where it was
+            set_selection(selected_key)
+        return
     
     # Handle left-click release for panning
     if event.button == 1:
         is_panning = False
         if hasattr(canvas_widget, 'old_coords'):
             delattr(canvas_widget, 'old_coords')
+        if blit_manager.panning:
+            blit_manager.end_pan()  # Full redraw brings back the annotations
         return
         
     # Handle right-click release for annotations
     if not annotation_mode or not is_drawing or event.button != 3:
         return
+    remove_live_box_stats()
+    if current_rect:
+        # The rubber band becomes a normal artist (kept as the box or removed below)
+        blit_manager.remove_artist(current_rect, keep=True)
         
     if event.inaxes != ax:  # Ignore releases outside the axes
         if current_rect:
@@ -447,84 +815,39 @@ def on_mouse_release(event):
                 rect_start = (rect_start[0], event.ydata)
                 height = abs(height)
             
-            # Find min and max temperatures in the region
-            min_point, max_point = find_min_max_temps(rect_start[0], rect_start[1], width, height)
-            
-            # Calculate average temperature
-            avg_temp = find_box_average_temp(rect_start[0], rect_start[1], width, height)
-            
-            if min_point and max_point:
-                # Add circles for min and max temperatures with black borders
-                min_circle = plt.Circle((min_point[0], min_point[1]), radius=CIRCLE_RADIUS, color='blue', fill=True)
-                min_circle.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-                max_circle = plt.Circle((max_point[0], max_point[1]), radius=CIRCLE_RADIUS, color='red', fill=True)
-                max_circle.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-                ax.add_patch(min_circle)
-                ax.add_patch(max_circle)
+            # Min, max, average and the rest of the statistics of the region
+            stats = box_statistics(rect_start[0], rect_start[1], width, height)
             
             # Store annotation data
-            annotation = {
-                'name': name,
-                'rect': current_rect,
-                'coords': (rect_start[0], rect_start[1], width, height),
-                'min_circle': min_circle if min_point else None,
-                'max_circle': max_circle if max_point else None,
-                'min_temp': min_point[2] if min_point else None,
-                'max_temp': max_point[2] if max_point else None,
-                'avg_temp': avg_temp
-            }
-            annotations.append(annotation)
+            annotation = annotation_store.add_box(name, rect_start[0], rect_start[1], width, height, stats)
+            
+            # The box, min / max circles and side labels are drawn by the annotation layer
+            current_rect.remove()
+            annotation_layer.add(annotation.key, record_items(annotation))
             
             # Print box annotation details
             current_file = file_label.cget("text").split(": ")[-1]
             print(f"\nBox Annotation Details:")
             print(f"Image: {file_path}")
-            print(f"\nMin Temp: {min_point[2]:.2f} °C")
-            print(f"Avg Temp: {avg_temp:.2f} °C")
-            print(f"Max Temp: {max_point[2]:.2f} °C")
+            if stats:
+                print(f"\nMin Temp: {stats['min']:.2f} °C at {stats['min_pos']}")
+                print(f"Avg Temp: {stats['mean']:.2f} °C (std {stats['std']:.2f} °C)")
+                print(f"Max Temp: {stats['max']:.2f} °C at {stats['max_pos']}")
+                print(f"Median: {stats['median']:.2f} °C, " +
+                      ", ".join(f"P{q}: {stats[f'p{q}']:.2f} °C" for q in BOX_PERCENTILES))
+                print(f"Pixels: {stats['count']}")
             print("-" * 40)
             
-            # Add to undo stack
-            undo_stack.append({
-                'type': 'box',
-                'annotation': annotation
-            })
-            
-            # --- Place box labels to the right side of the box ---
-            label_x = rect_start[0] + width + 10  # 10 pixels to the right of the box
-            label_y = rect_start[1]
-            label_spacing = 13  # vertical space between labels
-            
-            # Add name label at the top
-            name_text = ax.text(label_x, label_y, name.upper(),
-                         color='white', fontsize=TEXT_SIZE_MEDIUM, ha='left', fontweight='bold')
-            name_text.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-            
-            # Add min temperature label
-            if min_point:
-                min_side_text = ax.text(label_x, label_y + label_spacing, f'Min: {min_point[2]:.1f}°C',
-                             color='white', fontsize=TEXT_SIZE_SMALL, ha='left', fontweight='bold')
-                min_side_text.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-            
-            # Add average temperature label
-            if avg_temp is not None:
-                avg_text = ax.text(label_x, label_y + 2*label_spacing, f'Avg: {avg_temp:.1f}°C',
-                             color='white', fontsize=TEXT_SIZE_SMALL, ha='left', fontweight='bold')
-                avg_text.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-            
-            # Add max temperature label
-            if max_point:
-                max_side_text = ax.text(label_x, label_y + 3*label_spacing, f'Max: {max_point[2]:.1f}°C',
-                             color='white', fontsize=TEXT_SIZE_SMALL, ha='left', fontweight='bold')
-                max_side_text.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
+            # Add to undo history
+            history.push(AddAnnotations([annotation]))
             
             canvas.draw_idle()
-            root.after(100, update_temperature_table)  # Update table after a short delay
+            scheduler.request('table', update_temperature_table)  # Changed rows only, once per frame
             
         except Exception as e:
             print(f"Error creating annotation: {e}")
             # Clean up if something goes wrong
-            if current_rect:
+            if current_rect and current_rect.axes is not None:
                 current_rect.remove()
             canvas.draw_idle()
             # Show error message to user
@@ -541,48 +864,81 @@ def toggle_annotation_mode():
     else:
         btn_annotate.config(text="✏️ Drawing Mode\n(OFF)")
 
-scroll_after_id = None
 def on_scroll(event):
-    global scroll_after_id
-    def zoom():
-        # Invert zoom direction (negative delta means zoom in now)
-        scale = 0.9 if event.delta > 0 else 1.1
-        xlim, ylim = ax.get_xlim(), ax.get_ylim()
-        ax.set_xlim([x * scale for x in xlim])
-        ax.set_ylim([y * scale for y in ylim])
-        clamp_view()
-        canvas.draw_idle()  # Use draw_idle instead of draw for smoother updates
-    if scroll_after_id:
-        canvas_widget.after_cancel(scroll_after_id)
-    scroll_after_id = canvas_widget.after(50, zoom)
+    # Invert zoom direction (negative delta means zoom in now). Wheel steps
+    # within one frame are combined into a single zoom about the latest
+    # cursor position.
+    scale = 0.9 if event.delta > 0 else 1.1
+    # Tk widget coordinates (origin top-left) -> image coordinates
+    display = (event.x, canvas_widget.winfo_height() - event.y)
+    x_anchor, y_anchor = ax.transData.inverted().transform(display)
+    scheduler.request('zoom', zoom_view, scale, x_anchor, y_anchor,
+                      merge=lambda old, new: (old[0] * new[0],) + new[1:])
+
+def zoom_view(scale, x_anchor=None, y_anchor=None):
+    # Scale the view (< 1 zooms in) keeping the image point under the cursor
+    # in place
+    xlim, ylim = ax.get_xlim(), ax.get_ylim()
+    if x_anchor is None:
+        x_anchor, y_anchor = sum(xlim) / 2, sum(ylim) / 2
+
+    magnification = ax.bbox.width / (abs(xlim[1] - xlim[0]) * scale)
+    whole = round(magnification)
+    if whole >= 1 and abs(magnification / whole - 1) < ZOOM_SNAP:
+        scale *= magnification / whole
+
+    ax.set_xlim([x_anchor + (x - x_anchor) * scale for x in xlim])
+    ax.set_ylim([y_anchor + (y - y_anchor) * scale for y in ylim])
+    clamp_view()
+    refresh_view_window()
+    canvas.draw_idle()  # Use draw_idle instead of draw for smoother updates
 
 def get_additional_exif_data(tiff_path):
     try:
-        result = subprocess.run(["exiftool", tiff_path], capture_output=True, text=True)
-        output = result.stdout
-        
         # Extract additional EXIF data
-        altitude_match = re.search(r"GPS Altitude\s+: (.+)", output)
+        altitude = get_metadata(tiff_path)['altitude']
         
         # Print the data
         print("\nAdditional EXIF Data:")
         print("-" * 40)
-        if altitude_match:
-            print(f"Altitude ASL: {altitude_match.group(1)}")
+        if altitude is not None:
+            print(f"Altitude ASL: {altitude:.1f} m")
         print("-" * 40)
 
     except Exception as e:
         print(f"Error extracting additional EXIF data: {e}")
 
 def process_thermal_image(tiff_path):
-    global thermal_data, vmin_slider, vmax_slider
+    global thermal_data, raster_source, view_data, view_bounds, view_factor, data_range, vmin_slider, vmax_slider
+    global roi_index, applied_range, autosaver, current_frame
     
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore", category=rasterio.errors.NotGeoreferencedWarning)
-        with rasterio.open(tiff_path) as dataset:
-            thermal_data = dataset.read(1)  # Read the first band
-            min_val = thermal_data.min()
-            max_val = thermal_data.max()
+    # Annotations and their history belong to the image they were drawn on
+    close_autosaver()
+    if region_seed is not None:
+        cancel_region()
+    if raster_source is not None and len(annotation_store):
+        clear_all_annotations()
+    history.clear()
+
+    # Decoded pixels, metadata and statistics come from the frame cache
+    # (usually already prefetched); the cache owns and closes the sources
+    if tiff_path not in folder_images:
+        folder_images[:] = [tiff_path]
+    frame = frame_loader.show(folder_images, folder_images.index(tiff_path))
+    current_frame = frame
+    raster_source = frame.source
+    if raster_source.in_memory:
+        thermal_data = raster_source.array  # The whole first band
+        roi_index = frame.roi_index  # Built with the frame, off the Tk thread
+    else:
+        # Orthomosaic: windows are read on demand
+        thermal_data = None
+        roi_index = None
+    # Start from a screen-sized overview, reset_view() fetches the real window
+    view_data, view_bounds = raster_source.preview()
+    view_factor = raster_source.factor_for_scale(raster_source.width / view_data.shape[1])
+    min_val, max_val = frame.stats['min'], frame.stats['max']
+    data_range = (min_val, max_val)
 
     gps_info = get_gps_position(tiff_path)
     date_info = get_date_taken(tiff_path)
@@ -597,10 +953,31 @@ def process_thermal_image(tiff_path):
     # Set default values
     vmin_slider.set(slider_min)
     vmax_slider.set(max_val)
+    saved = annotation_sidecar.load(tiff_path)
+    display = saved['display'] if saved else {}
+    if 'vmin' in display and 'vmax' in display:
+        # Range saved with the image
+        vmin_slider.set(display['vmin'])
+        vmax_slider.set(display['vmax'])
+    applied_range = (float(vmin_slider.get()), float(vmax_slider.get()))  # Not an edit
     update_image()
     reset_view()
+    if saved:
+        restore_annotations(saved)
+    if display.get('view'):
+        x0, y0, x1, y1 = display['view']
+        ax.set_xlim(x0 - 0.5, x1 - 0.5)
+        ax.set_ylim(y1 - 0.5, y0 - 0.5)
+        refresh_view_window()
+        canvas.draw_idle()
+    propose_hotspots(mosaics=False)
+    autosaver = annotation_sidecar.Autosaver(tiff_path)
 
 def on_closing():
+    close_autosaver()
+    print(scheduler.summary())
+    frame_loader.shutdown()
+    job_queue.shutdown()
     root.quit()
     root.destroy()
 
@@ -676,111 +1053,85 @@ def update_slider_label(val, slider_type):
             vmin_value_label.config(text=f"{val:.1f} °C")
         elif slider_type == "vmax":
             vmax_value_label.config(text=f"{val:.1f} °C")
-        update_image()
+        record_range_change()
+        request_render()
     except ValueError:
         pass  # Ignore invalid values
 
+def record_range_change():
+    # A slider drag or typed value is one undoable edit (see history.SetRange)
+    global applied_range
+    current = (float(vmin_slider.get()), float(vmax_slider.get()))
+    if applied_range is not None and current != applied_range:
+        history.push(SetRange(applied_range, current))
+    applied_range = current
+
+def on_slider_move(val, slider_type):
+    # Sliders report every intermediate value; only the latest one per frame
+    # updates the label and the image
+    scheduler.request(f"{slider_type}_label", update_slider_label, val, slider_type)
+
+def table_values(annotation):
+    # Row of the temperature table; ΔT is the box max over its median
+    if annotation.kind == 'point':
+        return (annotation.name, '', f"{annotation.temp:.1f}℃", '', '')
+    stats = annotation.stats
+    if not stats:
+        return (annotation.name, '', '', '', '')
+    return (annotation.name, f"{stats['min']:.1f}℃", f"{stats['mean']:.1f}℃", f"{stats['max']:.1f}℃",
+            f"{stats['max'] - stats['median']:.1f}℃")
+
 def update_temperature_table():
-    # Clear existing table
-    for widget in table_frame.winfo_children():
-        widget.destroy()
-    
-    # Create header
-    header = ttkb.Label(table_frame, text="Temperature Values", font=("Arial", 10, "bold"))
-    header.pack(pady=(0, 5))
-    
-    # Add point temperatures
-    for i, point in enumerate(point_annotations, 1):
-        point_frame = ttkb.Frame(table_frame)
-        point_frame.pack(fill=tk.X, pady=2)
-        
-        # Point name
-        name_label = ttkb.Label(point_frame, text=f"P{i}", width=5, font=("Arial", 9))
-        name_label.pack(side=tk.LEFT, padx=(0, 5))
-        
-        # Value label
-        value_label = ttkb.Label(point_frame, text="VALUE", width=8, font=("Arial", 9))
-        value_label.pack(side=tk.LEFT, padx=(0, 5))
-        
-        # Temperature value
-        temp_label = ttkb.Label(point_frame, text=f"{point['temp']:.1f}℃", width=8, font=("Arial", 9))
-        temp_label.pack(side=tk.LEFT)
-    
-    # Add box temperatures
-    for i, box in enumerate(annotations, 1):
-        box_frame = ttkb.Frame(table_frame)
-        box_frame.pack(fill=tk.X, pady=2)
-        
-        # Box name
-        name_label = ttkb.Label(box_frame, text=f"B{i}", width=5, font=("Arial", 9))
-        name_label.pack(side=tk.LEFT, padx=(0, 5))
-        
-        # Min temperature
-        min_frame = ttkb.Frame(box_frame)
-        min_frame.pack(fill=tk.X, pady=1)
-        min_label = ttkb.Label(min_frame, text="MIN", width=8, font=("Arial", 9))
-        min_label.pack(side=tk.LEFT, padx=(0, 5))
-        min_temp = ttkb.Label(min_frame, text=f"{box['min_temp']:.1f}℃", width=8, font=("Arial", 9))
-        min_temp.pack(side=tk.LEFT)
-        
-        # Average temperature
-        avg_frame = ttkb.Frame(box_frame)
-        avg_frame.pack(fill=tk.X, pady=1)
-        avg_label = ttkb.Label(avg_frame, text="AVERAGE", width=8, font=("Arial", 9))
-        avg_label.pack(side=tk.LEFT, padx=(0, 5))
-        avg_temp = ttkb.Label(avg_frame, text=f"{box['avg_temp']:.1f}℃", width=8, font=("Arial", 9))
-        avg_temp.pack(side=tk.LEFT)
-        
-        # Max temperature
-        max_frame = ttkb.Frame(box_frame)
-        max_frame.pack(fill=tk.X, pady=1)
-        max_label = ttkb.Label(max_frame, text="MAX", width=8, font=("Arial", 9))
-        max_label.pack(side=tk.LEFT, padx=(0, 5))
-        max_temp = ttkb.Label(max_frame, text=f"{box['max_temp']:.1f}℃", width=8, font=("Arial", 9))
-        max_temp.pack(side=tk.LEFT)
-    
-    # Force update of the table frame
-    table_frame.update_idletasks()
+    # Bring the table in line with the annotation store, inserting, updating
+    # or deleting only the rows that changed
+    changed = False
+    records = {**annotation_store.points, **annotation_store.boxes}
+    for key in [key for key in table_rows if key not in records]:
+        temperature_table.delete(str(key))
+        del table_rows[key]
+    for key, annotation in records.items():
+        values = table_values(annotation)
+        if table_rows.get(key) == values:
+            continue
+        if key in table_rows:
+            temperature_table.item(str(key), values=values)
+        else:
+            temperature_table.insert('', 'end', iid=str(key), values=values)
+        table_rows[key] = values
+        changed = True
+    if changed and table_sort is not None:
+        sort_temperature_table()
+
+def sort_temperature_table(column=None):
+    # Order rows by a column (hottest first); clicking the column again reverses it
+    global table_sort
+    if column is not None:
+        descending = not (table_sort is not None and table_sort == (column, True))
+        table_sort = (column, descending)
+    column, descending = table_sort
+    index = TABLE_COLUMNS.index(column)
+
+    def sort_key(key):
+        value = table_rows[key][index]
+        if column == 'name':
+            return value.lower()
+        return float(value.rstrip('℃')) if value else -float('inf')  # Blanks last
+
+    for position, key in enumerate(sorted(table_rows, key=sort_key, reverse=descending)):
+        temperature_table.move(str(key), '', position)
+    for name, heading in TABLE_HEADINGS.items():
+        arrow = (' ▼' if descending else ' ▲') if name == column else ''
+        temperature_table.heading(name, text=heading + arrow)
+
+def on_table_select(event=None):
+    # Selecting a row selects its annotation on the image
+    rows = temperature_table.selection()
+    if rows and int(rows[0]) in annotation_store and int(rows[0]) != selected_key:
+        set_selection(int(rows[0]))
 
 def clear_annotations():
-    global annotations
-    # Remove all box annotation rectangles, circles, and text from the plot
-    for annotation in annotations:
-        try:
-            # Remove rectangle
-            if annotation.get('rect'):
-                annotation['rect'].remove()
-            # Remove min/max circles if they exist
-            if annotation.get('min_circle'):
-                annotation['min_circle'].remove()
-            if annotation.get('max_circle'):
-                annotation['max_circle'].remove()
-        except Exception as e:
-            print(f"Error removing annotation elements: {e}")
-    
-    # Clear all text annotations that belong to boxes
-    try:
-        texts_to_remove = []
-        for text in ax.texts:
-            # Check if the text is part of a box annotation
-            for annotation in annotations:
-                if (text.get_text().startswith(annotation['name'].upper()) or 
-                    text.get_text().startswith('Min:') or 
-                    text.get_text().startswith('Max:') or 
-                    text.get_text().startswith('Avg:')):
-                    texts_to_remove.append(text)
-                    break
-        
-        # Remove the collected texts
-        for text in texts_to_remove:
-            text.remove()
-    except Exception as e:
-        print(f"Error removing text elements: {e}")
-    
-    # Clear the box annotations list
-    annotations = []
-    canvas.draw_idle()  # Use draw_idle instead of draw for smoother updates
-    root.after(100, update_temperature_table)  # Update table after a short delay
+    # Remove all box annotations (one undoable edit)
+    delete_annotations(list(annotation_store.boxes.values()))
 
 def on_window_resize(event=None):
     global canvas_widget
@@ -805,146 +1156,80 @@ def copy_to_clipboard():
     except Exception as e:
         print(f"Error copying values: {e}")
 
+def export_view_scale():
+    # Native resolution, or the screen's (whole) magnification when zoomed in
+    # further so exported pixels stay sharp
+    x0, x1 = ax.get_xlim()
+    return max(1.0, round(ax.bbox.width / max(1e-9, abs(x1 - x0))))
+
+def choose_export_folder():
+    global export_path
+    folder = filedialog.askdirectory(initialdir=export_path if os.path.isdir(export_path) else None,
+                                     title="Folder for exported views")
+    if folder:
+        export_path = folder
+        print(f"Export folder: {export_path}")
+
+def export_snapshot():
+    # Everything an export needs, taken on the Tk thread so the job doesn't
+    # depend on what the viewer shows by the time it runs
+    x0, x1 = sorted(ax.get_xlim())
+    y0, y1 = sorted(ax.get_ylim())
+    image_name = os.path.basename(file_path)
+    return SimpleNamespace(
+        image_path=file_path,
+        # In-memory frames keep their pixels after the frame cache closes
+        # them; orthomosaics are opened again by the job
+        source=raster_source if raster_source.in_memory else None,
+        cmap=cmap_var.get(), vmin=vmin_slider.get(), vmax=vmax_slider.get(),
+        view=(x0 + 0.5, y0 + 0.5, x1 + 0.5, y1 + 0.5),
+        annotations=[record_items(annotation) for records in (annotation_store.boxes, annotation_store.points)
+                     for annotation in records.values()],
+        scale=export_view_scale(), data_range=data_range,
+        export_path=os.path.join(export_path, f"export_{image_name.rsplit('.', 1)[0]}.png"),
+        details={'Defect Type': defect_var.get(), 'Project': project_var.get(), 'Owner': owner_var.get(),
+                 'Location': location_var.get(), 'Radiation': f"{radiation_var.get()} W/m²"})
+
+def write_export(snapshot):
+    # Render the view (see export_renderer) and save it; runs in a job worker
+    source = snapshot.source or RasterSource(snapshot.image_path, build_overviews=False)
+    try:
+        image = render_view(source, snapshot.cmap, snapshot.vmin, snapshot.vmax, view=snapshot.view,
+                            annotations=snapshot.annotations, scale=snapshot.scale,
+                            data_range=snapshot.data_range)
+    finally:
+        if source is not snapshot.source:
+            source.close()
+    os.makedirs(os.path.dirname(snapshot.export_path), exist_ok=True)
+    Image.fromarray(image, 'RGBA').save(snapshot.export_path, compress_level=PNG_COMPRESS_LEVEL)
+    return snapshot.export_path
+
+def print_export_details(snapshot):
+    print(f"\nExport Details:")
+    print(f"Original Image: {snapshot.image_path}")
+    print(f"Export Path: {snapshot.export_path}")
+    for name, value in snapshot.details.items():
+        print(f"{name}: {value}")
+    print("-" * 40)
+
 def export_current_view():
-    global export_path  # Add this line to use global variable
+    # Rendered and saved in the background, the viewer stays usable
     try:
-        # Get the current view's limits
-        xlim = ax.get_xlim()
-        ylim = ax.get_ylim()
-        
-        # Create a new figure with the same size as the current view
-        export_fig = plt.figure(figsize=(fig.get_size_inches()))
-        export_ax = export_fig.add_subplot(111)
-        
-        # Copy the current image data
-        export_img = export_ax.imshow(img_display.get_array(), cmap=img_display.get_cmap(), 
-                        vmin=img_display.get_clim()[0], vmax=img_display.get_clim()[1])
-        
-        # Add colorbar with height matching the image
-        divider = make_axes_locatable(export_ax)
-        cax = divider.append_axes("right", size="5%", pad=0.05)
-        export_colorbar = export_fig.colorbar(export_img, cax=cax)
-        export_colorbar.ax.tick_params(labelsize=10)
-        
-        # Copy all box annotations (side labels and circles)
-        for annotation in annotations:
-            rect = annotation['rect']
-            # Draw rectangle
-            new_rect = Rectangle(rect.get_xy(), rect.get_width(), rect.get_height(),
-                               fill=False, edgecolor='white', linewidth=BOX_LINE_THICKNESS)
-            new_rect.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-            export_ax.add_patch(new_rect)
-            
-            # Draw min/max circles if they exist
-            if annotation.get('min_circle'):
-                min_circle = annotation['min_circle']
-                new_min_circle = plt.Circle(min_circle.center, CIRCLE_RADIUS,
-                                          color='blue', fill=True)
-                new_min_circle.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-                export_ax.add_patch(new_min_circle)
-            if annotation.get('max_circle'):
-                max_circle = annotation['max_circle']
-                new_max_circle = plt.Circle(max_circle.center, CIRCLE_RADIUS,
-                                          color='red', fill=True)
-                new_max_circle.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-                export_ax.add_patch(new_max_circle)
-            
-            # Draw side labels (name, min, avg, max) in the same order and position as in the view
-            x, y, width, height = annotation['coords']
-            label_x = x + width + 10
-            label_y = y
-            label_spacing = 13
-            # Name label at the top
-            name_text = export_ax.text(label_x, label_y, annotation['name'].upper(),
-                                 color='white', fontsize=TEXT_SIZE_MEDIUM, ha='left', fontweight='bold')
-            name_text.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-            # Min
-            if annotation['min_temp'] is not None:
-                min_side_text = export_ax.text(label_x, label_y + label_spacing, f"Min: {annotation['min_temp']:.1f}°C",
-                                         color='white', fontsize=TEXT_SIZE_SMALL, ha='left', fontweight='bold')
-                min_side_text.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-            # Avg
-            if annotation['avg_temp'] is not None:
-                avg_text = export_ax.text(label_x, label_y + 2*label_spacing, f"Avg: {annotation['avg_temp']:.1f}°C",
-                                     color='white', fontsize=TEXT_SIZE_SMALL, ha='left', fontweight='bold')
-                avg_text.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-            # Max
-            if annotation['max_temp'] is not None:
-                max_side_text = export_ax.text(label_x, label_y + 3*label_spacing, f"Max: {annotation['max_temp']:.1f}°C",
-                                         color='white', fontsize=TEXT_SIZE_SMALL, ha='left', fontweight='bold')
-                max_side_text.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-        
-        # Copy all point annotations as crosshair/circle with gap at center
-        for point_annotation in point_annotations:
-            x, y = point_annotation['coords']
-            # Draw transparent circle
-            circle = plt.Circle((x, y), radius=CIRCLE_RADIUS, edgecolor='white', facecolor='none', linewidth=LINE_THICKNESS, zorder=10)
-            circle.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-            export_ax.add_patch(circle)
-            # Draw crosshair lines with gap at center
-            h_line_left = export_ax.plot([x - LINE_LENGTH, x - LINE_GAP], [y, y], color='white', linewidth=LINE_THICKNESS, zorder=11)[0]
-            h_line_left.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-            h_line_right = export_ax.plot([x + LINE_GAP, x + LINE_LENGTH], [y, y], color='white', linewidth=LINE_THICKNESS, zorder=11)[0]
-            h_line_right.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-            v_line_top = export_ax.plot([x, x], [y - LINE_LENGTH, y - LINE_GAP], color='white', linewidth=LINE_THICKNESS, zorder=11)[0]
-            v_line_top.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-            v_line_bottom = export_ax.plot([x, x], [y + LINE_GAP, y + LINE_LENGTH], color='white', linewidth=LINE_THICKNESS, zorder=11)[0]
-            v_line_bottom.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-            # Copy temperature text
-            temp_text = point_annotation['temp_text']
-            new_temp_text = export_ax.text(x, y - 12,
-                                         temp_text.get_text(), color='white', fontsize=TEXT_SIZE_SMALL,
-                                         ha='center', fontweight='bold')
-            new_temp_text.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-            # Copy name text
-            name_text = point_annotation['name_text']
-            new_name_text = export_ax.text(x, y - 20,
-                                         name_text.get_text(), color='white', fontsize=TEXT_SIZE_MEDIUM,
-                                         ha='center', fontweight='bold')
-            new_name_text.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-        
-        # Set the same view limits
-        export_ax.set_xlim(xlim)
-        export_ax.set_ylim(ylim)
-        export_ax.axis('off')
-        
-        # Adjust figure layout to accommodate colorbar
-        export_fig.subplots_adjust(left=0.1, right=0.85, top=1, bottom=0, wspace=0, hspace=0)
-        
-        # Get the current file name and create export name
-        current_file = file_label.cget("text").split(": ")[-1]
-        export_name = f"export_{current_file.rsplit('.', 1)[0]}.png"
-        
-        # Set export path
-        export_path = r"C:\Users\Kunnop.ko\Desktop\Thermal\M3T\Export PNG"
-        
-        # Create directory if it doesn't exist
-        os.makedirs(export_path, exist_ok=True)
-        
-        # Full path for the export file
-        global full_export_path
-        full_export_path = os.path.join(export_path, export_name)
-        
-        # Save the figure
-        export_fig.savefig(full_export_path, bbox_inches='tight', dpi=300)
-        plt.close(export_fig)
-        
-        # Print export information
-        print(f"\nExport Details:")
-        print(f"Original Image: {file_path}")
-        print(f"Export Path: {full_export_path}")
-        print(f"Defect Type: {defect_var.get()}")
-        print(f"Project: {project_var.get()}")
-        print(f"Owner: {owner_var.get()}")
-        print(f"Location: {location_var.get()}")
-        print(f"Radiation: {radiation_var.get()} W/m²")
-        print("-" * 40)
-        
-        # Show success message
-        tk.messagebox.showinfo("Export Successful", f"Image exported as {export_name}")
-        
+        snapshot = export_snapshot()
     except Exception as e:
         tk.messagebox.showerror("Export Error", f"Failed to export image: {str(e)}")
+        return
+
+    def exported(job):
+        print_export_details(snapshot)
+        job_status(f"💾 {os.path.basename(job.result)} exported ({job.elapsed:.1f} s)")
+
+    def failed(job):
+        tk.messagebox.showerror("Export Error", f"Failed to export image: {str(job.error)}")
+
+    job_queue.submit(f"Export {os.path.basename(snapshot.image_path)}", write_export, snapshot,
+                     on_done=exported, on_error=failed)
+    update_job_status()
 
 def toggle_point_annotation_mode():
     global point_annotation_mode, annotation_mode
@@ -953,6 +1238,8 @@ def toggle_point_annotation_mode():
         btn_point_annotate.config(text="📍 Point Mode\n(ON)")
         annotation_mode = False  # Turn off box annotation mode
         btn_annotate.config(text="✏️ Drawing Mode\n(OFF)")
+        if region_mode:
+            toggle_region_mode()
     else:
         btn_point_annotate.config(text="📍 Point Mode\n(OFF)")
 
@@ -1011,188 +1298,314 @@ def get_annotation_name(title, prompt):
     return result[0]
 
 def add_point_annotation(x, y):
-    global point_annotations, undo_stack
-    if 0 <= x < thermal_data.shape[1] and 0 <= y < thermal_data.shape[0]:
-        temp = thermal_data[int(y), int(x)]
+    if 0 <= x < raster_source.width and 0 <= y < raster_source.height:
+        temp = raster_source.sample(x, y)
         # Get point name from user using custom dialog
         name = get_annotation_name("Point Name", "Enter a name for this point:")
         if name is None or name.strip() == "":  # User cancelled or empty name
             return
         
-        # Draw crosshair-style point marker with larger gap at center
-        circle = plt.Circle((x, y), radius=CIRCLE_RADIUS, edgecolor='white', facecolor='none', linewidth=LINE_THICKNESS, zorder=10)
-        circle.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-        ax.add_patch(circle)
-        
-        # Horizontal left
-        h_line_left = ax.plot([x - LINE_LENGTH, x - LINE_GAP], [y, y], color='white', linewidth=LINE_THICKNESS, zorder=11)[0]
-        h_line_left.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-        # Horizontal right
-        h_line_right = ax.plot([x + LINE_GAP, x + LINE_LENGTH], [y, y], color='white', linewidth=LINE_THICKNESS, zorder=11)[0]
-        h_line_right.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-        # Vertical top
-        v_line_top = ax.plot([x, x], [y - LINE_LENGTH, y - LINE_GAP], color='white', linewidth=LINE_THICKNESS, zorder=11)[0]
-        v_line_top.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-        # Vertical bottom
-        v_line_bottom = ax.plot([x, x], [y + LINE_GAP, y + LINE_LENGTH], color='white', linewidth=LINE_THICKNESS, zorder=11)[0]
-        v_line_bottom.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-        
-        # Add temperature label
-        temp_text = ax.text(x, y - 12, f'{temp:.1f}°C', 
-                      color='white', fontsize=TEXT_SIZE_SMALL, ha='center', fontweight='bold')
-        temp_text.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
+        # Store annotation; its crosshair, circle and labels are drawn by the annotation layer
+        point_annotation = annotation_store.add_point(name, x, y, temp)
+        annotation_layer.add(point_annotation.key, record_items(point_annotation))
         
-        # Add name label
-        name_text = ax.text(x, y - 20, name.upper(),
-                      color='white', fontsize=TEXT_SIZE_MEDIUM, ha='center', fontweight='bold')
-        name_text.set_path_effects([plt_effects.withStroke(linewidth=STROKE_THICKNESS, foreground='black')])
-        
-        # Store annotation
-        point_annotation = {
-            'circle': circle,
-            'h_line_left': h_line_left,
-            'h_line_right': h_line_right,
-            'v_line_top': v_line_top,
-            'v_line_bottom': v_line_bottom,
-            'temp_text': temp_text,
-            'name_text': name_text,
-            'coords': (x, y),
-            'temp': temp,
-            'name': name
-        }
-        point_annotations.append(point_annotation)
-        
-        # Add to undo stack
-        undo_stack.append({
-            'type': 'point',
-            'annotation': point_annotation
-        })
+        # Add to undo history
+        history.push(AddAnnotations([point_annotation]))
         
         canvas.draw_idle()
-        root.after(100, update_temperature_table)  # Update table after a short delay
+        scheduler.request('table', update_temperature_table)  # Changed rows only, once per frame
 
 def clear_point_annotations():
-    global point_annotations
-    # Remove all point annotations
-    for point_annotation in point_annotations:
-        if point_annotation.get('circle'):
-            point_annotation['circle'].remove()
-        if point_annotation.get('h_line_left'):
-            point_annotation['h_line_left'].remove()
-        if point_annotation.get('h_line_right'):
-            point_annotation['h_line_right'].remove()
-        if point_annotation.get('v_line_top'):
-            point_annotation['v_line_top'].remove()
-        if point_annotation.get('v_line_bottom'):
-            point_annotation['v_line_bottom'].remove()
-        if point_annotation.get('temp_text'):
-            point_annotation['temp_text'].remove()
-        if point_annotation.get('name_text'):
-            point_annotation['name_text'].remove()
-    
-    # Clear the point annotations list
-    point_annotations = []
-    canvas.draw_idle()  # Use draw_idle instead of draw for smoother updates
-    root.after(100, update_temperature_table)  # Update table after a short delay
+    # Remove all point annotations (one undoable edit)
+    delete_annotations(list(annotation_store.points.values()))
+
+def toggle_region_mode():
+    global region_mode, point_annotation_mode
+    region_mode = not region_mode
+    if region_mode:
+        btn_region_mode.config(text="🧬 Region Mode\n(ON)")
+        if point_annotation_mode:
+            point_annotation_mode = False  # Both use the left click
+            btn_point_annotate.config(text="📍 Point Mode\n(OFF)")
+    else:
+        btn_region_mode.config(text="🧬 Region Mode\n(OFF)")
+        cancel_region()
+
+def region_settings():
+    # (tolerance, threshold or None) of the region controls
+    text = region_threshold_entry.get().strip()
+    return float(region_tolerance_slider.get()), float(text) if text else None
+
+def start_region(xdata, ydata):
+    # Grow a region from the clicked pixel. The window it can grow in is
+    # read once; tolerance changes only grow again.
+    global region_seed
+    x, y = int(round(xdata)), int(round(ydata))
+    if not (0 <= x < raster_source.width and 0 <= y < raster_source.height):
+        return
+    x0, y0, x1, y1 = region_grow.seed_window(raster_source.shape, x, y)
+    region_seed = (x, y, x0, y0, raster_source.read_region(x0, y0, x1, y1))
+    update_region_preview()
+
+def update_region_preview():
+    # Grow the region with the current settings and show its outline and
+    # measurements (blitted, so the figure isn't redrawn)
+    global region_preview, region_outline
+    if region_seed is None:
+        return
+    try:
+        tolerance, threshold = region_settings()
+    except ValueError:
+        region_info_label.config(text="Enter a number for the threshold")
+        return
+    x, y, x0, y0, window = region_seed
+    grown = region_grow.grow_region(window, x - x0, y - y0, tolerance, threshold)
+    if region_outline is not None:
+        blit_manager.remove_artist(region_outline)
+        region_outline = None
+    region_preview = None
+    if grown is None:
+        region_info_label.config(text="No region at this pixel")
+        blit_manager.update()
+        return
+    rx, ry, mask = grown
+    stats = thermal_core.mask_statistics(window[ry:ry + mask.shape[0], rx:rx + mask.shape[1]], mask,
+                                         BOX_PERCENTILES, offset=(x0 + rx, y0 + ry))
+    region_preview = (x0 + rx, y0 + ry, mask, stats)
+    region_outline = PathPatch(mask_outline_path(mask, x0 + rx, y0 + ry), fill=False, edgecolor='yellow',
+                               linewidth=1.5)
+    ax.add_patch(region_outline)
+    blit_manager.add_artist(region_outline)
+    blit_manager.update()
+    region_info_label.config(text=f"{stats['count']} px · Min {stats['min']:.1f} · Avg {stats['mean']:.1f} · "
+                                  f"Max {stats['max']:.1f} °C")
+
+def on_region_setting(value=None):
+    region_tolerance_label.config(text=f"±{float(region_tolerance_slider.get()):.1f} °C")
+    scheduler.request('region', update_region_preview)  # Once per frame while dragging
+
+def cancel_region(event=None):
+    global region_seed, region_preview, region_outline
+    if region_outline is not None:
+        blit_manager.remove_artist(region_outline)
+        blit_manager.update()
+    region_seed = region_preview = region_outline = None
+    region_info_label.config(text="")
+
+def add_region(event=None):
+    # The previewed region becomes an annotation (undoable)
+    if _typing_in(event) or region_preview is None:
+        return
+    x, y, mask, stats = region_preview
+    name = get_annotation_name("Region Name", "Enter a name for this region:")
+    if name is None or name.strip() == "":
+        return
+    cancel_region()
+    region = annotation_store.add_region(name, x, y, mask, stats)
+    annotation_layer.add(region.key, record_items(region))
+    history.push(AddAnnotations([region]))
+    canvas.draw_idle()
+    scheduler.request('table', update_temperature_table)  # Changed rows only, once per frame
+
+def clamp_span(lo, hi, size):
+    # Move [lo, hi] inside [0, size], keeping its length if it fits
+    span = min(hi - lo, size)
+    lo = min(max(lo, 0), size - span)
+    return lo, lo + span
 
 def clamp_view():
-    # Clamp the axes limits to the image bounds
-    xlim = list(ax.get_xlim())
-    ylim = list(ax.get_ylim())
-    width = thermal_data.shape[1]
-    height = thermal_data.shape[0]
-
-    # Clamp x
-    xlim[0] = max(0, min(xlim[0], width))
-    xlim[1] = max(0, min(xlim[1], width))
-    # Clamp y
-    ylim[0] = max(0, min(ylim[0], height))
-    ylim[1] = max(0, min(ylim[1], height))
-
-    ax.set_xlim(xlim)
-    ax.set_ylim(ylim)
+    # Clamp the axes limits to the image bounds without changing the zoom
+    # (and so the aspect) unless the view is larger than the image
+    height, width = raster_source.shape
+    x0, x1 = ax.get_xlim()
+    y_bottom, y_top = ax.get_ylim()  # Y-axis is inverted
+    ax.set_xlim(clamp_span(x0, x1, width))
+    y_top, y_bottom = clamp_span(y_top, y_bottom, height)
+    ax.set_ylim(y_bottom, y_top)
 
 def clear_all_annotations():
-    global undo_stack, annotations, point_annotations
-    # Clear box annotations
-    clear_annotations()
-    # Clear point annotations
-    clear_point_annotations()
-    # Remove any remaining text or shapes that might be outside the image
-    for text in ax.texts[:]:
-        text.remove()
-    for patch in ax.patches[:]:
-        patch.remove()
-    for line in ax.lines[:]:
-        line.remove()
-    # Clear the undo stack
-    undo_stack.clear()
-    canvas.draw_idle()  # Use draw_idle instead of draw for smoother updates
-    root.after(100, update_temperature_table)  # Update table after a short delay
+    # Remove all box and point annotations; undo brings them all back
+    delete_annotations(list(annotation_store.boxes.values()) + list(annotation_store.points.values()))
+
+def on_hotspot_setting(event=None):
+    # Check ΔT and the threshold (°C, empty for ΔT over the background) once
+    # they are edited; invalid input goes back to the last valid settings,
+    # which are what every opened image is scanned with
+    global hotspot_settings
+    threshold, delta_t = hotspot_settings
+    try:
+        text = hotspot_threshold_entry.get().strip()
+        settings = (float(text) if text else None, float(hotspot_delta_entry.get()))
+        if settings[1] <= 0:
+            raise ValueError
+    except ValueError:
+        hotspot_delta_entry.delete(0, tk.END)
+        hotspot_delta_entry.insert(0, f"{delta_t:g}")
+        hotspot_threshold_entry.delete(0, tk.END)
+        if threshold is not None:
+            hotspot_threshold_entry.insert(0, f"{threshold:g}")
+        tk.messagebox.showerror("Error", "Enter a positive ΔT and a number (or nothing) for the threshold.")
+        return False
+    if settings != hotspot_settings:
+        hotspot_settings = settings
+        frame_loader.detect = settings  # Neighbours are prefetched with the same settings
+    return True
+
+def detect_hotspots_clicked():
+    if on_hotspot_setting():
+        propose_hotspots()
+
+def clear_proposals():
+    for rect in proposal_rects.values():
+        blit_manager.remove_artist(rect)
+    proposal_rects.clear()
+    hotspot_proposals.clear()
+    proposal_table.delete(*proposal_table.get_children())
+
+def run_mosaic_hotspots(report, path, threshold, delta_t):
+    # Tiles are spread over a process pool, so mosaic_hotspots runs as its
+    # own process (see run_batch_reports)
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mosaic_hotspots.py"),
+               path, "--json", "--delta-t", str(delta_t)]
+    if threshold is not None:
+        command += ["--threshold", str(threshold)]
+    last = ""
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                          encoding='utf-8') as process:
+        for line in process.stderr:
+            last = line.strip()
+            if last.startswith("Tile "):
+                report(f"🔥 {last}")
+        output = process.stdout.read()
+    if process.returncode:
+        raise RuntimeError(last or f"mosaic_hotspots exited with {process.returncode}")
+    print(last)
+    return [mosaic_hotspots.proposal_from_dict(entry) for entry in json.loads(output)]
+
+def propose_hotspots(mosaics=True):
+    # Detect hot spots of the image: frames on every open (usually already
+    # done while the frame was prefetched, else in the background),
+    # orthomosaics (tile by tile in the background) when asked with Detect
+    clear_proposals()
+    if thermal_data is None and not mosaics:
+        blit_manager.update()
+        return
+    settings = hotspot_settings  # Validated when edited (on_hotspot_setting)
+    threshold, delta_t = settings
+    path = raster_source.path
+
+    def failed(job):
+        tk.messagebox.showerror("Error", f"Hot-spot detection failed: {str(job.error)}")
+
+    if thermal_data is None:
+        def finished(job):
+            if raster_source is not None and raster_source.path == path:  # Still the open image
+                show_proposals(job.result)
+                job_status(f"🔥 {len(hotspot_proposals)} hot spots proposed ({job.elapsed:.1f} s)")
+
+        job_queue.submit("Hot spots", run_mosaic_hotspots, path, threshold, delta_t,
+                         on_done=finished, on_error=failed, progress=True)
+        update_job_status()
+        return
+    frame = current_frame
+    if settings in frame.proposals:
+        show_proposals(frame.proposals[settings])
+        return
 
-def undo_last_annotation():
-    global undo_stack, annotations, point_annotations
-    
-    if not undo_stack:  # If stack is empty, nothing to undo
+    def detect():
+        if raster_source is None or raster_source.path != path:
+            return None  # Moved on before it was this job's turn
+        proposals = hotspot_detect.detect_hotspots(frame.source.array, threshold=threshold, delta_t=delta_t)
+        frame.proposals[settings] = proposals
+        return proposals
+
+    def detected(job):
+        if job.result is not None and raster_source is not None and raster_source.path == path:
+            show_proposals(job.result)
+            job_status(f"🔥 {len(hotspot_proposals)} hot spots proposed ({job.elapsed:.1f} s)")
+
+    # One detection at a time, so skipping through large frames doesn't pile them up
+    job_queue.submit("Hot spots", detect, on_done=detected, on_error=failed, lane='hotspots')
+    update_job_status()
+
+def show_proposals(proposals):
+    # List and outline the proposals; hot spots inside an existing box
+    # aren't proposed again
+    clear_proposals()
+    boxes = [box.bounds() for box in annotation_store.boxes.values()]
+    names = {box.name for box in annotation_store.boxes.values()}
+    number = 0
+    for proposal in proposals:
+        peak_x, peak_y = proposal.peak
+        if any(x1 <= peak_x < x2 and y1 <= peak_y < y2 for x1, y1, x2, y2 in boxes):
+            continue
+        number += 1
+        while f"Hot {number}" in names:
+            number += 1
+        proposal.name = f"Hot {number}"
+        row = proposal_table.insert('', 'end', values=(proposal.name, proposal.area, f"{proposal.min:.1f}",
+                                                       f"{proposal.mean:.1f}", f"{proposal.max:.1f}"))
+        hotspot_proposals[row] = proposal
+        rect = Rectangle((proposal.x, proposal.y), proposal.width, proposal.height, fill=False,
+                         edgecolor='cyan', linewidth=1, linestyle=':')
+        ax.add_patch(rect)
+        proposal_rects[row] = blit_manager.add_artist(rect)
+    blit_manager.update()
+
+def remove_proposals(rows):
+    for row in rows:
+        hotspot_proposals.pop(row)
+        blit_manager.remove_artist(proposal_rects.pop(row))
+        proposal_table.delete(row)
+    blit_manager.update()
+
+def accept_proposals(rows):
+    # The proposals become box annotations (one undoable edit)
+    records = []
+    for row in rows:
+        proposal = hotspot_proposals[row]
+        stats = box_statistics(proposal.x, proposal.y, proposal.width, proposal.height)
+        records.append(annotation_store.add_box(proposal.name, proposal.x, proposal.y, proposal.width,
+                                                proposal.height, stats))
+    remove_proposals(rows)
+    if not records:
         return
-        
-    last_action = undo_stack.pop()  # Get the last action from the stack
-    
-    if last_action['type'] == 'box':
-        annotation = last_action['annotation']
-        if annotation in annotations:
-            # Remove the box annotation
-            if annotation['rect']:
-                annotation['rect'].remove()
-            if annotation.get('min_circle'):
-                annotation['min_circle'].remove()
-            if annotation.get('max_circle'):
-                annotation['max_circle'].remove()
-            # Remove only the text elements associated with this specific box
-            texts_to_remove = []
-            for text in ax.texts:
-                text_content = text.get_text()
-                # Check if this text belongs to the current box being removed
-                if (text_content.startswith(annotation['name'].upper()) or
-                    (text_content.startswith('Min:') and text.get_position()[0] == annotation.get('min_circle', {}).center[0] if annotation.get('min_circle') else False) or
-                    (text_content.startswith('Max:') and text.get_position()[0] == annotation.get('max_circle', {}).center[0] if annotation.get('max_circle') else False) or
-                    (text_content.startswith('Avg:') and text.get_position()[0] == annotation['coords'][0])):
-                    texts_to_remove.append(text)
-            
-            # Remove the collected texts
-            for text in texts_to_remove:
-                text.remove()
-            
-            annotations.remove(annotation)
-            
-    elif last_action['type'] == 'point':
-        annotation = last_action['annotation']
-        if annotation in point_annotations:
-            # Remove the point annotation
-            if annotation.get('circle'):
-                annotation['circle'].remove()
-            if annotation.get('h_line_left'):
-                annotation['h_line_left'].remove()
-            if annotation.get('h_line_right'):
-                annotation['h_line_right'].remove()
-            if annotation.get('v_line_top'):
-                annotation['v_line_top'].remove()
-            if annotation.get('v_line_bottom'):
-                annotation['v_line_bottom'].remove()
-            if annotation.get('temp_text'):
-                annotation['temp_text'].remove()
-            if annotation.get('name_text'):
-                annotation['name_text'].remove()
-            point_annotations.remove(annotation)
-    
-    canvas.draw_idle()  # Use draw_idle instead of draw for smoother updates
-    root.after(100, update_temperature_table)  # Update table after a short delay
+    annotation_layer.add_many({record.key: record_items(record) for record in records})
+    history.push(AddAnnotations(records))
+    canvas.draw_idle()
+    scheduler.request('table', update_temperature_table)
+
+def accept_selected_proposals():
+    accept_proposals(proposal_table.selection())
+
+def accept_all_proposals():
+    accept_proposals(proposal_table.get_children())
+
+def reject_selected_proposals():
+    remove_proposals(proposal_table.selection())
+
+def undo_last_annotation(event=None):
+    if _typing_in(event):
+        return
+    if history.undo(history_editor) is not None:
+        canvas.draw_idle()
+        scheduler.request('table', update_temperature_table)  # Changed rows only, once per frame
+
+def redo_last_annotation(event=None):
+    if _typing_in(event):
+        return
+    if history.redo(history_editor) is not None:
+        canvas.draw_idle()
+        scheduler.request('table', update_temperature_table)  # Changed rows only, once per frame
+
+def write_pdf_report(export, report):
+    # Export the view, then lay out the PDF from it; runs in a job worker
+    thermal_img_path = write_export(export)
+    returned = Gen_reportV2.generate_report(thermal_img_path=thermal_img_path, **report)
+    return batch_report.report_pdf_path(report, returned)
 
 def generate_pdf_report():
     try:
-        # Export the current view first
-        export_current_view()
-        
         # Get all required values from UI elements
         project_name = project_var.get()
         project_owner = owner_var.get()
@@ -1220,18 +1633,20 @@ def generate_pdf_report():
             return
         
         # Use temperature values from the first box annotation
-        if not annotations:
+        if not annotation_store.boxes:
             tk.messagebox.showwarning("No Box Annotation", "Please create at least one box annotation to generate the PDF report.")
             return
-        box = annotations[0]
-        temp_min = box['min_temp']
-        temp_avg = box['avg_temp']
-        temp_max = box['max_temp']
+        box = next(iter(annotation_store.boxes.values()))
+        temp_min = box.min_temp
+        temp_avg = box.avg_temp
+        temp_max = box.max_temp
         
-        # Call Gen_reportV2.generate_report with the exported image path
-        Gen_reportV2.generate_report(
+        # Snapshot of the view and the form; the export and the PDF layout
+        # run in the background while the user moves on
+        export = export_snapshot()
+        save_annotations()  # So the report can be made again in batch
+        report = dict(
             thermal_path=file_path,
-            thermal_img_path=full_export_path,
             project_name=project_name,
             project_owner=project_owner,
             location_text=location_text,
@@ -1244,17 +1659,240 @@ def generate_pdf_report():
             radiation=round(float(radiation), 2)
         )
         
-        thermal_filename = os.path.splitext(os.path.basename(file_path))[0]
-        pdf_path = f"Report/{thermal_filename}_{location_text}.pdf"
-        # Show success message
-        tk.messagebox.showinfo("Success", f"{str(pdf_path)} report generated successfully!")
-        
     except Exception as e:
         print(e)
         tk.messagebox.showerror("Error", f"Failed to generate PDF report: {str(e)}")
+        return
+
+    def generated(job):
+        print_export_details(export)
+        job_status(f"📄 {job.result} generated ({job.elapsed:.1f} s)")
+
+    def failed(job):
+        print(job.error)
+        tk.messagebox.showerror("Error", f"Failed to generate PDF report: {str(job.error)}")
+
+    # Gen_reportV2 draws with pyplot, which is not thread-safe: one report at a time
+    job_queue.submit(f"Report {os.path.basename(file_path)}", write_pdf_report, export, report,
+                     on_done=generated, on_error=failed, lane='report')
+    update_job_status()
+
+def report_fields():
+    return {'project': project_var.get(), 'owner': owner_var.get(), 'location': location_var.get(),
+            'radiation': radiation_var.get(), 'defect': defect_var.get()}
+
+def sidecar_display():
+    x0, x1 = sorted(ax.get_xlim())
+    y0, y1 = sorted(ax.get_ylim())
+    return {'cmap': cmap_var.get(), 'vmin': vmin_slider.get(), 'vmax': vmax_slider.get(),
+            'view': [x0 + 0.5, y0 + 0.5, x1 + 0.5, y1 + 0.5], 'scale': export_view_scale()}
+
+# Annotations, report fields and display settings of the current image are
+# autosaved to its sidecar (annotation_sidecar): every few seconds only what
+# changed is appended to its journal, and the journal is folded into the
+# sidecar when leaving the image. They are restored when it is opened again.
+autosaver = None
+AUTOSAVE_MS = 2000
+
+def autosave():
+    if autosaver is None:
+        return
+    try:
+        autosaver.update(annotation_store, report_fields(), sidecar_display())
+    except OSError as e:
+        print(f"Error autosaving annotations: {e}")
+
+def autosave_loop():
+    autosave()
+    root.after(AUTOSAVE_MS, autosave_loop)
+
+def close_autosaver():
+    # Save the current image for good (before leaving it or exiting)
+    global autosaver
+    if autosaver is None:
+        return
+    autosave()
+    try:
+        autosaver.compact()
+    except OSError as e:
+        print(f"Error saving annotations: {e}")
+    autosaver = None
+
+def save_annotations(event=None):
+    # Save now (Ctrl+S), e.g. before running batch reports
+    if autosaver is None:
+        return
+    autosave()
+    try:
+        autosaver.compact()
+        if annotation_sidecar.has_sidecar(file_path):
+            job_status(f"💾 {os.path.basename(annotation_sidecar.sidecar_path(file_path))} saved")
+    except OSError as e:
+        tk.messagebox.showerror("Save Error", f"Failed to save annotations: {str(e)}")
+
+def restore_annotations(saved):
+    # Annotations and defect type saved with the image (annotation_sidecar.load)
+    if saved['annotations']:
+        insert_annotations(saved['annotations'])
+        scheduler.request('table', update_temperature_table)  # Changed rows only, once per frame
+    if saved['fields'].get('defect'):
+        defect_var.set(saved['fields']['defect'])
+
+def run_batch_reports(report, folder, total, export_dir, fields):
+    # batch_report runs as its own process: a process pool started from
+    # here would re-run this script in every worker on Windows
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "batch_report.py"),
+               folder, "--export-dir", export_dir]
+    for name, value in fields.items():
+        if str(value).strip():
+            command += [f"--{name}", str(value)]
+    done = errors = 0
+    last = ""
+    with subprocess.Popen(command, stderr=subprocess.PIPE, text=True, encoding='utf-8') as process:
+        for line in process.stderr:
+            print(line, end="")
+            if line.strip():
+                last = line.strip()
+            if ": done: " in line or ": failed: " in line:  # One line per image
+                done += 1
+                errors += ": failed: " in line
+                report(f"📚 {done}/{total} reports")
+    # batch_report exits with 1 when reports failed; fewer result lines than
+    # images means it stopped early
+    if process.returncode and done < total:
+        raise RuntimeError(last or f"batch_report exited with {process.returncode}")
+    return done, errors
+
+def batch_pdf_reports():
+    # PDF reports of every annotated (saved) image of a folder, in parallel.
+    # The project, owner, location and radiation filled in here apply to all
+    # of them; the defect type is the one saved with each image.
+    folder = filedialog.askdirectory(title="Folder of annotated images")
+    if not folder:
+        return
+    total = len(batch_report.report_images(collect_images([folder])))
+    if not total:
+        tk.messagebox.showwarning("No Annotated Images", "No images with saved box annotations in this folder.")
+        return
+    fields = report_fields()
+    fields.pop('defect')
+
+    def finished(job):
+        done, errors = job.result
+        job_status(f"📚 {done - errors}/{total} reports in {job.elapsed:.1f} s "
+                   f"({done / max(job.elapsed, 1e-9):.1f}/s)")
+        if errors:
+            tk.messagebox.showwarning("Batch Reports", f"{errors} of {total} reports failed (see the console).")
+
+    def failed(job):
+        tk.messagebox.showerror("Error", f"Batch reports failed: {str(job.error)}")
+
+    job_queue.submit("Batch reports", run_batch_reports, folder, total, export_path, fields,
+                     on_done=finished, on_error=failed, progress=True)
+    update_job_status()
+
+def run_site_report(report, folder, path, fields):
+    findings, site_fields = site_report.collect_findings(collect_images([folder]), fields)
+    if not findings:
+        raise ValueError("No images with saved box annotations in this folder.")
+    pages, _ = site_report.write_site_report(path, findings, site_fields,
+                                             progress=lambda done, total: report(f"🗂️ {done}/{total} findings"))
+    return path, len(findings), pages
+
+def generate_site_report():
+    # One PDF with a summary and a page per finding for all saved images of
+    # a folder, written page by page in the background
+    folder = filedialog.askdirectory(title="Folder of annotated images")
+    if not folder:
+        return
+    path = filedialog.asksaveasfilename(title="Save site report", defaultextension=".pdf",
+                                        initialfile="site_report.pdf", filetypes=[("PDF files", "*.pdf")])
+    if not path:
+        return
+    fields = report_fields()
+    fields.pop('defect')
+
+    def finished(job):
+        path, findings, pages = job.result
+        job_status(f"🗂️ {os.path.basename(path)}: {findings} findings, {pages} pages ({job.elapsed:.1f} s)")
+
+    def failed(job):
+        tk.messagebox.showerror("Error", f"Failed to generate the site report: {str(job.error)}")
+
+    job_queue.submit("Site report", run_site_report, folder, path, fields,
+                     on_done=finished, on_error=failed, progress=True)
+    update_job_status()
+
+def run_roi_series(report, template, paths, shape, path):
+    with open(path, 'w', newline='', encoding='utf-8') as out:
+        frames, _, _ = roi_series.run_series(template, paths, shape, out, path + ".stack.npy", progress=report)
+    return path, frames
+
+def apply_roi_series():
+    # Measure the current boxes and points on every frame of this image's
+    # folder with its size, into one CSV
+    if raster_source is None or not len(annotation_store):
+        tk.messagebox.showerror("Error", "Add boxes or points to use as the template first.")
+        return
+    path = filedialog.asksaveasfilename(title="Save ROI series", defaultextension=".csv",
+                                        initialfile="roi_series.csv", filetypes=[("CSV files", "*.csv")])
+    if not path:
+        return
+    template = roi_series.template_from_records(list(annotation_store.boxes.values()) +
+                                                list(annotation_store.points.values()))
+
+    def finished(job):
+        path, frames = job.result
+        job_status(f"📈 {os.path.basename(path)}: {len(template)} annotations on {frames} frames "
+                   f"({job.elapsed:.1f} s)")
+
+    def failed(job):
+        tk.messagebox.showerror("Error", f"Failed to measure the series: {str(job.error)}")
+
+    job_queue.submit("ROI series", run_roi_series, template, list(folder_images), raster_source.shape, path,
+                     on_done=finished, on_error=failed, progress=True)
+    update_job_status()
+
+# Exports and reports run in background workers; their results are picked
+# up on the Tk thread
+job_queue = JobQueue()
+JOB_POLL_MS = 100
+
+def job_status(text):
+    job_status_label.config(text=text)
+
+def update_job_status():
+    queued, running = job_queue.counts()
+    if queued or running:
+        job_status(" · ".join([f"⏳ {running} running, {queued} queued"] + job_queue.progress()))
+
+def check_overviews():
+    # The .ovr of a mosaic is built in the background (raster_source): say
+    # once per mosaic if it could not be
+    if raster_source is None or raster_source.in_memory:
+        return
+    building = f"🗺️ Building overviews for {os.path.basename(raster_source.path)}..."
+    if raster_source.building_overviews:
+        job_status(building)
+        return
+    if job_status_label.cget('text') == building:
+        job_status("" if raster_source.overview_error else "🗺️ Overviews ready")
+    if raster_source.overview_error and raster_source.path not in overview_warnings:
+        overview_warnings.add(raster_source.path)
+        tk.messagebox.showwarning(
+            "No Overviews",
+            f"Overviews could not be built for {os.path.basename(raster_source.path)}:\n"
+            f"{raster_source.overview_error}\n\nZoomed-out views are decimated while reading, which is slower.")
+
+def poll_jobs():
+    job_queue.poll()
+    check_overviews()
+    update_job_status()
+    root.after(JOB_POLL_MS, poll_jobs)
 
 # Add a function to refresh/restart the UI
 def refresh_ui():
+    close_autosaver()
     os.execl(sys.executable, sys.executable, *sys.argv)
 
 # Create Tkinter window
@@ -1263,6 +1901,9 @@ root.title("GIM R-Tiff Tools by KNP")
 root.geometry("1300x900")  # Set initial window size
 root.protocol("WM_DELETE_WINDOW", on_closing) 
 
+# Coalesces UI input (sliders, mouse motion, wheel, resize) into frames
+scheduler = FrameScheduler(root)
+
 # Create all Tkinter variables after root window creation
 project_var = tk.StringVar(root)
 owner_var = tk.StringVar(root)
@@ -1282,6 +1923,21 @@ top_frame.pack(fill=tk.X, padx=10, pady=5)
 btn_open = ttkb.Button(top_frame, text="Open Thermal Image", command=open_file)
 btn_open.pack(side=tk.LEFT, padx=5)
 
+btn_prev = ttkb.Button(top_frame, text="◀", width=3, command=show_previous_image)
+btn_prev.pack(side=tk.LEFT)
+btn_next = ttkb.Button(top_frame, text="▶", width=3, command=show_next_image)
+btn_next.pack(side=tk.LEFT, padx=(2, 5))
+root.bind('<Left>', show_previous_image)
+root.bind('<Right>', show_next_image)
+root.bind('<Delete>', delete_selected_annotation)
+root.bind('<F2>', rename_selected_annotation)
+root.bind('<Control-z>', undo_last_annotation)
+root.bind('<Control-y>', redo_last_annotation)
+root.bind('<Control-Z>', redo_last_annotation)  # Ctrl+Shift+Z
+root.bind('<Control-s>', save_annotations)
+root.bind('<Return>', add_region)
+root.bind('<Escape>', cancel_region)
+
 file_label = ttkb.Label(top_frame, text="📁 File: No file selected", font=("Arial", 12, "italic"))
 file_label.pack(side=tk.LEFT, padx=5)
 
@@ -1364,7 +2020,7 @@ style.configure("Blue.Horizontal.TScale",
 # Create sliders for adjusting vmin and vmax
 ttkb.Label(control_panel, text="Min Temp", font=("Arial", 10)).pack(anchor="w", pady=(5, 0))
 vmin_slider = ttkb.Scale(control_panel, from_=0, to=100, length=200, orient='horizontal',
-                         command=lambda val: update_slider_label(val, "vmin"), style='Blue.Horizontal.TScale')
+                         command=lambda val: on_slider_move(val, "vmin"), style='Blue.Horizontal.TScale')
 vmin_slider.pack()
 vmin_value_label = ttkb.Label(control_panel, text="0.0 °C", font=("Arial", 10))
 vmin_value_label.pack(anchor="e")
@@ -1372,7 +2028,7 @@ vmin_value_label.bind('<Button-1>', on_min_temp_click)
 
 ttkb.Label(control_panel, text="Max Temp", font=("Arial", 10)).pack(anchor="w", pady=(10, 0))
 vmax_slider = ttkb.Scale(control_panel, from_=0, to=100, length=200, orient='horizontal',
-                         command=lambda val: update_slider_label(val, "vmax"), style='Blue.Horizontal.TScale')
+                         command=lambda val: on_slider_move(val, "vmax"), style='Blue.Horizontal.TScale')
 vmax_slider.pack()
 vmax_value_label = ttkb.Label(control_panel, text="100.0 °C", font=("Arial", 10))
 vmax_value_label.pack(anchor="e")
@@ -1410,7 +2066,7 @@ defect_dropdown.bind("<<ComboboxSelected>>", on_defect_select)
 btn_reset = ttkb.Button(control_panel, text="Reset View", command=reset_view)
 btn_reset.pack(pady=15)
 
-# Create a frame for the 2x2 grid of clear and undo buttons
+# Create a frame for the grid of clear and undo / redo buttons
 clear_undo_frame = ttkb.Frame(control_panel)
 clear_undo_frame.pack(pady=5)
 
@@ -1430,6 +2086,9 @@ btn_clear_all.grid(row=1, column=0, padx=2, pady=2, sticky='ew')
 btn_undo = ttkb.Button(clear_undo_frame, text="↩️ Undo", command=undo_last_annotation, width=button_width)
 btn_undo.grid(row=1, column=1, padx=2, pady=2, sticky='ew')
 
+btn_redo = ttkb.Button(clear_undo_frame, text="↪️ Redo", command=redo_last_annotation, width=button_width)
+btn_redo.grid(row=2, column=1, padx=2, pady=2, sticky='ew')
+
 # Configure grid columns to have equal width
 clear_undo_frame.grid_columnconfigure(0, weight=1)
 clear_undo_frame.grid_columnconfigure(1, weight=1)
@@ -1445,6 +2104,29 @@ btn_annotate.grid(row=0, column=0, padx=2, pady=2, sticky='ew')
 btn_point_annotate = ttkb.Button(draw_mode_frame, text="📍 Point Mode\n(OFF)", command=toggle_point_annotation_mode, width=button_width)
 btn_point_annotate.grid(row=0, column=1, padx=2, pady=2, sticky='ew')
 
+btn_region_mode = ttkb.Button(draw_mode_frame, text="🧬 Region Mode\n(OFF)", command=toggle_region_mode, width=button_width)
+btn_region_mode.grid(row=1, column=0, padx=2, pady=2, sticky='ew')
+
+btn_add_region = ttkb.Button(draw_mode_frame, text="➕ Add Region\n(Enter)", command=add_region, width=button_width)
+btn_add_region.grid(row=1, column=1, padx=2, pady=2, sticky='ew')
+
+# Region growing: tolerance around the clicked pixel's temperature, or a
+# threshold; the preview follows the slider
+region_frame = ttkb.Frame(draw_mode_frame)
+region_frame.grid(row=2, column=0, columnspan=2, sticky='ew', pady=(5, 0))
+ttkb.Label(region_frame, text="Tolerance", font=("Arial", 9)).grid(row=0, column=0, sticky='w')
+region_tolerance_slider = ttkb.Scale(region_frame, from_=0.1, to=20.0, value=region_grow.TOLERANCE,
+                                     orient=tk.HORIZONTAL, length=120, command=on_region_setting)
+region_tolerance_slider.grid(row=0, column=1, padx=4)
+region_tolerance_label = ttkb.Label(region_frame, text=f"±{region_grow.TOLERANCE:.1f} °C", font=("Arial", 9))
+region_tolerance_label.grid(row=0, column=2, sticky='w')
+ttkb.Label(region_frame, text="or ≥ °C", font=("Arial", 9)).grid(row=1, column=0, sticky='w')
+region_threshold_entry = ttkb.Entry(region_frame, width=6)
+region_threshold_entry.grid(row=1, column=1, sticky='w', padx=4, pady=(2, 0))
+region_threshold_entry.bind('<KeyRelease>', on_region_setting)
+region_info_label = ttkb.Label(region_frame, text="", font=("Arial", 9))
+region_info_label.grid(row=2, column=0, columnspan=3, sticky='w')
+
 # Configure grid columns to have equal width
 draw_mode_frame.grid_columnconfigure(0, weight=1)
 draw_mode_frame.grid_columnconfigure(1, weight=1)
@@ -1452,10 +2134,62 @@ draw_mode_frame.grid_columnconfigure(1, weight=1)
 # Export button
 btn_export = ttkb.Button(control_panel, text="💾 Export View", command=export_current_view)
 btn_export.pack(pady=5)
+btn_export_folder = ttkb.Button(control_panel, text="📂 Export Folder", command=choose_export_folder)
+btn_export_folder.pack(pady=(0, 5))
+job_status_label = ttkb.Label(control_panel, text="", font=("Arial", 9))
+job_status_label.pack(pady=(0, 5))
 
 # Add this after creating the control panel
 table_frame = ttkb.Frame(control_panel)
 table_frame.pack(fill=tk.X, pady=10)
+ttkb.Label(table_frame, text="Temperature Values", font=("Arial", 10, "bold")).pack(pady=(0, 5))
+
+# Only the visible rows are drawn; click a heading to sort (e.g. by Max or ΔT)
+temperature_table = ttkb.Treeview(table_frame, columns=TABLE_COLUMNS, show='headings', height=8,
+                                  selectmode='browse')
+for column, width in zip(TABLE_COLUMNS, (90, 55, 55, 55, 55)):
+    temperature_table.heading(column, text=TABLE_HEADINGS[column],
+                              command=lambda column=column: sort_temperature_table(column))
+    temperature_table.column(column, width=width, anchor='w' if column == 'name' else 'e',
+                             stretch=column == 'name')
+table_scrollbar = ttkb.Scrollbar(table_frame, orient='vertical', command=temperature_table.yview)
+temperature_table.configure(yscrollcommand=table_scrollbar.set)
+temperature_table.pack(side=tk.LEFT, fill=tk.X, expand=True)
+table_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+temperature_table.bind('<<TreeviewSelect>>', on_table_select)
+
+# Hot-spot proposals: dashed on the image until accepted or rejected
+proposal_frame = ttkb.Frame(control_panel)
+proposal_frame.pack(fill=tk.X, pady=(0, 10))
+ttkb.Label(proposal_frame, text="Hot Spot Proposals", font=("Arial", 10, "bold")).pack(pady=(0, 5))
+hotspot_settings_frame = ttkb.Frame(proposal_frame)
+hotspot_settings_frame.pack(fill=tk.X)
+ttkb.Label(hotspot_settings_frame, text="ΔT:", font=("Arial", 9)).grid(row=0, column=0, sticky='w')
+hotspot_delta_entry = ttkb.Entry(hotspot_settings_frame, width=5)
+hotspot_delta_entry.insert(0, f"{hotspot_detect.DELTA_T:g}")
+hotspot_delta_entry.grid(row=0, column=1, padx=(2, 6))
+ttkb.Label(hotspot_settings_frame, text="or ≥ °C:", font=("Arial", 9)).grid(row=0, column=2, sticky='w')
+hotspot_threshold_entry = ttkb.Entry(hotspot_settings_frame, width=5)
+hotspot_threshold_entry.grid(row=0, column=3, padx=(2, 6))
+for entry in (hotspot_delta_entry, hotspot_threshold_entry):
+    entry.bind('<Return>', on_hotspot_setting)
+    entry.bind('<FocusOut>', on_hotspot_setting)
+btn_detect = ttkb.Button(hotspot_settings_frame, text="🔥 Detect", command=detect_hotspots_clicked)
+btn_detect.grid(row=0, column=4)
+proposal_table = ttkb.Treeview(proposal_frame, columns=PROPOSAL_COLUMNS, show='headings', height=5,
+                               selectmode='extended')
+for column, width in zip(PROPOSAL_COLUMNS, (70, 45, 50, 50, 50)):
+    proposal_table.heading(column, text=PROPOSAL_HEADINGS[column])
+    proposal_table.column(column, width=width, anchor='w' if column == 'name' else 'e', stretch=column == 'name')
+proposal_table.pack(fill=tk.X, pady=(5, 0))
+proposal_buttons = ttkb.Frame(proposal_frame)
+proposal_buttons.pack(pady=(5, 0))
+btn_accept_proposal = ttkb.Button(proposal_buttons, text="✔ Accept", command=accept_selected_proposals)
+btn_accept_proposal.grid(row=0, column=0, padx=2, sticky='ew')
+btn_reject_proposal = ttkb.Button(proposal_buttons, text="✖ Reject", command=reject_selected_proposals)
+btn_reject_proposal.grid(row=0, column=1, padx=2, sticky='ew')
+btn_accept_all_proposals = ttkb.Button(proposal_buttons, text="Accept All", command=accept_all_proposals)
+btn_accept_all_proposals.grid(row=0, column=2, padx=2, sticky='ew')
 
 # Add after the defect type dropdown in the control panel section
 # Project Information Frame
@@ -1485,6 +2219,12 @@ radiation_entry.pack(fill="x", pady=(0, 5))
 # Add after the radiation entry in the project frame
 btn_pdf = ttkb.Button(control_panel, text="📄 Generate PDF Report", command=generate_pdf_report)
 btn_pdf.pack(pady=5)
+btn_batch_pdf = ttkb.Button(control_panel, text="📚 Batch PDF Reports", command=batch_pdf_reports)
+btn_batch_pdf.pack(pady=(0, 5))
+btn_site_report = ttkb.Button(control_panel, text="🗂️ Site Report", command=generate_site_report)
+btn_site_report.pack(pady=(0, 5))
+btn_roi_series = ttkb.Button(control_panel, text="📈 ROI Series", command=apply_roi_series)
+btn_roi_series.pack(pady=(0, 5))
 
 # Add a refresh/restart button
 btn_refresh = ttkb.Button(top_frame, text="🔄 Refresh UI", command=refresh_ui)
@@ -1499,13 +2239,17 @@ def update_button_sizes(event=None):
     button_width = max(15, min(int(window_width / 4 / 8), 30))  # Min 15, max 30 characters
     
     # Update button widths
-    for button in [btn_open, btn_reset, btn_export, btn_pdf, btn_clear_boxes, 
-                  btn_clear_points, btn_clear_all, btn_undo, btn_annotate, 
-                  btn_point_annotate]:
+    for button in [btn_open, btn_reset, btn_export, btn_export_folder, btn_pdf, btn_batch_pdf, btn_site_report, btn_roi_series, btn_clear_boxes, 
+                  btn_clear_points, btn_clear_all, btn_undo, btn_redo, btn_annotate, 
+                  btn_point_annotate, btn_region_mode, btn_add_region]:
         button.configure(width=button_width)
 
-# Bind the resize event to the root window instead of control panel
-root.bind('<Configure>', update_button_sizes)
+# Bind the resize event to the root window instead of control panel.
+# <Configure> fires for every child widget too, so resize once per frame.
+root.bind('<Configure>', lambda event: scheduler.request('button_sizes', update_button_sizes))
+
+root.after(JOB_POLL_MS, poll_jobs)
+root.after(AUTOSAVE_MS, autosave_loop)
 
 # Update button sizes initially
 root.update_idletasks()
@@ -0,0 +1,500 @@
+import math
+
+import numpy as np
+from matplotlib.artist import Artist
+from matplotlib.backends.backend_agg import RendererAgg
+from matplotlib.collections import EllipseCollection, PathCollection
+from matplotlib.font_manager import FontProperties
+from matplotlib.path import Path
+from matplotlib.textpath import TextPath
+from matplotlib.transforms import Affine2D, IdentityTransform
+
+from hotspot_detect import mask_runs
+
+# Batched drawing of box, region and point annotations.
+#
+# Every annotation used to be 4-7 matplotlib artists (rectangle, circles,
+# crosshair lines, texts), each with a withStroke path effect, so drawing
+# time grew with the number of annotations. Here all annotations share a
+# fixed set of artists:
+#   - box and region outlines and crosshairs are one compound path per
+#     style, with a wider black path underneath standing in for the stroke
+#     effect;
+#   - rings and min / max dots are EllipseCollections;
+#   - labels are drawn by one artist from cached sprites (the stroked text
+#     rendered once per string and size), only for labels on screen.
+# Adding, moving or removing an annotation only writes its own rows of the
+# layer's arrays (see _Packed).
+
+# Style configuration variables (also used by the viewer's rubber band)
+TEXT_SIZE_SMALL = 8  # For temperature values
+TEXT_SIZE_MEDIUM = 9  # For annotation names
+CIRCLE_RADIUS = 2  # For point markers
+LINE_LENGTH = 7  # For crosshair lines
+LINE_GAP = 5  # For crosshair gap
+LINE_THICKNESS = 2  # For all lines
+BOX_LINE_THICKNESS = 2  # For box borders
+STROKE_THICKNESS = 3  # For text and shape outlines
+LABEL_OFFSET = 10  # Box labels start this many image pixels right of the box
+LABEL_SPACING = 13  # Vertical space between box labels
+
+# Label images kept (each annotation adds its own strings; a few KB each)
+SPRITE_CACHE_SIZE = 4096
+
+_BLUE = (0.0, 0.0, 1.0, 1.0)  # Min / max dots
+_RED = (1.0, 0.0, 0.0, 1.0)
+_BOLD = FontProperties(weight='bold')
+_sprites = {}
+
+
+def _label_sprite(text, size, ha, dpi):
+    # RGBA image of a label with its black outline, and the position of the
+    # text anchor (left or centre of the baseline) from the image's bottom-left
+    key = (text, size, ha, dpi)
+    sprite = _sprites.get(key)
+    if sprite is None:
+        path = TextPath((0, 0), text, size=size, prop=_BOLD)
+        scale = dpi / 72
+        extents = path.get_extents()
+        pad = STROKE_THICKNESS * scale
+        width = max(1, math.ceil(extents.width * scale + 2 * pad))
+        height = max(1, math.ceil(extents.height * scale + 2 * pad))
+        renderer = RendererAgg(width, height, dpi)
+        transform = Affine2D().translate(-extents.x0, -extents.y0).scale(scale).translate(pad, pad)
+        gc = renderer.new_gc()
+        gc.set_joinstyle('round')
+        gc.set_linewidth(STROKE_THICKNESS)
+        gc.set_foreground('black')
+        renderer.draw_path(gc, path, transform, (0, 0, 0, 1))
+        gc.set_linewidth(0)
+        renderer.draw_path(gc, path, transform, (1, 1, 1, 1))
+        gc.restore()
+        anchor_x = pad - extents.x0 * scale
+        if ha == 'center':
+            anchor_x += extents.width * scale / 2
+        # draw_image() takes rows bottom-up
+        sprite = (np.asarray(renderer.buffer_rgba())[::-1].copy(), anchor_x, pad - extents.y0 * scale)
+        if len(_sprites) >= SPRITE_CACHE_SIZE:
+            _sprites.clear()
+        _sprites[key] = sprite
+    return sprite
+
+
+class LabelArtist(Artist):
+    # Many stroked labels drawn as cached sprites in one artist
+    def __init__(self, ax):
+        super().__init__()
+        self.axes = ax
+        self.set_figure(ax.figure)
+        self.offsets = np.empty((0, 2))  # Label anchors in image coordinates
+        self.labels = []                 # (text, size, ha)
+
+    def set_labels(self, offsets, labels):
+        self.offsets = offsets
+        self.labels = labels
+        self.stale = True
+
+    def draw(self, renderer):
+        if not self.get_visible() or not len(self.labels):
+            return
+        bbox = self.axes.bbox
+        anchors = self.axes.transData.transform(self.offsets)
+        # Only labels near the visible area (they extend right / up of the anchor)
+        margin = 200 * renderer.dpi / 72
+        visible = np.nonzero((anchors[:, 0] > bbox.x0 - margin) & (anchors[:, 0] < bbox.x1) &
+                             (anchors[:, 1] > bbox.y0 - margin) & (anchors[:, 1] < bbox.y1 + margin))[0]
+        gc = renderer.new_gc()
+        gc.set_clip_rectangle(bbox)
+        for i in visible:
+            text, size, ha = self.labels[i]
+            image, anchor_x, anchor_y = _label_sprite(text, size, ha, renderer.dpi)
+            renderer.draw_image(gc, round(anchors[i, 0] - anchor_x), round(anchors[i, 1] - anchor_y), image)
+        gc.restore()
+        self.stale = False
+
+
+def _segments_arrays(parts, closed=False):
+    # Vertices and codes of many polylines (each an (n, 2) array) as one
+    # compound path; closed polygons repeat their first vertex last
+    if not parts:
+        return np.empty((0, 2)), np.empty(0, dtype=Path.code_type)
+    vertices = np.concatenate(parts)
+    codes = np.full(len(vertices), Path.LINETO, dtype=Path.code_type)
+    ends = np.cumsum([len(part) for part in parts])
+    codes[np.concatenate([[0], ends[:-1]])] = Path.MOVETO
+    if closed:
+        codes[ends - 1] = Path.CLOSEPOLY
+    return vertices, codes
+
+
+def _segments_path(parts, closed=False):
+    vertices, codes = _segments_arrays(parts, closed)
+    return Path(vertices, codes if len(codes) else None)
+
+
+def _set_ellipses(collection, offsets):
+    # Circles of CIRCLE_RADIUS image pixels at the offsets
+    sizes = np.full(len(offsets), 2.0 * CIRCLE_RADIUS)
+    collection.set_offsets(offsets)
+    collection.set_widths(sizes)
+    collection.set_heights(sizes)
+    collection.set_angles(np.zeros(len(offsets)))
+
+
+def box_items(x, y, width, height, name, min_point=None, max_point=None, avg_temp=None):
+    # Drawing primitives of a box annotation in image coordinates
+    outline = [np.array([(x, y), (x + width, y), (x + width, y + height), (x, y + height), (x, y)], float)]
+    circles = []
+    if min_point is not None:
+        circles.append((min_point[0], min_point[1], _BLUE))
+    if max_point is not None:
+        circles.append((max_point[0], max_point[1], _RED))
+    label_x = x + width + LABEL_OFFSET
+    labels = [(label_x, y, name.upper(), TEXT_SIZE_MEDIUM, 'left')]
+    if min_point is not None:
+        labels.append((label_x, y + LABEL_SPACING, f'Min: {min_point[2]:.1f}°C', TEXT_SIZE_SMALL, 'left'))
+    if avg_temp is not None:
+        labels.append((label_x, y + 2 * LABEL_SPACING, f'Avg: {avg_temp:.1f}°C', TEXT_SIZE_SMALL, 'left'))
+    if max_point is not None:
+        labels.append((label_x, y + 3 * LABEL_SPACING, f'Max: {max_point[2]:.1f}°C', TEXT_SIZE_SMALL, 'left'))
+    return {'outline': outline, 'edges': [], 'crosshair': [], 'rings': [], 'circles': circles, 'labels': labels}
+
+
+def point_items(x, y, name, temp):
+    # Crosshair with a gap at the centre, a ring and two labels above
+    crosshair = [np.array(segment, float) for segment in (
+        [(x - LINE_LENGTH, y), (x - LINE_GAP, y)],
+        [(x + LINE_GAP, y), (x + LINE_LENGTH, y)],
+        [(x, y - LINE_LENGTH), (x, y - LINE_GAP)],
+        [(x, y + LINE_GAP), (x, y + LINE_LENGTH)],
+    )]
+    labels = [
+        (x, y - 12, f'{temp:.1f}°C', TEXT_SIZE_SMALL, 'center'),
+        (x, y - 20, name.upper(), TEXT_SIZE_MEDIUM, 'center'),
+    ]
+    return {'outline': [], 'edges': [], 'crosshair': crosshair, 'rings': [(x, y)], 'circles': [], 'labels': labels}
+
+
+def mask_edges(mask, x, y):
+    # Outline of a mask whose top-left pixel is at (x, y), as straight
+    # segments along the pixel borders
+    padded = np.pad(mask, 1)
+    horizontal = padded[1:, 1:-1] != padded[:-1, 1:-1]  # Border above pixel row i
+    vertical = padded[1:-1, 1:] != padded[1:-1, :-1]  # Border left of pixel column j
+    lines, starts, ends = mask_runs(horizontal)
+    segments = np.stack([np.stack([x + starts, y + lines], axis=1),
+                         np.stack([x + ends, y + lines], axis=1)], axis=1)
+    lines, starts, ends = mask_runs(vertical.T)
+    vertical_segments = np.stack([np.stack([x + lines, y + starts], axis=1),
+                                  np.stack([x + lines, y + ends], axis=1)], axis=1)
+    return list(np.concatenate([segments, vertical_segments]).astype(float))
+
+
+def mask_outline_path(mask, x, y):
+    # The outline of mask_edges() as one path (e.g. for a live preview)
+    return _segments_path(mask_edges(mask, x, y))
+
+
+def region_items(x, y, mask, name, min_point=None, max_point=None, avg_temp=None):
+    # A box's labels and min / max dots around the outline of a mask
+    items = box_items(x, y, mask.shape[1], mask.shape[0], name, min_point, max_point, avg_temp)
+    items['outline'] = []
+    items['edges'] = mask_edges(mask, x, y)
+    return items
+
+
+def record_items(record):
+    # What the layer draws for an annotation_store record
+    if record.kind == 'box':
+        return box_items(*record.coords, record.name, record.min_point, record.max_point, record.avg_temp)
+    if record.kind == 'region':
+        return region_items(record.x, record.y, record.mask, record.name, record.min_point, record.max_point,
+                            record.avg_temp)
+    return point_items(record.x, record.y, record.name, record.temp)
+
+
+def _outline_path(outline, edges):
+    # Closed box outlines and open region edges as one compound path
+    if not edges:
+        return _segments_path(outline, closed=True)
+    return Path.make_compound_path(_segments_path(outline, closed=True), _segments_path(edges))
+
+
+class _Packed:
+    # Rows (vertices, offsets, labels) of many annotations in shared arrays
+    # that the layer's artists draw directly; the rows of each annotation
+    # are found through its span. Replacing an annotation by as many rows
+    # (a box being moved) overwrites them in place, other additions are
+    # appended to arrays grown by doubling, and removed rows are only masked
+    # out until they are half of the arrays. A single edit therefore costs
+    # the size of that annotation, not of all of them.
+    def __init__(self, **fields):
+        # fields: name -> (shape of one row, dtype)
+        self._arrays = {name: np.empty((0,) + shape, dtype) for name, (shape, dtype) in fields.items()}
+        self._live = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._dead = 0
+        self._spans = {}  # key -> (start, stop)
+
+    def set(self, key, **rows):
+        # Store the rows of an annotation; returns whether anything changed
+        count = len(next(iter(rows.values())))
+        span = self._spans.get(key)
+        if span is not None and span[1] - span[0] == count:
+            for name, values in rows.items():
+                self._arrays[name][span[0]:span[1]] = values
+            return True
+        changed = self.discard(key)
+        if not count:
+            return changed
+        self._reserve(self._size + count)
+        start, self._size = self._size, self._size + count
+        for name, values in rows.items():
+            self._arrays[name][start:self._size] = values
+        self._live[start:self._size] = True
+        self._spans[key] = (start, self._size)
+        return True
+
+    def discard(self, key):
+        span = self._spans.pop(key, None)
+        if span is None:
+            return False
+        self._live[span[0]:span[1]] = False
+        self._dead += span[1] - span[0]
+        if self._dead * 2 > self._size:
+            self._compact()
+        return True
+
+    def clear(self):
+        self._spans.clear()
+        self._live[:] = False
+        self._size = self._dead = 0
+
+    def _reserve(self, size):
+        capacity = len(self._live)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 64)
+        for name, array in self._arrays.items():
+            grown = np.empty((capacity,) + array.shape[1:], array.dtype)
+            grown[:self._size] = array[:self._size]
+            self._arrays[name] = grown
+        live = np.zeros(capacity, dtype=bool)
+        live[:self._size] = self._live[:self._size]
+        self._live = live
+
+    def _compact(self):
+        live = self._live[:self._size]
+        positions = np.concatenate([[0], np.cumsum(live)])
+        for name, array in self._arrays.items():
+            self._arrays[name] = array[:self._size][live]
+        self._spans = {key: (int(positions[start]), int(positions[stop])) for key, (start, stop) in self._spans.items()}
+        self._size = int(positions[-1])
+        self._live = np.ones(self._size, dtype=bool)
+        self._dead = 0
+
+    def get(self, name):
+        # The live rows of a field
+        array = self._arrays[name][:self._size]
+        return array[self._live[:self._size]] if self._dead else array
+
+
+def _pack(item):
+    # Rows of one annotation's primitives for the layer's _Packed arrays
+    outline, outline_codes = _segments_arrays(item['outline'], closed=True)
+    edges, edge_codes = _segments_arrays(item['edges'])
+    crosshair, crosshair_codes = _segments_arrays(item['crosshair'])
+    circles = item['circles']
+    labels = np.empty(len(item['labels']), dtype=object)  # (text, size, ha) tuples
+    for i, label in enumerate(item['labels']):
+        labels[i] = label[2:]
+    return {
+        'outline': {'vertices': np.concatenate([outline, edges]), 'codes': np.concatenate([outline_codes, edge_codes])},
+        'crosshair': {'vertices': crosshair, 'codes': crosshair_codes},
+        'rings': {'offsets': np.array(item['rings'], dtype=float).reshape(-1, 2)},
+        'dots': {'offsets': np.array([circle[:2] for circle in circles], dtype=float).reshape(-1, 2),
+                 'colors': np.array([circle[2] for circle in circles], dtype=float).reshape(-1, 4)},
+        'labels': {'anchors': np.array([label[:2] for label in item['labels']], dtype=float).reshape(-1, 2),
+                   'labels': labels},
+    }
+
+
+def _gather(entries):
+    # All primitives of several annotations, by kind
+    outline, edges, crosshair, rings, circles, labels = [], [], [], [], [], []
+    for item in entries:
+        outline.extend(item['outline'])
+        edges.extend(item['edges'])
+        crosshair.extend(item['crosshair'])
+        rings.extend(item['rings'])
+        circles.extend(item['circles'])
+        labels.extend(item['labels'])
+    return outline, edges, crosshair, rings, circles, labels
+
+
+def draw_items(renderer, entries, transform, clip=None):
+    # Draw annotations straight onto an Agg renderer with the same styles as
+    # the layer (used by exports). `transform` maps image coordinates to the
+    # renderer's pixels (origin bottom-left), `clip` is an optional Bbox.
+    outline, edges, crosshair, rings, circles, labels = _gather(entries)
+    gc = renderer.new_gc()
+    if clip is not None:
+        gc.set_clip_rectangle(clip)
+
+    def stroke(path, color, width, face=None):
+        gc.set_foreground(color)
+        gc.set_linewidth(width)
+        renderer.draw_path(gc, path, transform, face)
+
+    gc.set_joinstyle('miter')
+    if outline or edges:
+        path = _outline_path(outline, edges)
+        stroke(path, 'black', STROKE_THICKNESS)
+        stroke(path, 'white', BOX_LINE_THICKNESS)
+    for x, y in rings:
+        ring = Path.circle((x, y), CIRCLE_RADIUS)
+        stroke(ring, 'black', STROKE_THICKNESS)
+        stroke(ring, 'white', LINE_THICKNESS)
+    for x, y, color in circles:
+        dot = Path.circle((x, y), CIRCLE_RADIUS)
+        stroke(dot, 'black', STROKE_THICKNESS, (0, 0, 0, 1))
+        gc.set_linewidth(0)
+        renderer.draw_path(gc, dot, transform, color)
+    gc.set_capstyle('projecting')
+    if crosshair:
+        path = _segments_path(crosshair)
+        stroke(path, 'black', STROKE_THICKNESS)
+        stroke(path, 'white', LINE_THICKNESS)
+    for x, y, text, size, ha in labels:
+        image, anchor_x, anchor_y = _label_sprite(text, size, ha, renderer.dpi)
+        px, py = transform.transform((x, y))
+        renderer.draw_image(gc, round(px - anchor_x), round(py - anchor_y), image)
+    gc.restore()
+
+
+class AnnotationLayer:
+    def __init__(self, ax):
+        self._items = {}  # key -> primitives from box_items() / region_items() / point_items()
+        path = {'vertices': ((2,), float), 'codes': ((), Path.code_type)}
+        self._packed = {
+            'outline': _Packed(**path),
+            'crosshair': _Packed(**path),
+            'rings': _Packed(offsets=((2,), float)),
+            'dots': _Packed(offsets=((2,), float), colors=((4,), float)),
+            'labels': _Packed(anchors=((2,), float), labels=((), object)),
+        }
+        self.ax = None
+        self._artists = []
+        self.attach(ax)
+
+    def attach(self, ax):
+        # (Re)create the artists on an axes, e.g. after the figure was rebuilt
+        for artist in self._artists:
+            if artist.axes is not None and artist in artist.axes.get_children():
+                artist.remove()
+        self.ax = ax
+        self._artists = self._make_artists(ax)
+        self._update(self._artists)
+
+    def _make_artists(self, ax):
+        empty = np.empty((0, 2))
+
+        def lines(color, width, zorder, **style):
+            collection = PathCollection([], transform=IdentityTransform(), facecolors='none',
+                                        edgecolors=color, linewidths=width, zorder=zorder, **style)
+            collection.set_transform(ax.transData)
+            return collection
+
+        def ellipses(zorder, **style):
+            return EllipseCollection([], [], [], units='xy', offsets=empty, offset_transform=ax.transData,
+                                     zorder=zorder, **style)
+
+        artists = [
+            # Box outlines and crosshairs: black stroke under white lines
+            lines('black', STROKE_THICKNESS, 9, joinstyle='miter'),
+            lines('white', BOX_LINE_THICKNESS, 9.1, joinstyle='miter'),
+            lines('black', STROKE_THICKNESS, 11, capstyle='projecting'),
+            lines('white', LINE_THICKNESS, 11.1, capstyle='projecting'),
+            # Point rings and min / max dots (radius in image pixels); the
+            # black outlines of both are drawn first
+            ellipses(10, facecolors='black', edgecolors='black', linewidths=STROKE_THICKNESS),
+            ellipses(10.1, facecolors='none', edgecolors='white', linewidths=LINE_THICKNESS),
+            ellipses(10.2, edgecolors='none'),
+        ]
+        for artist in artists:
+            ax.add_collection(artist, autolim=False)
+        labels = LabelArtist(ax)
+        labels.set_zorder(12)
+        ax.add_artist(labels)
+        artists.append(labels)
+        return artists
+
+    def _update(self, artists, kinds=('outline', 'crosshair', 'rings', 'dots', 'labels')):
+        # Hand the packed rows of the changed kinds of primitives to the artists
+        outline_under, outline_over, cross_under, cross_over, ring_under, ring_over, dots, label_artist = artists
+        packed = self._packed
+        for kind, under, over in (('outline', outline_under, outline_over), ('crosshair', cross_under, cross_over)):
+            if kind in kinds:
+                codes = packed[kind].get('codes')
+                path = [Path(packed[kind].get('vertices'), codes if len(codes) else None)]
+                under.set_paths(path)
+                over.set_paths(path)
+
+        if 'rings' in kinds or 'dots' in kinds:
+            ring_offsets = packed['rings'].get('offsets')
+            dot_offsets = packed['dots'].get('offsets')
+            _set_ellipses(ring_under, np.concatenate([ring_offsets, dot_offsets]))
+            _set_ellipses(ring_over, ring_offsets)
+            _set_ellipses(dots, dot_offsets)
+            dots.set_facecolors(packed['dots'].get('colors'))
+            # Rings are hollow; only the dots' part of the outline layer is filled
+            under_faces = np.zeros((len(ring_offsets) + len(dot_offsets), 4))
+            under_faces[len(ring_offsets):, 3] = 1.0
+            ring_under.set_facecolors(under_faces)
+
+        if 'labels' in kinds:
+            label_artist.set_labels(packed['labels'].get('anchors'), packed['labels'].get('labels'))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def add(self, key, items):
+        self.add_many({key: items})
+
+    def add_many(self, entries):
+        # Add or replace several annotations (key -> items); only their rows
+        # are written and only the artists of the kinds they touch updated
+        changed = set()
+        for key, items in entries.items():
+            self._items[key] = items
+            for kind, rows in _pack(items).items():
+                if self._packed[kind].set(key, **rows):
+                    changed.add(kind)
+        if changed:
+            self._update(self._artists, changed)
+
+    def remove(self, *keys):
+        changed = set()
+        for key in keys:
+            if self._items.pop(key, None) is None:
+                continue
+            for kind, packed in self._packed.items():
+                if packed.discard(key):
+                    changed.add(kind)
+        if changed:
+            self._update(self._artists, changed)
+
+    def clear(self):
+        self._items.clear()
+        for packed in self._packed.values():
+            packed.clear()
+        self._update(self._artists)
+
+    def copy_to(self, ax):
+        # Draw the current annotations on another axes (exports)
+        artists = self._make_artists(ax)
+        self._update(artists)
+        return artists
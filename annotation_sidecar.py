@@ -0,0 +1,225 @@
+import base64
+import json
+import os
+
+import numpy as np
+
+from annotation_store import BoxAnnotation, PointAnnotation, RegionAnnotation
+
+# Annotations of an image saved next to it.
+#
+# DJI_0001_T.tif -> DJI_0001_T.tif.annotations.json holding the boxes and
+# regions (with their statistics; region masks as base64 bit arrays) and
+# points, the report fields (project, owner, location,
+# radiation, defect type) and the display settings (colormap, range, view),
+# so reports can be generated again later, also in batch, without opening
+# the image in the viewer, and the viewer restores them when the image is
+# opened again.
+#
+# The viewer autosaves through an Autosaver: each autosave takes the keys
+# the AnnotationStore reports as changed, serializes only those records and
+# appends the ones that differ from what was saved (and deleted keys) as JSON
+# lines to DJI_0001_T.tif.annotations.journal, so its cost depends on the
+# edit, not on the number of annotations, and an idle autosave is free. load()
+# replays the journal over the snapshot; compact() folds it back into the
+# snapshot (when leaving the image or when it grows long). A line cut short
+# by a crash is ignored.
+
+SIDECAR_SUFFIX = '.annotations.json'
+JOURNAL_SUFFIX = '.annotations.journal'
+SIDECAR_VERSION = 3
+
+# Journal lines before an autosave rewrites the snapshot instead
+JOURNAL_LIMIT = 500
+
+# Report fields stored per image
+FIELDS = ('project', 'owner', 'location', 'radiation', 'defect')
+
+
+def sidecar_path(image_path):
+    return image_path + SIDECAR_SUFFIX
+
+
+def journal_path(image_path):
+    return image_path + JOURNAL_SUFFIX
+
+
+def has_sidecar(image_path):
+    return os.path.exists(sidecar_path(image_path)) or os.path.exists(journal_path(image_path))
+
+
+def _encode_mask(mask):
+    return base64.b64encode(np.packbits(mask).tobytes()).decode('ascii')
+
+
+def _decode_mask(text, width, height):
+    bits = np.frombuffer(base64.b64decode(text), dtype=np.uint8)
+    return np.unpackbits(bits, count=width * height).astype(bool).reshape(height, width)
+
+
+def record_to_dict(record):
+    if record.kind == 'box':
+        return {'key': record.key, 'kind': 'box', 'name': record.name, 'x': record.x, 'y': record.y,
+                'width': record.width, 'height': record.height, 'stats': record.stats}
+    if record.kind == 'region':
+        return {'key': record.key, 'kind': 'region', 'name': record.name, 'x': record.x, 'y': record.y,
+                'width': record.width, 'height': record.height, 'mask': _encode_mask(record.mask),
+                'stats': record.stats}
+    return {'key': record.key, 'kind': 'point', 'name': record.name, 'x': record.x, 'y': record.y,
+            'temp': record.temp}
+
+
+def record_from_dict(entry, key):
+    if entry['kind'] in ('box', 'region'):
+        stats = entry.get('stats')
+        if stats:
+            stats = dict(stats, min_pos=tuple(stats['min_pos']), max_pos=tuple(stats['max_pos']))
+        if entry['kind'] == 'region':
+            mask = _decode_mask(entry['mask'], int(entry['width']), int(entry['height']))
+            return RegionAnnotation(key, entry['name'], entry['x'], entry['y'], mask, stats)
+        return BoxAnnotation(key, entry['name'], entry['x'], entry['y'], entry['width'], entry['height'], stats)
+    return PointAnnotation(key, entry['name'], entry['x'], entry['y'], entry['temp'])
+
+
+def _write_snapshot(image_path, entries, fields, display):
+    # Write atomically (a crash never leaves a half-written sidecar), then
+    # drop the journal it replaces
+    data = {
+        'version': SIDECAR_VERSION,
+        'image': os.path.basename(image_path),
+        'annotations': entries,
+        'fields': {name: value for name, value in (fields or {}).items() if name in FIELDS},
+        'display': display or {},
+    }
+    path = sidecar_path(image_path)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temp_path, path)
+    if os.path.exists(journal_path(image_path)):
+        os.remove(journal_path(image_path))
+    return path
+
+
+def save(image_path, records, fields=None, display=None):
+    return _write_snapshot(image_path, [record_to_dict(record) for record in records], fields, display)
+
+
+def _load_entries(image_path):
+    # Snapshot replayed with the journal: ({key: entry}, fields, display), or
+    # None if nothing was saved
+    data = None
+    try:
+        with open(sidecar_path(image_path), encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        pass
+    journal = []
+    try:
+        with open(journal_path(image_path), encoding='utf-8') as f:
+            journal = f.readlines()
+    except FileNotFoundError:
+        if data is None:
+            return None
+    data = data or {}
+    # Version 1 sidecars have no keys: number them in saved order
+    entries = {entry.get('key', index): entry for index, entry in enumerate(data.get('annotations', ()), 1)}
+    fields = data.get('fields', {})
+    display = data.get('display', {})
+    for line in journal:
+        try:
+            change = json.loads(line)
+        except ValueError:
+            break  # Cut short by a crash
+        if 'put' in change:
+            entries[change['put']['key']] = change['put']
+        elif 'delete' in change:
+            entries.pop(change['delete'], None)
+        if 'fields' in change:
+            fields = change['fields']
+        if 'display' in change:
+            display = change['display']
+    return entries, fields, display
+
+
+def load(image_path):
+    # Saved data of an image with its annotations as records (in the order
+    # they were added), or None if it has no sidecar
+    loaded = _load_entries(image_path)
+    if loaded is None:
+        return None
+    entries, fields, display = loaded
+    records = [record_from_dict(entry, key) for key, entry in entries.items()]
+    return {'annotations': records, 'fields': fields, 'display': display}
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+class Autosaver:
+    # Incremental saving of one image's annotations (see the top of the file)
+    def __init__(self, image_path):
+        self.image_path = image_path
+        self._entries = {}  # key -> record as last saved, in its JSON form
+        self._fields = {}
+        self._display = {}
+        self._journal_lines = 0
+        self._pending = set()  # Changed keys not yet compared with the saved records
+        loaded = _load_entries(image_path)
+        if loaded is not None:
+            entries, self._fields, self._display = loaded
+            self._entries = {key: _dumps(record_to_dict(record_from_dict(entry, key)))
+                             for key, entry in entries.items()}
+            if os.path.exists(journal_path(image_path)):
+                # Left over from a crash: folded into the snapshot on the next save
+                self._journal_lines = JOURNAL_LIMIT
+
+    def update(self, store, fields, display):
+        # Append what changed in an AnnotationStore since the last save;
+        # returns the number of journal lines written
+        self._pending |= store.take_changes()
+        fields = {name: value for name, value in fields.items() if name in FIELDS}
+        lines, puts = [], {}
+        for key in sorted(self._pending):  # Keys grow in creation order
+            record = store.get(key)
+            if record is not None:
+                entry = _dumps(record_to_dict(record))
+                if self._entries.get(key) != entry:
+                    puts[key] = entry
+                    lines.append('{"put":%s}' % entry)
+            elif key in self._entries:
+                lines.append(_dumps({'delete': key}))
+        if fields != self._fields:
+            lines.append(_dumps({'fields': fields}))
+        if display != self._display:
+            lines.append(_dumps({'display': display}))
+        if not lines:
+            self._pending.clear()
+            return 0
+        if not len(store) and not self._entries and not has_sidecar(self.image_path):
+            # Never create a sidecar for an image without annotations
+            self._pending.clear()
+            self._fields, self._display = fields, display
+            return 0
+        with open(journal_path(self.image_path), 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        # Written: until here a failed write leaves the keys pending for the next save
+        for key in self._pending:
+            if key in puts:
+                self._entries[key] = puts[key]
+            elif store.get(key) is None:
+                self._entries.pop(key, None)
+        self._pending.clear()
+        self._fields, self._display = fields, display
+        self._journal_lines += len(lines)
+        if self._journal_lines >= JOURNAL_LIMIT:
+            self.compact()
+        return len(lines)
+
+    def compact(self):
+        # Fold the journal into the snapshot
+        if os.path.exists(journal_path(self.image_path)):
+            _write_snapshot(self.image_path, [json.loads(entry) for entry in self._entries.values()],
+                            self._fields, self._display)
+        self._journal_lines = 0
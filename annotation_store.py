@@ -0,0 +1,231 @@
+import math
+
+# Box, region and point annotations with a grid index over their outlines.
+#
+# Records only hold geometry and statistics; drawing is done by
+# annotation_layer, keyed by the record's key. Each record is registered in
+# the grid cells its outline overlaps, so finding the annotation under the
+# cursor tests the few records of one cell instead of all of them, and
+# removing one only touches its own cells. Records spanning very many cells
+# (e.g. a box over most of an orthomosaic) are kept in a short list that is
+# always tested instead. The store also remembers which keys were added,
+# moved, renamed or removed, so autosaves (annotation_sidecar) only look at
+# those.
+
+CELL_SIZE = 64  # Grid cell size in image pixels
+MAX_CELLS = 256  # Records covering more cells than this are not gridded
+POINT_HIT_RADIUS = 8  # Point markers can be picked this far from their centre (image pixels)
+
+
+class BoxAnnotation:
+    __slots__ = ('key', 'name', 'x', 'y', 'width', 'height', 'stats')
+    kind = 'box'
+
+    def __init__(self, key, name, x, y, width, height, stats=None):
+        self.key = key
+        self.name = name
+        self.x, self.y = float(x), float(y)
+        self.width, self.height = float(width), float(height)
+        self.stats = stats  # thermal_core.roi_statistics() dict, None if the box holds no data
+
+    @property
+    def coords(self):
+        return self.x, self.y, self.width, self.height
+
+    def bounds(self):
+        return self.x, self.y, self.x + self.width, self.y + self.height
+
+    @property
+    def min_temp(self):
+        return self.stats['min'] if self.stats else None
+
+    @property
+    def max_temp(self):
+        return self.stats['max'] if self.stats else None
+
+    @property
+    def avg_temp(self):
+        return self.stats['mean'] if self.stats else None
+
+    @property
+    def min_point(self):
+        return (*self.stats['min_pos'], self.stats['min']) if self.stats else None
+
+    @property
+    def max_point(self):
+        return (*self.stats['max_pos'], self.stats['max']) if self.stats else None
+
+    def distance(self, x, y):
+        # 0 inside the box, else the distance to its outline
+        x1, y1, x2, y2 = self.bounds()
+        return math.hypot(max(x1 - x, 0, x - x2), max(y1 - y, 0, y - y2))
+
+
+class RegionAnnotation(BoxAnnotation):
+    # A box whose statistics only cover the pixels of a mask (region_grow);
+    # mask[i, j] is the pixel (x + j, y + i)
+    __slots__ = ('mask',)
+    kind = 'region'
+
+    def __init__(self, key, name, x, y, mask, stats=None):
+        super().__init__(key, name, x, y, mask.shape[1], mask.shape[0], stats)
+        self.mask = mask  # Boolean (height, width) array; stats from thermal_core.mask_statistics()
+
+    @property
+    def area(self):
+        return int(self.mask.sum())
+
+
+class PointAnnotation:
+    __slots__ = ('key', 'name', 'x', 'y', 'temp')
+    kind = 'point'
+
+    def __init__(self, key, name, x, y, temp):
+        self.key = key
+        self.name = name
+        self.x, self.y = float(x), float(y)
+        self.temp = float(temp)
+
+    @property
+    def coords(self):
+        return self.x, self.y
+
+    def bounds(self):
+        r = POINT_HIT_RADIUS
+        return self.x - r, self.y - r, self.x + r, self.y + r
+
+    def distance(self, x, y):
+        # Distance outside the pick radius (0 within it)
+        return max(0.0, math.hypot(x - self.x, y - self.y) - POINT_HIT_RADIUS)
+
+
+class GridIndex:
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self._cells = {}  # (column, row) -> set of keys
+        self._placed = {}  # key -> cells it is registered in, or None if ungridded
+        self._large = set()
+
+    def _cell_range(self, x1, y1, x2, y2):
+        size = self.cell_size
+        return (math.floor(x1 / size), math.floor(y1 / size),
+                math.floor(x2 / size), math.floor(y2 / size))
+
+    def insert(self, key, bounds):
+        c1, r1, c2, r2 = self._cell_range(*bounds)
+        if (c2 - c1 + 1) * (r2 - r1 + 1) > MAX_CELLS:
+            self._large.add(key)
+            self._placed[key] = None
+            return
+        cells = [(c, r) for r in range(r1, r2 + 1) for c in range(c1, c2 + 1)]
+        for cell in cells:
+            self._cells.setdefault(cell, set()).add(key)
+        self._placed[key] = cells
+
+    def remove(self, key):
+        cells = self._placed.pop(key, None)
+        if cells is None:
+            self._large.discard(key)
+            return
+        for cell in cells:
+            keys = self._cells[cell]
+            keys.discard(key)
+            if not keys:
+                del self._cells[cell]
+
+    def candidates(self, x, y, radius=0.0):
+        # Keys of records whose cells come within `radius` of (x, y)
+        c1, r1, c2, r2 = self._cell_range(x - radius, y - radius, x + radius, y + radius)
+        found = set(self._large)
+        for r in range(r1, r2 + 1):
+            for c in range(c1, c2 + 1):
+                found.update(self._cells.get((c, r), ()))
+        return found
+
+    def clear(self):
+        self._cells.clear()
+        self._placed.clear()
+        self._large.clear()
+
+
+class AnnotationStore:
+    def __init__(self):
+        self.boxes = {}  # key -> BoxAnnotation or RegionAnnotation, in creation order
+        self.points = {}  # key -> PointAnnotation
+        self._index = GridIndex()
+        self._next_key = 1
+        self._changed = set()  # Keys added, edited or removed since take_changes()
+
+    def __len__(self):
+        return len(self.boxes) + len(self.points)
+
+    def __contains__(self, key):
+        return key in self.boxes or key in self.points
+
+    def get(self, key):
+        return self.boxes.get(key) or self.points.get(key)
+
+    def add_box(self, name, x, y, width, height, stats=None):
+        return self.insert(BoxAnnotation(self._next_key, name, x, y, width, height, stats))
+
+    def add_region(self, name, x, y, mask, stats=None):
+        return self.insert(RegionAnnotation(self._next_key, name, x, y, mask, stats))
+
+    def add_point(self, name, x, y, temp):
+        return self.insert(PointAnnotation(self._next_key, name, x, y, temp))
+
+    def insert(self, record):
+        # Add a record (also one removed earlier or loaded from a sidecar,
+        # keeping its key)
+        self._next_key = max(self._next_key, record.key + 1)
+        records = self.points if record.kind == 'point' else self.boxes
+        records[record.key] = record
+        self._index.insert(record.key, record.bounds())
+        self._changed.add(record.key)
+        return record
+
+    def remove(self, key):
+        record = self.boxes.pop(key, None) or self.points.pop(key, None)
+        if record is not None:
+            self._index.remove(key)
+            self._changed.add(key)
+        return record
+
+    def move(self, key, x, y):
+        # Move a record's top-left corner (box, region) or centre (point) to
+        # (x, y); its measurements are updated by the caller
+        record = self.get(key)
+        self._index.remove(key)
+        record.x, record.y = float(x), float(y)
+        self._index.insert(key, record.bounds())
+        self._changed.add(key)
+        return record
+
+    def rename(self, key, name):
+        record = self.get(key)
+        record.name = name
+        self._changed.add(key)
+        return record
+
+    def take_changes(self):
+        # Keys of the records added, moved, renamed or removed since the last
+        # call (what an autosave has to write)
+        changed, self._changed = self._changed, set()
+        return changed
+
+    def hit_test(self, x, y, tolerance=0.0):
+        # Annotation under (x, y): the nearest point marker, else the smallest
+        # box containing it (or within `tolerance` image pixels of its outline)
+        best = None
+        for key in self._index.candidates(x, y, tolerance + POINT_HIT_RADIUS):
+            record = self.get(key)
+            distance = record.distance(x, y)
+            if distance > tolerance:
+                continue
+            if record.kind == 'point':
+                rank = (0, math.hypot(x - record.x, y - record.y))
+            else:
+                rank = (1, record.width * record.height)
+            if best is None or rank < best[0]:
+                best = (rank, record)
+        return best[1] if best else None
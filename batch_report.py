@@ -0,0 +1,178 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import annotation_sidecar
+from annotation_layer import record_items
+from exiftool_daemon import get_metadata
+from export_renderer import export_view, preload
+from raster_source import RasterSource
+from thermal_batch import collect_images
+from thermal_core import format_decimal_degrees, format_date_taken
+
+# PDF reports for a whole flight.
+#
+# Every image with a saved sidecar (see annotation_sidecar) holding at least
+# one box gets the same report the viewer's Generate PDF Report makes:
+# its view is exported (export_renderer) and Gen_reportV2 lays out
+# Report/<name>_<location>.pdf from it and the first box's temperatures.
+# Reports are spread over a process pool; each worker imports the report
+# module once (fonts, logos and templates it loads are reused for all its
+# reports) and warms the export renderer's colormap and font caches.
+#
+#   python batch_report.py "D:\Flights\Site_A" --project "Solar Farm A" --owner ACME --location "Row 12"
+#
+# Fields given here (or by the viewer) override the ones saved per image.
+
+_report_module = None
+
+
+def _init_worker():
+    global _report_module
+    import Gen_reportV2
+    _report_module = Gen_reportV2
+    preload()
+
+
+def report_images(paths):
+    # Images whose sidecar has a box (or region) annotation
+    found = []
+    for path in paths:
+        if not annotation_sidecar.has_sidecar(path):
+            continue
+        data = annotation_sidecar.load(path)
+        if any(record.kind != 'point' for record in data['annotations']):
+            found.append(path)
+    return found
+
+
+def report_fields(image_path, data, overrides):
+    # Report arguments of an image, or ValueError if something is missing
+    fields = dict(data['fields'])
+    fields.update({name: value for name, value in overrides.items() if value not in (None, '')})
+    missing = [name for name in annotation_sidecar.FIELDS if str(fields.get(name, '')).strip() == '']
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+    radiation = float(fields['radiation'])
+    if radiation > 1000:
+        raise ValueError("Radiation can't be more than 1000 W/m²")
+
+    metadata = get_metadata(image_path)
+    coord_text = "GPS: Unknown"
+    if metadata['lat'] is not None and metadata['lon'] is not None:
+        coord_text = format_decimal_degrees(metadata['lat'], metadata['lon'])
+    image_taken = "Date: Unknown"
+    if metadata['date_taken']:
+        try:
+            image_taken = format_date_taken(metadata['date_taken'])
+        except ValueError:
+            image_taken = metadata['date_taken']
+
+    box = next(record for record in data['annotations'] if record.kind != 'point')
+    return dict(
+        thermal_path=image_path,
+        project_name=fields['project'],
+        project_owner=fields['owner'],
+        location_text=fields['location'],
+        category_text=fields['defect'],
+        coord_text=coord_text,
+        image_taken=image_taken,
+        temp_min=round(float(box.min_temp), 1),
+        temp_avg=round(float(box.avg_temp), 1),
+        temp_max=round(float(box.max_temp), 1),
+        radiation=round(radiation, 2),
+    )
+
+
+def report_pdf_path(report, returned=None):
+    # PDF written by Gen_reportV2.generate_report(**report): the path it
+    # returned if it returns one, else its Report/<name>_<location>.pdf
+    # naming. FileNotFoundError if no such file was written.
+    if isinstance(returned, (str, os.PathLike)):
+        pdf_path = os.fspath(returned)
+    else:
+        name = os.path.splitext(os.path.basename(report['thermal_path']))[0]
+        pdf_path = f"Report/{name}_{report['location_text']}.pdf"
+    if not os.path.isfile(pdf_path):
+        raise FileNotFoundError(f"The report was not written to {pdf_path}")
+    return pdf_path
+
+
+def generate_one(image_path, export_dir, overrides):
+    # Export and report of one image; runs in a worker process
+    start = time.perf_counter()
+    try:
+        data = annotation_sidecar.load(image_path)
+        report = report_fields(image_path, data, overrides)
+        display = data['display']
+        name = os.path.basename(image_path)
+        export_path = os.path.join(export_dir, f"export_{name.rsplit('.', 1)[0]}.png")
+        source = RasterSource(image_path, build_overviews=False)
+        try:
+            data_range = source.min_max()
+            export_view(export_path, source, display.get('cmap', 'magma'),
+                        display.get('vmin', data_range[0]), display.get('vmax', data_range[1]),
+                        view=display.get('view'), annotations=[record_items(r) for r in data['annotations']],
+                        scale=display.get('scale', 1.0), data_range=data_range)
+        finally:
+            source.close()
+        returned = _report_module.generate_report(thermal_img_path=export_path, **report)
+        pdf_path = report_pdf_path(report, returned)
+        return {'path': image_path, 'pdf': pdf_path, 'seconds': time.perf_counter() - start}
+    except Exception as e:
+        return {'path': image_path, 'error': f"{type(e).__name__}: {e}", 'seconds': time.perf_counter() - start}
+
+
+def run_reports(paths, export_dir, overrides=None, workers=None):
+    # Yield one result dict per image as reports finish
+    os.makedirs(export_dir, exist_ok=True)
+    overrides = overrides or {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = {executor.submit(generate_one, path, export_dir, overrides): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except BrokenProcessPool as e:
+                # A worker died or failed to start (e.g. Gen_reportV2 did not
+                # import): every unfinished report fails with this
+                yield {'path': futures[future], 'error': f"BrokenProcessPool: {e}", 'seconds': 0.0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PDF reports for all annotated images of a flight")
+    parser.add_argument('inputs', nargs='+', help="Image directories, files or glob patterns")
+    parser.add_argument('-e', '--export-dir', default=os.environ.get('THERMAL_EXPORT_DIR', "Export PNG"),
+                        help="Folder for the exported views (default: THERMAL_EXPORT_DIR or 'Export PNG')")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Number of worker processes (default: all cores)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="Search directories recursively")
+    for name in annotation_sidecar.FIELDS:
+        parser.add_argument(f'--{name}', help=f"Report {name} for all images (default: as saved per image)")
+    args = parser.parse_args(argv)
+
+    paths = report_images(collect_images(args.inputs, recursive=args.recursive))
+    if not paths:
+        print("No annotated images found", file=sys.stderr)
+        return 1
+
+    overrides = {name: getattr(args, name) for name in annotation_sidecar.FIELDS}
+    start = time.perf_counter()
+    errors = 0
+    for result in run_reports(paths, args.export_dir, overrides, args.workers):
+        name = os.path.basename(result['path'])
+        if 'error' in result:
+            errors += 1
+            print(f"{name}: failed: {result['error']}", file=sys.stderr)
+        else:
+            print(f"{name}: done: {result['pdf']} ({result['seconds']:.2f} s)", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    print(f"Generated {len(paths) - errors} reports in {elapsed:.1f} s "
+          f"({len(paths) / elapsed:.1f} reports/s, {errors} errors)", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import numpy as np
+from matplotlib.colors import to_rgba
+from matplotlib.transforms import Bbox
+
+# Blitting for interactive overlays.
+#
+# A full canvas.draw() redraws the image, the colorbar and every annotation
+# with its path-effect strokes. While the user drags (rubber band, live
+# readouts, pan) only a few things actually change, so:
+#   - overlays are "animated" artists: skipped by normal draws, drawn on top
+#     of a cached bitmap of everything else and blitted to the screen;
+#   - during a pan the bitmap of the axes taken when the pan started is
+#     shifted by the pan offset and only the newly exposed strips are
+#     filled, by nearest-neighbour lookup into the image's RGBA array written
+#     straight into the canvas buffer. Annotations in those strips reappear
+#     with the full redraw at the end of the pan.
+# The cost of an interaction frame therefore no longer depends on how many
+# annotations are on the image.
+
+
+class BlitManager:
+    def __init__(self, canvas, ax, image):
+        self.canvas = canvas
+        self.ax = ax
+        self.image = image
+        self._artists = []
+        self._background = None   # Figure without the animated artists
+        self._pan_bitmap = None   # Axes contents when the pan started
+        self._pan_anchor = None   # (display, data) position of its corner
+        self._pan_moved = False
+        self._cid = canvas.mpl_connect("draw_event", self._on_draw)
+
+    def disconnect(self):
+        self.canvas.mpl_disconnect(self._cid)
+
+    def add_artist(self, artist):
+        artist.set_animated(True)
+        self._artists.append(artist)
+        return artist
+
+    def remove_artist(self, artist, keep=False):
+        # Stop animating an artist; with keep=True it stays on the axes as a
+        # normal artist (e.g. a finished rubber band becoming an annotation)
+        if artist in self._artists:
+            self._artists.remove(artist)
+        artist.set_animated(False)
+        if not keep and artist.axes is not None:
+            artist.remove()
+
+    def _on_draw(self, event):
+        # Called after every full draw: cache it, then put the overlays on top
+        self._background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        for artist in self._artists:
+            self.canvas.figure.draw_artist(artist)
+
+    def update(self):
+        # Redraw only the overlays
+        if self._background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_animated()
+        self.canvas.blit(self.canvas.figure.bbox)
+
+    @property
+    def panning(self):
+        return self._pan_bitmap is not None
+
+    def begin_pan(self):
+        if self._background is None:
+            return
+        self._pan_bitmap = self.canvas.copy_from_bbox(self.ax.bbox)
+        corner = (self.ax.bbox.x0, self.ax.bbox.y0)
+        self._pan_anchor = (corner, self.ax.transData.inverted().transform(corner))
+        self._pan_moved = False
+
+    def pan_update(self):
+        # Show the axes at their current limits by shifting the bitmap from
+        # the start of the pan and rendering the exposed strips of the image
+        if self._pan_bitmap is None:
+            self.canvas.draw_idle()
+            return
+        self._pan_moved = True
+        # Screen offset of the old contents, in pixel rows / columns with the
+        # origin at the top-left like the saved bitmap
+        (old_x, old_y), anchor = self._pan_anchor
+        new_x, new_y = self.ax.transData.transform(anchor)
+        dx = round(new_x - old_x)
+        dy = -round(new_y - old_y)
+        left, top, right, bottom = self._pan_bitmap.get_extents()
+        height = self.canvas.figure.bbox.height
+
+        # Area still covered by the shifted bitmap, and the strips around it
+        kept = (max(left, left + dx), max(top, top + dy), min(right, right + dx), min(bottom, bottom + dy))
+        if kept[2] <= kept[0] or kept[3] <= kept[1]:
+            kept = None
+            strips = [(left, top, right, bottom)]
+        else:
+            strips = [(left, top, kept[0], bottom), (kept[2], top, right, bottom),
+                      (kept[0], top, kept[2], kept[1]), (kept[0], kept[3], kept[2], bottom)]
+            strips = [strip for strip in strips if strip[2] > strip[0] and strip[3] > strip[1]]
+
+        figure = self.canvas.figure
+        rgba = np.ma.getdata(self.image.get_array())
+        if rgba.dtype == np.uint8 and rgba.ndim == 3 and rgba.shape[2] == 4:
+            for strip in strips:
+                self._fill_strip(rgba, *strip)
+        else:
+            # Not an RGBA image: let matplotlib draw it, clipped to the strips
+            image_clip = self.image.get_clip_box()
+            for x1, y1, x2, y2 in strips:
+                clip = Bbox.from_extents(x1, height - y2, x2, height - y1)
+                figure.patch.set_clip_box(clip)
+                figure.draw_artist(figure.patch)
+                self.image.set_clip_box(clip)
+                self.ax.draw_artist(self.image)
+            figure.patch.set_clip_box(None)
+            self.image.set_clip_box(image_clip)
+
+        if kept is not None:
+            # restore_region takes the source rectangle and an offset
+            source = (kept[0] - dx, kept[1] - dy, kept[2] - dx, kept[3] - dy)
+            self.canvas.restore_region(self._pan_bitmap, bbox=source, xy=(left + dx, top + dy))
+
+        self._background = self.canvas.copy_from_bbox(figure.bbox)
+        self._draw_animated()
+        self.canvas.blit(self.ax.bbox)
+
+    def _fill_strip(self, rgba, x1, y1, x2, y2):
+        # Nearest image pixel under the centre of every screen pixel of the
+        # strip (columns x1..x2, rows y1..y2 from the top of the canvas)
+        buffer = np.asarray(self.canvas.buffer_rgba())
+        height = self.canvas.figure.bbox.height
+        inverse = self.ax.transData.inverted()
+        columns = np.arange(x1, x2) + 0.5
+        rows = np.arange(y1, y2) + 0.5
+        data_x = inverse.transform(np.column_stack([columns, np.full_like(columns, height / 2)]))[:, 0]
+        data_y = inverse.transform(np.column_stack([np.full_like(rows, columns[0]), height - rows]))[:, 1]
+
+        left, right, bottom, top = self.image.get_extent()
+        image_h, image_w = rgba.shape[:2]
+        ix = np.floor((data_x - left) / (right - left) * image_w).astype(np.intp)
+        iy = np.floor((data_y - top) / (bottom - top) * image_h).astype(np.intp)
+        valid_x = (ix >= 0) & (ix < image_w)
+        valid_y = (iy >= 0) & (iy < image_h)
+
+        background = np.round(np.array(to_rgba(self.canvas.figure.get_facecolor())) * 255).astype(np.uint8)
+        pixels = rgba[np.clip(iy, 0, image_h - 1)[:, None], np.clip(ix, 0, image_w - 1)[None, :]]
+        # Composite over the background like Agg does (nodata is transparent)
+        alpha = pixels[..., 3:4].astype(np.uint16)
+        pixels = ((pixels.astype(np.uint16) * alpha + background.astype(np.uint16) * (255 - alpha) + 127) // 255)
+        pixels[..., 3] = 255
+        pixels[~(valid_y[:, None] & valid_x[None, :])] = background
+        buffer[y1:y2, x1:x2] = pixels
+
+    def end_pan(self):
+        # One full redraw brings back annotations, ticks and overlays exactly
+        self._pan_bitmap = None
+        self._pan_anchor = None
+        if self._pan_moved:
+            self.canvas.draw_idle()
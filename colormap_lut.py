@@ -0,0 +1,91 @@
+import matplotlib
+import numpy as np
+
+# Lookup-table rendering of temperature arrays.
+#
+# Temperatures are quantized once per image into LEVELS steps over the image's
+# full range. Changing the colormap or the vmin/vmax range then only rebuilds a
+# (LEVELS + 1)-entry RGBA table and maps every pixel through it with a single
+# np.take into a reusable uint8 buffer, instead of clipping, normalizing and
+# colormapping the float array again.
+
+# Quantization steps over the image range (0.025 °C for a 100 °C range)
+LEVELS = 4096
+
+# Entries sampled from a colormap, the same as matplotlib's default
+COLORMAP_ENTRIES = 256
+
+# Extra last table entry used for NaN (nodata) pixels
+NAN_INDEX = LEVELS
+
+_colormap_tables = {}
+
+
+def colormap_table(name, entries=COLORMAP_ENTRIES):
+    # RGBA uint8 table of a matplotlib colormap plus its "bad" color at the end
+    key = (name, entries)
+    table = _colormap_tables.get(key)
+    if table is None:
+        cmap = matplotlib.colormaps[name].resampled(entries)
+        table = np.empty((entries + 1, 4), dtype=np.uint8)
+        table[:entries] = cmap(np.arange(entries), bytes=True)
+        table[entries] = cmap(np.nan, bytes=True)
+        _colormap_tables[key] = table
+    return table
+
+
+def quantize(data, lo, hi, levels=LEVELS):
+    # Map temperatures in [lo, hi] to uint16 level indices; NaN -> NAN_INDEX
+    scale = (levels - 1) / (hi - lo) if hi > lo else 0.0
+    scaled = np.subtract(data, lo, dtype=np.float32)
+    scaled *= scale
+    np.clip(scaled, 0, levels - 1, out=scaled)
+    nan_mask = np.isnan(scaled)
+    has_nan = nan_mask.any()
+    if has_nan:
+        scaled[nan_mask] = 0
+    np.rint(scaled, out=scaled)
+    indices = scaled.astype(np.uint16)
+    if has_nan:
+        indices[nan_mask] = levels
+    return indices
+
+
+class LutRenderer:
+    def __init__(self, levels=LEVELS, entries=COLORMAP_ENTRIES):
+        self.levels = levels
+        self.entries = entries
+        self.data = None      # The array the indices were computed from
+        self.indices = None
+        self.lo = self.hi = 0.0
+        self._lut_key = None
+        self._lut = None
+
+    def set_data(self, data, lo, hi):
+        self.data = data
+        self.lo, self.hi = float(lo), float(hi)
+        self.indices = quantize(data, self.lo, self.hi, self.levels)
+        self._lut_key = None
+
+    def lookup_table(self, cmap, vmin, vmax):
+        # (levels + 1, 4) RGBA table for the current colormap and range. Uses
+        # matplotlib's rule (index = floor(t * entries)) so colors match imshow.
+        key = (cmap, float(vmin), float(vmax), self.lo, self.hi)
+        if key != self._lut_key:
+            table = colormap_table(cmap, self.entries)
+            values = np.linspace(self.lo, self.hi, self.levels)
+            span = vmax - vmin if vmax > vmin else 1e-12
+            positions = np.floor((values - vmin) / span * self.entries)
+            positions = np.clip(positions, 0, self.entries - 1).astype(np.intp)
+            lut = np.empty((self.levels + 1, 4), dtype=np.uint8)
+            lut[:self.levels] = table[positions]
+            lut[self.levels] = table[self.entries]
+            self._lut, self._lut_key = lut, key
+        return self._lut
+
+    def render(self, cmap, vmin, vmax, out=None):
+        # RGBA uint8 image of the quantized data; written into `out` if given
+        lut = self.lookup_table(cmap, vmin, vmax)
+        if out is None or out.shape != self.indices.shape + (4,):
+            out = np.empty(self.indices.shape + (4,), dtype=np.uint8)
+        return np.take(lut, self.indices, axis=0, out=out)
@@ -0,0 +1,174 @@
+import atexit
+import json
+import os
+import subprocess
+import sys
+import threading
+from collections import OrderedDict
+
+# One long-lived `exiftool -stay_open` process instead of a new Perl
+# interpreter per image. Requests are argument lists terminated by
+# -execute<N>; exiftool answers with JSON followed by a {ready<N>} line.
+
+# Tags needed by the viewer / batch tools; asking for a short list keeps
+# exiftool from formatting the whole maker-notes dump for every file.
+METADATA_TAGS = [
+    "-GPSLatitude", "-GPSLatitudeRef",
+    "-GPSLongitude", "-GPSLongitudeRef",
+    "-GPSAltitude", "-GPSAltitudeRef",
+    "-DateTimeOriginal", "-CreateDate", "-ModifyDate",
+    "-ImageWidth", "-ImageHeight",
+]
+
+# Files per request when extracting a large batch
+BATCH_SIZE = 500
+
+# Files whose metadata is kept in memory (a few hundred bytes each)
+CACHE_ENTRIES = 20000
+
+
+class ExifToolDaemon:
+    def __init__(self, executable="exiftool"):
+        self.executable = executable
+        self.process = None
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.process is not None and self.process.poll() is None:
+            return
+        kwargs = {}
+        if sys.platform == "win32":
+            kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW  # No console flashing
+        self.process = subprocess.Popen(
+            [self.executable, "-stay_open", "True", "-@", "-",
+             "-common_args", "-n", "-json", "-charset", "filename=utf8"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            **kwargs)
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            if self.process.poll() is None:
+                self.process.stdin.write(b"-stay_open\nFalse\n")
+                self.process.stdin.flush()
+                self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+        self.process = None
+
+    def execute_json(self, paths, tags=METADATA_TAGS):
+        # Metadata of all `paths` in one request, as a list of dicts (in order)
+        if not paths:
+            return []
+        with self._lock:
+            self.start()
+            self._counter += 1
+            ready = f"{{ready{self._counter}}}".encode()
+            args = list(tags) + list(paths) + [f"-execute{self._counter}"]
+            self.process.stdin.write(("\n".join(args) + "\n").encode("utf-8"))
+            self.process.stdin.flush()
+
+            lines = []
+            while True:
+                line = self.process.stdout.readline()
+                if not line:
+                    self.process = None
+                    raise RuntimeError("exiftool exited unexpectedly")
+                if line.rstrip() == ready:
+                    break
+                lines.append(line)
+        output = b"".join(lines).strip()
+        return json.loads(output.decode("utf-8")) if output else []
+
+
+def _signed(value, ref, negative_refs):
+    if value is None:
+        return None
+    value = float(value)
+    if ref in negative_refs and value > 0:
+        value = -value
+    return value
+
+
+def parse_metadata(tags):
+    # Convert one numeric (-n) exiftool JSON record to the viewer's metadata dict
+    date_taken = tags.get("DateTimeOriginal") or tags.get("CreateDate") or tags.get("ModifyDate")
+    return {
+        'lat': _signed(tags.get("GPSLatitude"), tags.get("GPSLatitudeRef"), ("S",)),
+        'lon': _signed(tags.get("GPSLongitude"), tags.get("GPSLongitudeRef"), ("W",)),
+        'altitude': _signed(tags.get("GPSAltitude"), tags.get("GPSAltitudeRef"), (1, "1")),
+        'date_taken': str(date_taken) if date_taken else None,
+    }
+
+
+EMPTY_METADATA = {'lat': None, 'lon': None, 'altitude': None, 'date_taken': None}
+
+_daemon = None
+_daemon_lock = threading.Lock()
+_cache = OrderedDict()  # (path, mtime_ns) -> metadata dict, in LRU order
+_cache_lock = threading.Lock()
+
+
+def get_daemon():
+    # Shared daemon for this process, started on first use (prefetch threads
+    # may ask at the same time: only one exiftool process is created)
+    global _daemon
+    with _daemon_lock:
+        if _daemon is None:
+            _daemon = ExifToolDaemon()
+            atexit.register(_daemon.close)
+        return _daemon
+
+
+def _cache_key(path):
+    try:
+        return (os.path.abspath(path), os.stat(path).st_mtime_ns)
+    except OSError:
+        return None
+
+
+def get_metadata_batch(paths):
+    # Metadata for many files: cached entries are returned directly, the rest
+    # are fetched from the daemon BATCH_SIZE files per request.
+    results = {}
+    missing = []
+    with _cache_lock:
+        for path in paths:
+            key = _cache_key(path)
+            if key is not None and key in _cache:
+                _cache.move_to_end(key)
+                results[path] = _cache[key]
+            else:
+                missing.append((path, key))
+
+    for start in range(0, len(missing), BATCH_SIZE):
+        chunk = missing[start:start + BATCH_SIZE]
+        try:
+            records = get_daemon().execute_json([path for path, key in chunk])
+        except Exception as e:
+            print(f"Error extracting metadata: {e}", file=sys.stderr)
+            records = []
+        # exiftool reports SourceFile for each record; files it could not
+        # read are simply missing from the output
+        by_source = {os.path.normcase(os.path.abspath(r.get("SourceFile", ""))): r for r in records}
+        with _cache_lock:
+            for path, key in chunk:
+                tags = by_source.get(os.path.normcase(os.path.abspath(path)))
+                metadata = parse_metadata(tags) if tags else dict(EMPTY_METADATA)
+                if key is not None and tags:
+                    _cache[key] = metadata
+                    if len(_cache) > CACHE_ENTRIES:
+                        _cache.popitem(last=False)
+                results[path] = metadata
+    return results
+
+
+def get_metadata(path):
+    return get_metadata_batch([path])[path]
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
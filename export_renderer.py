@@ -0,0 +1,242 @@
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+from matplotlib.backends.backend_agg import RendererAgg
+from matplotlib.font_manager import FontProperties
+from matplotlib.path import Path
+from matplotlib.textpath import TextPath
+from matplotlib.ticker import MaxNLocator
+from matplotlib.transforms import Affine2D, Bbox
+from PIL import Image
+
+from annotation_layer import draw_items
+from colormap_lut import LutRenderer, colormap_table
+from raster_source import RasterSource
+
+# Rendering of exported views straight into an image buffer.
+#
+# The old export rebuilt a matplotlib figure (image, colorbar axes, every
+# annotation artist) and saved it at 300 dpi with a tight bounding box, which
+# took seconds per image. Here the view is colormapped with the same lookup
+# table as the viewer and written into an Agg buffer at native resolution
+# (or any chosen scale), the colorbar is painted next to it and annotations
+# are drawn on top with the viewer's styles. The viewer and headless callers
+# go through render_view(), so the same view gives the same PNG.
+#
+#   python export_renderer.py DJI_0001_T.tif -o out.png --cmap inferno --vmin 20 --vmax 80
+
+# Renderer dpi at scale 1 (the viewer's figure dpi): sets the size of line
+# widths, labels and the colorbar relative to the image
+BASE_DPI = 100
+
+# Larger views are exported at a reduced scale (an orthomosaic at native
+# resolution would need gigabytes)
+MAX_PIXELS = 64 * 1024 * 1024
+
+# Colorbar geometry in points, like the viewer's make_axes_locatable colorbar
+COLORBAR_PAD = 3.6  # 0.05 inch
+COLORBAR_WIDTH = 0.05  # Fraction of the image width
+TICK_LENGTH = 3.5
+TICK_PAD = 3.5
+TICK_LABEL_SIZE = 10
+OUTLINE_WIDTH = 0.8
+MARGIN = 2  # Around the whole export
+
+BACKGROUND = (255, 255, 255, 255)
+
+# zlib level of saved PNGs: about twice as fast as PIL's default, similar size
+PNG_COMPRESS_LEVEL = 1
+
+_TICK_FONT = FontProperties(size=TICK_LABEL_SIZE)
+_text_paths = {}  # Tick label -> (path in points, its extents)
+
+
+def _tick_labels(ticks):
+    # Fewest decimals that still tell the ticks apart exactly
+    for decimals in range(4):
+        labels = [f"{tick:.{decimals}f}" for tick in ticks]
+        if all(abs(float(label) - tick) < 1e-9 for label, tick in zip(labels, ticks)):
+            return labels
+    return labels
+
+
+def _colorbar_ticks(vmin, vmax, length_pt):
+    # Same choice of ticks as a matplotlib colorbar of that length
+    nbins = int(np.clip(math.floor(length_pt / (TICK_LABEL_SIZE * 2)), 1, 9))
+    ticks = MaxNLocator(nbins=nbins, steps=[1, 2, 2.5, 5, 10]).tick_values(vmin, vmax)
+    ticks = [float(tick) for tick in ticks if vmin - 1e-9 <= tick <= vmax + 1e-9]
+    return ticks, _tick_labels(ticks)
+
+
+def _text_path(text, points_to_pixels):
+    cached = _text_paths.get(text)
+    if cached is None:
+        path = TextPath((0, 0), text, prop=_TICK_FONT)
+        cached = _text_paths[text] = (path, path.get_extents())
+    path, extents = cached
+    return path, extents.transformed(Affine2D().scale(points_to_pixels))
+
+
+def preload(cmap='magma'):
+    # Load a colormap table and the tick label font ahead of the first export
+    # (e.g. once per worker process)
+    colormap_table(cmap)
+    _text_path('0', 1.0)
+
+
+def _composite(rgba, background=BACKGROUND):
+    # Transparent (nodata) pixels over the background, like Agg does
+    alpha = rgba[..., 3:4].astype(np.uint16)
+    out = (rgba.astype(np.uint16) * alpha + np.array(background, np.uint16) * (255 - alpha) + 127) // 255
+    out[..., 3] = 255
+    return out.astype(np.uint8)
+
+
+def _sample_indices(start, stop, count, origin, factor, size):
+    # Index into a decimated array of the image pixel under the centre of
+    # each of `count` output pixels spanning image pixels [start, stop)
+    image = np.floor(start + (np.arange(count) + 0.5) * ((stop - start) / count)).astype(np.intp)
+    return np.clip((image - origin) // factor, 0, size - 1)
+
+
+def render_view(source, cmap, vmin, vmax, view=None, annotations=(), scale=1.0,
+                data_range=None, colorbar=True):
+    # RGBA uint8 image of a view of a RasterSource.
+    #   view         (x0, y0, x1, y1) in image pixels, default the whole image
+    #   annotations  annotation_layer.record_items() dicts
+    #   scale        output pixels per image pixel
+    #   data_range   quantization range of the colormap lookup table; pass the
+    #                viewer's so colors match it exactly (default: the image's)
+    if view is None:
+        view = (0, 0, source.width, source.height)
+    x0 = max(0, math.floor(view[0]))
+    y0 = max(0, math.floor(view[1]))
+    x1 = min(source.width, math.ceil(view[2]))
+    y1 = min(source.height, math.ceil(view[3]))
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError("The view does not cover the image")
+    scale = min(scale, math.sqrt(MAX_PIXELS / ((x1 - x0) * (y1 - y0))))
+    image_w = max(1, round((x1 - x0) * scale))
+    image_h = max(1, round((y1 - y0) * scale))
+    if data_range is None:
+        data_range = source.min_max()
+
+    # Colormapped pixels: quantize the (possibly decimated) window once, then
+    # pick the index under every output pixel
+    data, bounds = source.read_window(x0, y0, x1, y1, scale=1 / scale)
+    factor = source.factor_for_scale(1 / scale)
+    lut = LutRenderer()
+    lut.set_data(data, *data_range)
+    iy = _sample_indices(y0, y1, image_h, bounds[1], factor, data.shape[0])
+    ix = _sample_indices(x0, x1, image_w, bounds[0], factor, data.shape[1])
+    pixels = lut.lookup_table(cmap, vmin, vmax)[lut.indices[np.ix_(iy, ix)]]
+
+    # Never draw overlays smaller than on screen
+    dpi = BASE_DPI * max(1.0, scale)
+    points_to_pixels = dpi / 72
+
+    # Layout, in pixels from the top-left: image, pad, bar, ticks, labels
+    margin = round(MARGIN * points_to_pixels)
+    top = margin
+    width = image_w + 2 * margin
+    height = image_h + 2 * margin
+    if colorbar:
+        ticks, labels = _colorbar_ticks(vmin, vmax, image_h / points_to_pixels)
+        texts = [_text_path(label, points_to_pixels) for label in labels]
+        label_w = max((extents.width for _, extents in texts), default=0)
+        label_h = max((extents.height for _, extents in texts), default=0)
+        # Room for the labels at the ends of the bar
+        top += math.ceil(label_h / 2)
+        height += 2 * math.ceil(label_h / 2)
+        bar_x = margin + image_w + round(COLORBAR_PAD * points_to_pixels)
+        bar_w = max(1, round(image_w * COLORBAR_WIDTH))
+        text_x = bar_x + bar_w + (TICK_LENGTH + TICK_PAD) * points_to_pixels
+        width = math.ceil(text_x + label_w) + margin
+
+    renderer = RendererAgg(width, height, dpi)
+    buffer = np.asarray(renderer.buffer_rgba())
+    buffer[:] = BACKGROUND
+    buffer[top:top + image_h, margin:margin + image_w] = _composite(pixels)
+    bottom = height - top - image_h  # Renderer coordinates start at the bottom
+    image_box = Bbox.from_bounds(margin, bottom, image_w, image_h)
+
+    if colorbar:
+        # Gradient like matplotlib's: 256 colors from vmax at the top to vmin
+        table = colormap_table(cmap)
+        entries = len(table) - 1
+        rows = np.minimum(((image_h - 1 - np.arange(image_h) + 0.5) / image_h * entries).astype(np.intp), entries - 1)
+        buffer[top:top + image_h, bar_x:bar_x + bar_w] = _composite(table[rows])[:, None]
+
+        gc = renderer.new_gc()
+        gc.set_foreground('black')
+        gc.set_linewidth(OUTLINE_WIDTH)
+        gc.set_capstyle('butt')
+        bar_box = Path([(bar_x, bottom), (bar_x + bar_w, bottom), (bar_x + bar_w, bottom + image_h),
+                        (bar_x, bottom + image_h), (bar_x, bottom)], closed=True)
+        renderer.draw_path(gc, bar_box, Affine2D())
+        span = vmax - vmin if vmax > vmin else 1.0
+        tick_end = bar_x + bar_w + TICK_LENGTH * points_to_pixels
+        for tick, (path, extents) in zip(ticks, texts):
+            y = bottom + (tick - vmin) / span * image_h
+            renderer.draw_path(gc, Path([(bar_x + bar_w, y), (tick_end, y)]), Affine2D())
+            # Label vertically centred on its tick
+            offset = Affine2D().scale(points_to_pixels).translate(text_x - extents.x0,
+                                                                  y - extents.y0 - extents.height / 2)
+            gc.set_linewidth(0)
+            renderer.draw_path(gc, path, offset, (0, 0, 0, 1))
+            gc.set_linewidth(OUTLINE_WIDTH)
+        gc.restore()
+
+    if annotations:
+        # Image coordinates (pixel centres at whole numbers) to renderer pixels
+        transform = (Affine2D().translate(0.5 - x0, 0.5 - y0)
+                     .scale(image_w / (x1 - x0), -image_h / (y1 - y0))
+                     .translate(margin, bottom + image_h))
+        draw_items(renderer, annotations, transform, clip=image_box)
+
+    return buffer.copy()
+
+
+def export_view(path, source, cmap, vmin, vmax, **options):
+    # Render a view (see render_view) and save it as PNG
+    image = Image.fromarray(render_view(source, cmap, vmin, vmax, **options), 'RGBA')
+    image.save(path, compress_level=PNG_COMPRESS_LEVEL)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a thermal TIFF as a colormapped PNG with colorbar")
+    parser.add_argument('input', help="Thermal TIFF image or orthomosaic")
+    parser.add_argument('-o', '--output', help="Output .png (default: export_<name>.png next to the input)")
+    parser.add_argument('--cmap', default='magma', help="Matplotlib colormap (default: magma)")
+    parser.add_argument('--vmin', type=float, help="Lower end of the color range (default: image minimum)")
+    parser.add_argument('--vmax', type=float, help="Upper end of the color range (default: image maximum)")
+    parser.add_argument('--scale', type=float, default=1.0, help="Output pixels per image pixel (default: 1)")
+    parser.add_argument('--no-colorbar', action='store_true', help="Export the image only")
+    args = parser.parse_args(argv)
+
+    output = args.output
+    if output is None:
+        folder, name = os.path.split(args.input)
+        output = os.path.join(folder, f"export_{name.rsplit('.', 1)[0]}.png")
+
+    start = time.perf_counter()
+    source = RasterSource(args.input, build_overviews=False)
+    try:
+        data_range = source.min_max()
+        vmin = data_range[0] if args.vmin is None else args.vmin
+        vmax = data_range[1] if args.vmax is None else args.vmax
+        export_view(output, source, args.cmap, vmin, vmax, scale=args.scale,
+                    data_range=data_range, colorbar=not args.no_colorbar)
+    finally:
+        source.close()
+    print(f"Exported {output} in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import hotspot_detect
+from exiftool_daemon import get_metadata, get_metadata_batch
+from raster_source import RasterSource, is_lazy
+from roi_index import RoiIndex
+from thermal_core import image_statistics
+
+# Decoded frames for fast folder navigation.
+#
+# A Frame bundles everything the viewer needs to show an image: the raster
+# source (pixels), its EXIF metadata, precomputed statistics, the box
+# statistics index (roi_index) and its hot-spot proposals. Neighbours of the
+# current image are decoded and indexed in background threads (rasterio and
+# numpy release the GIL) into a size-bounded LRU cache, so flipping to the
+# next or previous image only has to redraw. Orthomosaics are not prefetched:
+# they are read lazily anyway and would take a large share of the budget.
+
+# Images decoded ahead in each direction
+PREFETCH_NEIGHBORS = 2
+
+# Memory budget for decoded frames
+CACHE_BYTES = 512 * 1024 * 1024
+
+# Frames up to this many pixels get their hot spots detected while loading;
+# larger ones are detected by the viewer in the background once shown
+DETECT_PIXELS = 2048 * 2048
+
+
+class Frame:
+    __slots__ = ('path', 'mtime_ns', 'source', 'metadata', 'stats', 'roi_index', 'proposals')
+
+    def __init__(self, path, mtime_ns, source, metadata, stats, roi_index=None, proposals=None):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.source = source
+        self.metadata = metadata
+        self.stats = stats
+        self.roi_index = roi_index  # RoiIndex of in-memory frames, None for mosaics
+        self.proposals = proposals or {}  # (threshold, delta_t) -> hotspot_detect proposals
+
+    @property
+    def nbytes(self):
+        if not self.source.in_memory:
+            return self.source.max_cache_bytes
+        return self.source.array.nbytes + (self.roi_index.nbytes if self.roi_index is not None else 0)
+
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_frame(path, detect=None, build_overviews=True):
+    # Decode and index one image; `detect` is the (threshold, delta_t) to
+    # propose hot spots with, or None
+    mtime_ns = _mtime_ns(path)
+    source = RasterSource(path, build_overviews=build_overviews)
+    roi_index, proposals = None, {}
+    if source.in_memory:
+        stats = image_statistics(source.array)
+        roi_index = RoiIndex(source.array)
+        if detect is not None and source.array.size <= DETECT_PIXELS:
+            threshold, delta_t = detect
+            proposals[detect] = hotspot_detect.detect_hotspots(source.array, threshold, delta_t)
+    else:
+        min_val, max_val = source.min_max()
+        stats = {'width': source.width, 'height': source.height, 'min': min_val, 'max': max_val}
+    return Frame(path, mtime_ns, source, get_metadata(path), stats, roi_index, proposals)
+
+
+class FrameCache:
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.pinned = None  # Path of the frame on screen, never evicted
+
+    def __contains__(self, path):
+        with self._lock:
+            return path in self._frames
+
+    def get(self, path):
+        with self._lock:
+            frame = self._frames.get(path)
+            if frame is None:
+                return None
+            if frame.mtime_ns != _mtime_ns(path):  # Changed on disk
+                self._remove(path)
+                return None
+            self._frames.move_to_end(path)
+            return frame
+
+    def put(self, frame):
+        with self._lock:
+            if frame.path in self._frames:
+                self._remove(frame.path)
+            self._frames[frame.path] = frame
+            self._nbytes += frame.nbytes
+            for path in list(self._frames):
+                if self._nbytes <= self.max_bytes or len(self._frames) <= 1:
+                    break
+                if path != self.pinned and path != frame.path:
+                    self._remove(path)
+
+    def _remove(self, path):
+        frame = self._frames.pop(path)
+        self._nbytes -= frame.nbytes
+        if path != self.pinned:
+            frame.source.close()
+
+    def clear(self):
+        with self._lock:
+            for path in list(self._frames):
+                self._remove(path)
+
+
+class FramePrefetcher:
+    def __init__(self, cache=None, neighbors=PREFETCH_NEIGHBORS, workers=2):
+        self.cache = cache or FrameCache()
+        self.neighbors = neighbors
+        self.detect = None  # Hot-spot settings frames are loaded with (see load_frame)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._pending = {}  # path -> Future
+        self._lock = threading.Lock()
+
+    def _load(self, path, prefetch=False):
+        try:
+            if prefetch and is_lazy(path):
+                return None  # Mosaics are only opened when shown
+            frame = load_frame(path, self.detect, build_overviews=not prefetch)
+            self.cache.put(frame)
+            return frame
+        finally:
+            with self._lock:
+                self._pending.pop(path, None)
+
+    def _submit(self, path, prefetch=False):
+        with self._lock:
+            future = self._pending.get(path)
+            if future is None:
+                future = self._executor.submit(self._load, path, prefetch)
+                self._pending[path] = future
+            return future
+
+    def get(self, path):
+        # Frame for `path`: from the cache, from a running prefetch, or loaded now
+        frame = self.cache.get(path)
+        if frame is None:
+            frame = self._submit(path).result()
+        if frame is None:
+            # The running prefetch skipped it (a mosaic)
+            frame = self._submit(path).result()
+        return frame
+
+    def show(self, paths, index):
+        # Make paths[index] the current frame and prefetch its neighbours,
+        # nearest first, alternating forward / backward. The frame is pinned
+        # first, so a prefetch finishing meanwhile can't evict it.
+        self.cache.pinned = paths[index]
+        frame = self.get(paths[index])
+
+        neighbors = []
+        for offset in range(1, self.neighbors + 1):
+            for candidate in (index + offset, index - offset):
+                if 0 <= candidate < len(paths) and paths[candidate] not in self.cache:
+                    neighbors.append(paths[candidate])
+        if neighbors:
+            # One exiftool request for all neighbours instead of one each
+            self._executor.submit(get_metadata_batch, neighbors)
+            for path in neighbors:
+                self._submit(path, prefetch=True)
+        return frame
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
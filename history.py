@@ -0,0 +1,154 @@
+import time
+from collections import deque
+
+# Undo / redo of edits in the viewer.
+#
+# Every edit is recorded after it has been applied, as a small command
+# holding just what is needed to revert and repeat it (annotation records,
+# positions, names or temperature ranges; no artists). Undo and redo apply
+# a command through an editor object supplied by the viewer with these
+# functions:
+#   insert(records)                  put removed annotation records back
+#   remove(records)                  remove annotation records
+#   place(key, placement)            restore an annotation's position and
+#                                    measurements
+#   rename(key, name)
+#   set_range(vmin, vmax)            display temperature range
+# Each undo / redo only touches the annotations of its command. Both stacks
+# are bounded, so a long session keeps at most HISTORY_LIMIT edits.
+
+HISTORY_LIMIT = 1000
+
+# Range changes closer together than this are one edit (a slider drag)
+RANGE_MERGE_SECONDS = 1.0
+
+
+class Command:
+    __slots__ = ()
+
+    def merge(self, command):
+        # Absorb a following edit into this one; False if they stay separate
+        return False
+
+
+class AddAnnotations(Command):
+    __slots__ = ('records',)
+
+    def __init__(self, records):
+        self.records = tuple(records)
+
+    def undo(self, editor):
+        editor.remove(self.records)
+
+    def redo(self, editor):
+        editor.insert(self.records)
+
+
+class DeleteAnnotations(Command):
+    # Delete, Clear Boxes / Points and Clear All
+    __slots__ = ('records',)
+
+    def __init__(self, records):
+        self.records = tuple(records)
+
+    def undo(self, editor):
+        editor.insert(self.records)
+
+    def redo(self, editor):
+        editor.remove(self.records)
+
+
+class MoveAnnotation(Command):
+    __slots__ = ('key', 'before', 'after')
+
+    def __init__(self, key, before, after):
+        self.key = key
+        self.before = before
+        self.after = after
+
+    def undo(self, editor):
+        editor.place(self.key, self.before)
+
+    def redo(self, editor):
+        editor.place(self.key, self.after)
+
+
+class RenameAnnotation(Command):
+    __slots__ = ('key', 'before', 'after')
+
+    def __init__(self, key, before, after):
+        self.key = key
+        self.before = before
+        self.after = after
+
+    def undo(self, editor):
+        editor.rename(self.key, self.before)
+
+    def redo(self, editor):
+        editor.rename(self.key, self.after)
+
+
+class SetRange(Command):
+    __slots__ = ('before', 'after', 'time')
+
+    def __init__(self, before, after):
+        self.before = before
+        self.after = after
+        self.time = time.monotonic()
+
+    def undo(self, editor):
+        editor.set_range(*self.before)
+
+    def redo(self, editor):
+        editor.set_range(*self.after)
+
+    def merge(self, command):
+        if not isinstance(command, SetRange) or command.time - self.time > RANGE_MERGE_SECONDS:
+            return False
+        self.after = command.after
+        self.time = command.time
+        return True
+
+
+class History:
+    def __init__(self, limit=HISTORY_LIMIT):
+        self._undo = deque(maxlen=limit)
+        self._redo = deque(maxlen=limit)
+
+    def __len__(self):
+        return len(self._undo)
+
+    @property
+    def can_undo(self):
+        return bool(self._undo)
+
+    @property
+    def can_redo(self):
+        return bool(self._redo)
+
+    def push(self, command):
+        # Record an edit that has just been applied; it replaces the redo stack
+        self._redo.clear()
+        if self._undo and self._undo[-1].merge(command):
+            return
+        self._undo.append(command)
+
+    def undo(self, editor):
+        if not self._undo:
+            return None
+        command = self._undo.pop()
+        command.undo(editor)
+        self._redo.append(command)
+        return command
+
+    def redo(self, editor):
+        if not self._redo:
+            return None
+        command = self._redo.pop()
+        command.redo(editor)
+        self._undo.append(command)
+        return command
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
@@ -0,0 +1,200 @@
+import numpy as np
+
+# Automatic hot-spot proposals.
+#
+# Pixels hotter than an absolute temperature, or more than delta_t above
+# their local background (the mean of a background_size square around them,
+# from cumulative sums), are grouped into 8-connected components. The
+# labeling works on horizontal runs of hot pixels instead of pixels: the runs
+# of all rows are found with one diff, runs touching a run of the next row
+# are paired with searchsorted, and the pairs are merged by min-label
+# propagation with pointer jumping, all vectorized. Each component becomes a
+# proposed box with its area and min / mean / max, hottest first, for the
+# operator to accept or reject. A 640x512 frame takes 10-20 ms (a few with an
+# absolute threshold), so the viewer runs it on every image it opens.
+
+# Degrees above the local background
+DELTA_T = 5.0
+
+# Side in pixels of the square the local background is averaged over
+BACKGROUND_SIZE = 31
+
+# Components smaller than this many pixels are noise
+MIN_AREA = 4
+
+# Pixels added around a component's bounds for its box
+BOX_MARGIN = 2
+
+MAX_PROPOSALS = 50
+
+
+class Proposal:
+    __slots__ = ('name', 'x', 'y', 'width', 'height', 'area', 'min', 'mean', 'max', 'peak')
+
+    def __init__(self, name, x, y, width, height, area, minimum, mean, maximum, peak):
+        self.name = name
+        self.x, self.y, self.width, self.height = x, y, width, height  # Box, in pixels
+        self.area = area  # Hot pixels of the component
+        self.min, self.mean, self.max = minimum, mean, maximum  # Over the component's pixels
+        self.peak = peak  # (x, y) of the maximum
+
+
+def _window_sums(array, half, axis):
+    # Sums of the 2 * half + 1 windows along an axis (cut at the ends)
+    length = array.shape[axis]
+    table = np.cumsum(array, axis=axis)
+    index = np.arange(length)
+    upper = np.take(table, np.minimum(index + half, length - 1), axis=axis)
+    below = index - half - 1
+    lower = np.take(table, np.maximum(below, 0), axis=axis)
+    lower[(slice(None),) * axis + (below < 0,)] = 0
+    return upper - lower
+
+
+def local_background(data, size=BACKGROUND_SIZE):
+    # Mean of the size x size neighbourhood of every pixel (cut at the image
+    # edges, NaN pixels left out). Window sums are separable: one cumulative
+    # sum per axis.
+    half = size // 2
+    values = data.astype(np.float64)
+    valid = ~np.isnan(values)
+    if valid.all():
+        # Pixels per window only depend on the distance to the edges
+        counts = (_window_sums(np.ones(data.shape[0]), half, 0)[:, None] *
+                  _window_sums(np.ones(data.shape[1]), half, 0))
+    else:
+        values[~valid] = 0
+        counts = _window_sums(_window_sums(valid.astype(np.float64), half, 0), half, 1)
+    sums = _window_sums(_window_sums(values, half, 0), half, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+def hot_mask(data, threshold=None, delta_t=DELTA_T, background_size=BACKGROUND_SIZE):
+    # Pixels at or above `threshold` °C, or (without a threshold) delta_t
+    # above their local background
+    with np.errstate(invalid='ignore'):
+        if threshold is not None:
+            return data >= threshold
+        return data - local_background(data, background_size) >= delta_t
+
+
+def mask_runs(mask):
+    # (row, start, end) of the horizontal runs of True, end exclusive, in
+    # row-major order
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return rows, starts, ends
+
+
+def connect(count, a, b):
+    # Groups of items 0..count-1 linked by the pairs (a[i], b[i]): returns
+    # (group number of every item, number of groups)
+    labels = np.arange(count)
+    while True:
+        previous = labels.copy()
+        low = np.minimum(labels[a], labels[b])
+        np.minimum.at(labels, a, low)
+        np.minimum.at(labels, b, low)
+        # Pointer jumping: follow labels to their roots
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            break
+    roots, labels = np.unique(labels, return_inverse=True)
+    return labels, len(roots)
+
+
+def label_runs(rows, starts, ends, width):
+    # Component number (0..n-1) of every run, 8-connected; returns (labels, n)
+    count = len(rows)
+    if count == 0:
+        return np.zeros(0, dtype=np.intp), 0
+    # Runs b of row r + 1 touch run a of row r when start_b <= end_a and
+    # end_b >= start_a (diagonal neighbours included). Keyed by row, both
+    # bounds are sorted, so the touching runs are one searchsorted range.
+    stride = width + 2
+    start_keys = rows * stride + starts
+    end_keys = rows * stride + ends
+    next_row = (rows + 1) * stride
+    first = np.searchsorted(end_keys, next_row + starts, side='left')
+    last = np.searchsorted(start_keys, next_row + ends, side='right')
+    pairs = np.maximum(last - first, 0)
+    a = np.repeat(np.arange(count), pairs)
+    b = np.repeat(first, pairs) + (np.arange(pairs.sum()) - np.repeat(np.cumsum(pairs) - pairs, pairs))
+
+    return connect(count, a, b)
+
+
+def measure_components(data, mask):
+    # Components of a hot mask over data: (runs, run labels, stats) with
+    # stats a dict of per-component arrays: area, bounds x1 y1 x2 y2 (end
+    # exclusive), min, sum, max and the peak_x / peak_y of the maximum
+    height, width = data.shape
+    rows, starts, ends = mask_runs(mask)
+    labels, count = label_runs(rows, starts, ends, width)
+    lengths = ends - starts
+    area = np.bincount(labels, weights=lengths, minlength=count).astype(np.intp)
+    x1 = np.full(count, width)
+    y1 = np.full(count, height)
+    x2 = np.zeros(count, dtype=np.intp)
+    y2 = np.zeros(count, dtype=np.intp)
+    np.minimum.at(x1, labels, starts)
+    np.minimum.at(y1, labels, rows)
+    np.maximum.at(x2, labels, ends)
+    np.maximum.at(y2, labels, rows + 1)
+
+    # Pixels of all runs, grouped by component
+    offsets = np.repeat(rows * width + starts - (np.cumsum(lengths) - lengths), lengths)
+    pixels = offsets + np.arange(lengths.sum())
+    order = np.argsort(np.repeat(labels, lengths), kind='stable')
+    pixels = pixels[order]
+    values = data.ravel()[pixels].astype(np.float64)
+    if count:
+        group_starts = np.concatenate(([0], np.cumsum(area)[:-1]))
+        minimum = np.minimum.reduceat(values, group_starts)
+        maximum = np.maximum.reduceat(values, group_starts)
+        total = np.add.reduceat(values, group_starts)
+        # First pixel of each component holding its maximum
+        at_max = np.flatnonzero(values == np.repeat(maximum, area))
+        peak_y, peak_x = np.divmod(pixels[at_max[np.searchsorted(at_max, group_starts)]], width)
+    else:
+        minimum = maximum = total = np.zeros(0)
+        peak_y = peak_x = np.zeros(0, dtype=np.intp)
+    stats = {'area': area, 'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2, 'min': minimum, 'sum': total,
+             'max': maximum, 'peak_x': peak_x, 'peak_y': peak_y}
+    return (rows, starts, ends), labels, stats
+
+
+def rank_proposals(stats, shape, min_area=MIN_AREA, max_proposals=MAX_PROPOSALS, margin=BOX_MARGIN,
+                   prefix="Hot"):
+    # Proposals of the components in stats (see measure_components) of an
+    # image of `shape`, hottest first
+    height, width = shape
+    area = stats['area']
+    keep = np.flatnonzero(area >= min_area)
+    keep = keep[np.argsort(-stats['max'][keep], kind='stable')][:max_proposals]
+    proposals = []
+    for number, index in enumerate(keep, 1):
+        x1 = max(0, int(stats['x1'][index]) - margin)
+        y1 = max(0, int(stats['y1'][index]) - margin)
+        x2 = min(width, int(stats['x2'][index]) + margin)
+        y2 = min(height, int(stats['y2'][index]) + margin)
+        proposals.append(Proposal(f"{prefix} {number}", x1, y1, x2 - x1, y2 - y1, int(area[index]),
+                                  float(stats['min'][index]), float(stats['sum'][index] / area[index]),
+                                  float(stats['max'][index]),
+                                  (int(stats['peak_x'][index]), int(stats['peak_y'][index]))))
+    return proposals
+
+
+def detect_hotspots(data, threshold=None, delta_t=DELTA_T, background_size=BACKGROUND_SIZE,
+                    min_area=MIN_AREA, max_proposals=MAX_PROPOSALS, margin=BOX_MARGIN, prefix="Hot"):
+    # Proposed boxes (Proposal) of an in-memory frame, hottest first
+    _, _, stats = measure_components(data, hot_mask(data, threshold, delta_t, background_size))
+    return rank_proposals(stats, data.shape, min_area, max_proposals, margin, prefix)
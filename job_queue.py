@@ -0,0 +1,130 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Background jobs (exports, PDF reports) for the viewer.
+#
+# The viewer snapshots everything a job needs on the Tk thread (annotation
+# primitives, colormap, range, view, form fields) and submits a function of
+# that snapshot; workers run it while the user moves on to the next image.
+# Tk must only be touched from its own thread, so finished jobs are handed
+# back through a queue and their callbacks run when the viewer calls poll()
+# from a root.after() loop. At most `workers` jobs run at once, the rest wait
+# in order. Jobs that must not run concurrently with each other (PDF reports:
+# Gen_reportV2 draws with pyplot, which is not thread-safe) are submitted to a
+# named lane, whose jobs run one at a time in their own thread.
+
+# Worker threads; rendering and PNG / PDF writing mostly release the GIL
+JOB_WORKERS = min(4, os.cpu_count() or 1)
+
+
+class Job:
+    __slots__ = ('id', 'name', 'state', 'progress', 'result', 'error', 'submitted', 'started', 'finished',
+                 'on_done', 'on_error')
+
+    def __init__(self, job_id, name, on_done=None, on_error=None):
+        self.id = job_id
+        self.name = name
+        self.state = 'queued'  # -> 'running' -> 'done' | 'failed'
+        self.progress = None  # Latest text reported by a long job
+        self.result = None
+        self.error = None
+        self.submitted = time.perf_counter()
+        self.started = self.finished = None
+        self.on_done = on_done
+        self.on_error = on_error
+
+    @property
+    def elapsed(self):
+        # Run time in seconds (so far, if still running)
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+
+class JobQueue:
+    def __init__(self, workers=JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._lanes = {}  # Lane name -> single-thread executor
+        self._finished = queue.SimpleQueue()  # Jobs whose callbacks haven't run yet
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._active = {}  # id -> Job, queued or running
+        self.done = 0
+        self.failed = 0
+
+    def submit(self, name, function, *args, on_done=None, on_error=None, progress=False, lane=None):
+        # Run function(*args) in a worker. on_done(job) / on_error(job) are
+        # called from poll(), i.e. on the thread that polls. With progress=True
+        # the function gets a report(text) callable as its first argument.
+        # Jobs with the same `lane` run one after the other.
+        job = Job(next(self._ids), name, on_done, on_error)
+        if progress:
+            args = (lambda text: setattr(job, 'progress', text),) + args
+        with self._lock:
+            self._active[job.id] = job
+            executor = self._executor
+            if lane is not None:
+                executor = self._lanes.get(lane)
+                if executor is None:
+                    executor = self._lanes[lane] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"job-{lane}")
+        executor.submit(self._run, job, function, args)
+        return job
+
+    def _run(self, job, function, args):
+        job.started = time.perf_counter()
+        job.state = 'running'
+        try:
+            job.result = function(*args)
+            job.state = 'done'
+        except Exception as e:
+            job.error = e
+            job.state = 'failed'
+        job.finished = time.perf_counter()
+        self._finished.put(job)
+
+    def poll(self):
+        # Run the callbacks of jobs finished since the last call; returns them
+        finished = []
+        while True:
+            try:
+                job = self._finished.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._active.pop(job.id, None)
+            if job.state == 'done':
+                self.done += 1
+                callback = job.on_done
+            else:
+                self.failed += 1
+                callback = job.on_error
+            if callback is not None:
+                callback(job)
+            finished.append(job)
+        return finished
+
+    def progress(self):
+        # Progress texts of the running jobs that report one
+        with self._lock:
+            return [job.progress for job in self._active.values()
+                    if job.state == 'running' and job.progress is not None]
+
+    def counts(self):
+        # (queued, running) jobs
+        with self._lock:
+            states = [job.state for job in self._active.values()]
+        return states.count('queued'), states.count('running')
+
+    def __len__(self):
+        # Jobs not finished yet
+        with self._lock:
+            return len(self._active)
+
+    def shutdown(self, wait=False):
+        # Queued jobs are dropped; running ones finish (their callbacks don't run)
+        for executor in [self._executor, *self._lanes.values()]:
+            executor.shutdown(wait=wait, cancel_futures=True)
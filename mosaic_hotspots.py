@@ -0,0 +1,236 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import hotspot_detect
+from raster_source import RasterSource
+
+# Hot-spot detection over orthomosaics, tile by tile.
+#
+# The mosaic is cut into tiles that worker processes read as windows of the
+# raster (never the whole mosaic), each with a halo of half the background
+# window around it, so the local background and therefore the hot mask of a
+# tile's core are exactly those of a whole-array pass. Every worker labels
+# the components of its core (hotspot_detect) and sends back only their
+# statistics and the component labels along the core's four edges. The
+# parent links components whose edge pixels touch across a seam (8-connected,
+# corners included) and merges their statistics, so a hot spot spanning
+# several tiles is one detection. Memory per worker is bounded by the tile
+# size, and tiles are spread over all cores.
+#
+#   python mosaic_hotspots.py "D:\Mosaics\Site_A.tif" -o site_a_hotspots.csv
+
+# Core side of a tile, in pixels
+TILE_SIZE = 1024
+
+COLUMNS = ('name', 'x', 'y', 'width', 'height', 'area', 'min', 'mean', 'max', 'peak_x', 'peak_y')
+
+_source = None
+_settings = None
+
+
+def _init_worker(path, threshold, delta_t, background_size):
+    global _source, _settings
+    _source = RasterSource(path, build_overviews=False)
+    _settings = (threshold, delta_t, background_size)
+
+
+def tile_windows(shape, tile_size=TILE_SIZE):
+    # (column, row, (x0, y0, x1, y1)) of the tiles covering an image
+    height, width = shape
+    for row, y0 in enumerate(range(0, height, tile_size)):
+        for column, x0 in enumerate(range(0, width, tile_size)):
+            yield column, row, (x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height))
+
+
+def _edge(length, starts, ends, labels):
+    # Label + 1 (0 = not hot) of every pixel along an edge covered by runs
+    edge = np.zeros(length, dtype=np.int64)
+    lengths = ends - starts
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    edge[offsets + np.arange(lengths.sum())] = np.repeat(labels + 1, lengths)
+    return edge
+
+
+def detect_tile(window):
+    # Components of one tile's core: (stats in mosaic pixels, edges)
+    threshold, delta_t, background_size = _settings
+    x0, y0, x1, y1 = window
+    halo = 0 if threshold is not None else background_size // 2
+    hx0, hy0 = max(0, x0 - halo), max(0, y0 - halo)
+    hx1, hy1 = min(_source.width, x1 + halo), min(_source.height, y1 + halo)
+    data = _source.read_region(hx0, hy0, hx1, hy1)
+    mask = hotspot_detect.hot_mask(data, threshold, delta_t, background_size)
+    core = (slice(y0 - hy0, y1 - hy0), slice(x0 - hx0, x1 - hx0))
+    (rows, starts, ends), labels, stats = hotspot_detect.measure_components(data[core], mask[core])
+    del data, mask
+
+    for name in ('x1', 'x2', 'peak_x'):
+        stats[name] = stats[name] + x0
+    for name in ('y1', 'y2', 'peak_y'):
+        stats[name] = stats[name] + y0
+    width, height = x1 - x0, y1 - y0
+    top, bottom = rows == 0, rows == height - 1
+    left, right = starts == 0, ends == width
+    edges = {
+        'top': _edge(width, starts[top], ends[top], labels[top]),
+        'bottom': _edge(width, starts[bottom], ends[bottom], labels[bottom]),
+        'left': _edge(height, rows[left], rows[left] + 1, labels[left]),
+        'right': _edge(height, rows[right], rows[right] + 1, labels[right]),
+    }
+    return stats, edges
+
+
+def _touching(a, b, offset, shift):
+    # Global ids of edge pixels a[i] and b[i + shift] that are both hot
+    if shift >= 0:
+        a, b = a[:len(a) - shift], b[shift:]
+    else:
+        a, b = a[-shift:], b[:len(b) + shift]
+    both = (a > 0) & (b > 0)
+    return offset[0] + a[both] - 1, offset[1] + b[both] - 1
+
+
+def stitch(tiles):
+    # Merge the components of all tiles ({(column, row): (stats, edges)})
+    # into one stats dict, joining components that touch across seams
+    offsets, count = {}, 0
+    for key, (stats, _) in tiles.items():
+        offsets[key] = count
+        count += len(stats['area'])
+    pairs_a, pairs_b = [], []
+    for (column, row), (_, edges) in tiles.items():
+        neighbours = (
+            ((column + 1, row), 'right', 'left', (-1, 0, 1)),
+            ((column, row + 1), 'bottom', 'top', (-1, 0, 1)),
+        )
+        for key, side, other_side, shifts in neighbours:
+            if key not in tiles:
+                continue
+            other = tiles[key][1]
+            for shift in shifts:
+                a, b = _touching(edges[side], other[other_side], (offsets[(column, row)], offsets[key]), shift)
+                pairs_a.append(a)
+                pairs_b.append(b)
+        # Diagonal neighbours touch at a single corner pixel
+        for key, corner, other_corner in (((column + 1, row + 1), -1, 0), ((column - 1, row + 1), 0, -1)):
+            if key not in tiles:
+                continue
+            a, b = edges['bottom'][corner], tiles[key][1]['top'][other_corner]
+            if a and b:
+                pairs_a.append(np.array([offsets[(column, row)] + a - 1]))
+                pairs_b.append(np.array([offsets[key] + b - 1]))
+
+    stats = {name: np.concatenate([tile[0][name] for tile in tiles.values()]) for name in
+             ('area', 'x1', 'y1', 'x2', 'y2', 'min', 'sum', 'max', 'peak_x', 'peak_y')}
+    if not count:
+        return stats
+    a = np.concatenate(pairs_a) if pairs_a else np.zeros(0, dtype=np.intp)
+    b = np.concatenate(pairs_b) if pairs_b else np.zeros(0, dtype=np.intp)
+    groups, total = hotspot_detect.connect(count, a, b)
+
+    merged = {
+        'area': np.bincount(groups, weights=stats['area'], minlength=total).astype(np.intp),
+        'sum': np.bincount(groups, weights=stats['sum'], minlength=total),
+    }
+    for name, reduce, initial in (('x1', np.minimum, np.iinfo(np.intp).max), ('y1', np.minimum, np.iinfo(np.intp).max),
+                                  ('x2', np.maximum, 0), ('y2', np.maximum, 0),
+                                  ('min', np.minimum, np.inf), ('max', np.maximum, -np.inf)):
+        values = np.full(total, initial, dtype=stats[name].dtype)
+        reduce.at(values, groups, stats[name])
+        merged[name] = values
+    # Peak of the piece holding the group's maximum
+    order = np.argsort(-stats['max'], kind='stable')
+    _, first = np.unique(groups[order], return_index=True)
+    merged['peak_x'] = stats['peak_x'][order[first]]
+    merged['peak_y'] = stats['peak_y'][order[first]]
+    return merged
+
+
+def detect_mosaic(path, threshold=None, delta_t=hotspot_detect.DELTA_T,
+                  background_size=hotspot_detect.BACKGROUND_SIZE, min_area=hotspot_detect.MIN_AREA,
+                  max_proposals=hotspot_detect.MAX_PROPOSALS, tile_size=TILE_SIZE, workers=None, progress=None):
+    # Proposals (hotspot_detect.Proposal) of a whole raster, hottest first
+    source = RasterSource(path, build_overviews=False)
+    shape = source.shape
+    if source.in_memory:
+        # Small enough to be one array: workers would each load all of it
+        proposals = hotspot_detect.detect_hotspots(source.array, threshold, delta_t, background_size, min_area,
+                                                   max_proposals)
+        source.close()
+        return proposals
+    source.close()
+    windows = list(tile_windows(shape, tile_size))
+    tiles = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(path, threshold, delta_t, background_size)) as executor:
+        futures = {executor.submit(detect_tile, window): (column, row) for column, row, window in windows}
+        for done, future in enumerate(as_completed(futures), 1):
+            tiles[futures[future]] = future.result()
+            if progress is not None:
+                progress(done, len(windows))
+    return hotspot_detect.rank_proposals(stitch(tiles), shape, min_area, max_proposals)
+
+
+def proposal_to_dict(proposal):
+    peak_x, peak_y = proposal.peak
+    return {'name': proposal.name, 'x': proposal.x, 'y': proposal.y, 'width': proposal.width,
+            'height': proposal.height, 'area': proposal.area, 'min': round(proposal.min, 3),
+            'mean': round(proposal.mean, 3), 'max': round(proposal.max, 3), 'peak_x': peak_x, 'peak_y': peak_y}
+
+
+def proposal_from_dict(entry):
+    return hotspot_detect.Proposal(entry['name'], entry['x'], entry['y'], entry['width'], entry['height'],
+                                   entry['area'], entry['min'], entry['mean'], entry['max'],
+                                   (entry['peak_x'], entry['peak_y']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hot-spot detection over a thermal orthomosaic")
+    parser.add_argument('input', help="Thermal raster (GeoTIFF)")
+    parser.add_argument('-o', '--output', help="Output .csv (default: stdout)")
+    parser.add_argument('--json', action='store_true', help="Write JSON instead of CSV")
+    parser.add_argument('--threshold', type=float, help="Absolute threshold in °C (default: ΔT over the background)")
+    parser.add_argument('--delta-t', type=float, default=hotspot_detect.DELTA_T,
+                        help=f"Degrees above the local background (default: {hotspot_detect.DELTA_T:g})")
+    parser.add_argument('--max', type=int, default=hotspot_detect.MAX_PROPOSALS, help="Most hot spots reported")
+    parser.add_argument('--tile', type=int, default=TILE_SIZE, help=f"Tile size in pixels (default: {TILE_SIZE})")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Number of worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    proposals = detect_mosaic(args.input, args.threshold, args.delta_t, max_proposals=args.max,
+                              tile_size=args.tile, workers=args.workers,
+                              progress=lambda done, total: print(f"Tile {done}/{total}", file=sys.stderr))
+    elapsed = time.perf_counter() - start
+
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        rows = [proposal_to_dict(proposal) for proposal in proposals]
+        if args.json:
+            json.dump(rows, out)
+            out.write('\n')
+        else:
+            writer = csv.DictWriter(out, COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    source = RasterSource(args.input, build_overviews=False)
+    pixels = source.width * source.height
+    source.close()
+    print(f"{len(proposals)} hot spots in {os.path.basename(args.input)}: {elapsed:.1f} s "
+          f"({pixels / 1e6 / max(elapsed, 1e-9):.0f} Mpx/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+import hashlib
+import io
+import os
+import zlib
+
+from PIL import Image
+
+# Minimal PDF writer that streams pages to disk.
+#
+# Every object (page content, page, image) is written to the file as soon as
+# it is complete and only its byte offset is kept for the cross-reference
+# table, so memory stays flat however many pages a report has. Images are
+# stored once as JPEG XObjects: drawing the same asset again (a logo on every
+# page, one image shared by several findings) references the stored object
+# instead of embedding it again. Text uses the PDF standard Helvetica fonts
+# (nothing embedded, Latin-1 characters). The file is written as
+# `<path>.part` and only renamed to `path` once it is complete, so a failed
+# report never leaves a truncated PDF behind.
+
+A4 = (595.28, 841.89)  # Points
+
+JPEG_QUALITY = 80
+
+FONTS = {'F1': b'Helvetica', 'F2': b'Helvetica-Bold'}
+
+# Average Helvetica glyph width in em, for fitting text into columns
+AVERAGE_CHAR_WIDTH = 0.52
+
+
+def _escape(text):
+    data = str(text).encode('latin-1', errors='replace')
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def _number(value):
+    return f"{value:.2f}".rstrip('0').rstrip('.').encode()
+
+
+def fit_text(text, width, size):
+    # Text shortened with '...' to about `width` points at font `size`
+    text = str(text)
+    chars = int(width / (size * AVERAGE_CHAR_WIDTH))
+    if len(text) <= chars:
+        return text
+    return text[:max(0, chars - 3)] + '...'
+
+
+class Page:
+    # Drawing operations of one page; coordinates in points from the bottom-left
+    def __init__(self, size=A4):
+        self.size = size
+        self._ops = []
+        self.images = set()  # Resource names of the images drawn
+
+    def text(self, x, y, text, size=10, bold=False):
+        font = b'F2' if bold else b'F1'
+        self._ops.append(b'BT /%s %s Tf %s %s Td (%s) Tj ET' % (font, _number(size), _number(x), _number(y),
+                                                                  _escape(text)))
+
+    def line(self, x0, y0, x1, y1, width=0.5, gray=0.0):
+        self._ops.append(b'%s G %s w %s %s m %s %s l S' % (_number(gray), _number(width), _number(x0), _number(y0),
+                                                            _number(x1), _number(y1)))
+
+    def rect(self, x, y, width, height, fill_gray=None, stroke=True, line_width=0.5):
+        box = b'%s %s %s %s re' % (_number(x), _number(y), _number(width), _number(height))
+        if fill_gray is not None:
+            self._ops.append(b'%s g %s f' % (_number(fill_gray), box))
+        if stroke:
+            self._ops.append(b'0 G %s w %s S' % (_number(line_width), box))
+
+    def image(self, name, x, y, width, height):
+        # Draw an image added with PdfWriter.add_image()
+        self.images.add(name)
+        self._ops.append(b'q %s 0 0 %s %s %s cm /%s Do Q' % (_number(width), _number(height), _number(x),
+                                                             _number(y), name.encode()))
+
+    def content(self):
+        return b'\n'.join(self._ops)
+
+
+class PdfWriter:
+    def __init__(self, path, info=None):
+        self.path = path
+        self._part_path = path + '.part'
+        self._file = open(self._part_path, 'wb')
+        self._offsets = []  # Byte offset per object number - 1 (None until written)
+        self._page_ids = []
+        self._images = {}  # Key -> (resource name, width, height)
+        self._digests = {}  # JPEG digest -> resource name, for identical images under other keys
+        self._image_ids = {}  # Resource name -> object id
+        self.image_bytes = 0
+        self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self._pages_id = self._reserve()
+        self._font_ids = {}
+        for name, base in FONTS.items():
+            self._font_ids[name] = self._write(b'<< /Type /Font /Subtype /Type1 /BaseFont /%s '
+                                               b'/Encoding /WinAnsiEncoding >>' % base)
+        self._info_id = None
+        if info:
+            entries = b' '.join(b'/%s (%s)' % (key.encode(), _escape(value)) for key, value in info.items())
+            self._info_id = self._write(b'<< %s >>' % entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def page_count(self):
+        return len(self._page_ids)
+
+    def _reserve(self):
+        self._offsets.append(None)
+        return len(self._offsets)
+
+    def _write(self, body, stream=None, object_id=None):
+        if object_id is None:
+            object_id = self._reserve()
+        self._offsets[object_id - 1] = self._file.tell()
+        self._file.write(b'%d 0 obj\n' % object_id)
+        self._file.write(body)
+        if stream is not None:
+            self._file.write(b'\nstream\n')
+            self._file.write(stream)
+            self._file.write(b'\nendstream')
+        self._file.write(b'\nendobj\n')
+        return object_id
+
+    def add_image(self, key, image, max_size=None):
+        # Store an image (RGB(A) array or PIL image, or a function returning
+        # one) once under `key` and return (resource name, width, height);
+        # later calls with the same key don't load or touch the image at all.
+        # Images larger than max_size pixels on their longer side are
+        # downscaled first.
+        stored = self._images.get(key)
+        if stored is not None:
+            return stored
+        if callable(image):
+            image = image()
+        if not isinstance(image, Image.Image):
+            image = Image.fromarray(image)
+        if image.mode != 'RGB':
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+            image = background
+        if max_size and max(image.size) > max_size:
+            image.thumbnail((max_size, max_size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        data = buffer.getvalue()
+        width, height = image.size
+
+        digest = hashlib.sha1(data).digest()
+        name = self._digests.get(digest)
+        if name is None:
+            name = f"Im{len(self._digests) + 1}"
+            self._image_ids[name] = self._write(
+                b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB '
+                b'/BitsPerComponent 8 /Filter /DCTDecode /Length %d >>' % (width, height, len(data)), data)
+            self._digests[digest] = name
+            self.image_bytes += len(data)
+        self._images[key] = (name, width, height)
+        return self._images[key]
+
+    def add_page(self, page):
+        content = zlib.compress(page.content())
+        content_id = self._write(b'<< /Length %d /Filter /FlateDecode >>' % len(content), content)
+        fonts = b' '.join(b'/%s %d 0 R' % (name.encode(), object_id) for name, object_id in self._font_ids.items())
+        images = b' '.join(b'/%s %d 0 R' % (name.encode(), self._image_ids[name]) for name in sorted(page.images))
+        self._page_ids.append(self._write(
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %s %s] /Contents %d 0 R '
+            b'/Resources << /Font << %s >> /XObject << %s >> >> >>'
+            % (self._pages_id, _number(page.size[0]), _number(page.size[1]), content_id, fonts, images)))
+
+    def close(self):
+        if self._file.closed:
+            return
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in self._page_ids)
+        self._write(b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self._page_ids)),
+                    object_id=self._pages_id)
+        catalog_id = self._write(b'<< /Type /Catalog /Pages %d 0 R >>' % self._pages_id)
+        xref = self._file.tell()
+        self._file.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(self._offsets) + 1))
+        for offset in self._offsets:
+            self._file.write(b'%010d 00000 n \n' % offset)
+        info = b' /Info %d 0 R' % self._info_id if self._info_id else b''
+        self._file.write(b'trailer\n<< /Size %d /Root %d 0 R%s >>\nstartxref\n%d\n%%%%EOF\n'
+                         % (len(self._offsets) + 1, catalog_id, info, xref))
+        self._file.close()
+        os.replace(self._part_path, self.path)
+
+    def abort(self):
+        # Stop writing and delete the unfinished file
+        if self._file.closed:
+            return
+        self._file.close()
+        os.remove(self._part_path)
@@ -0,0 +1,272 @@
+import logging
+import math
+import os
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.windows import Window
+
+# Lazy access to thermal rasters of any size.
+#
+# Normal drone frames (640x512 M3T, 1280x1024 H20T, ...) are read into memory
+# once; zoomed-out windows of them are strided views (every 2nd, 4th, ...
+# pixel), so what gets rendered stays about the size of the screen. Large
+# thermal orthomosaics are never loaded as a whole: the viewer asks for the window it currently shows and the source
+# answers from the overview level matching the zoom, block by block, through
+# a size-bounded cache. Panning therefore only reads the newly exposed blocks.
+#
+# A mosaic without overviews gets an external .ovr pyramid next to it, built
+# in a background thread from a read-only handle (the mosaic itself is never
+# modified, and may be read-only). Until it is ready, or if it can't be
+# written, zoomed-out windows are decimated while reading.
+
+log = logging.getLogger(__name__)
+
+# Rasters with more pixels than this are read lazily
+IN_MEMORY_PIXELS = 4096 * 4096
+
+# Side length of a cached block, in pixels of its overview level
+BLOCK_SIZE = 512
+
+# Memory budget for cached blocks
+CACHE_BYTES = 256 * 1024 * 1024
+
+# Overviews are built down to this size of the coarsest level
+MIN_OVERVIEW_SIZE = 256
+
+
+def _open(path, mode='r', **profile):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=rasterio.errors.NotGeoreferencedWarning)
+        return rasterio.open(path, mode, **profile)
+
+
+def is_lazy(path):
+    # Whether RasterSource would read the raster lazily (from its header only)
+    with _open(path) as dataset:
+        return dataset.width * dataset.height > IN_MEMORY_PIXELS
+
+
+def write_overviews(path, factors):
+    # External <path>.ovr with the given (power of two) overview factors. GDAL
+    # takes the .ovr's own image as the first level and the .ovr's internal
+    # overviews as the coarser ones. The mosaic is read in strips, so memory
+    # stays bounded; the file only appears under its name once complete.
+    ovr_path = path + '.ovr'
+    part_path = ovr_path + '.part'
+    strip = BLOCK_SIZE * 2
+    try:
+        with _open(path) as source:
+            width, height = math.ceil(source.width / 2), math.ceil(source.height / 2)
+            with _open(part_path, 'w', driver='GTiff', width=width, height=height, count=1,
+                       dtype=source.dtypes[0], nodata=source.nodata, tiled=True,
+                       blockxsize=256, blockysize=256, BIGTIFF='IF_SAFER') as target:
+                for y0 in range(0, source.height, strip):
+                    rows = min(strip, source.height - y0)
+                    data = source.read(1, window=Window(0, y0, source.width, rows),
+                                       out_shape=(math.ceil(rows / 2), width), resampling=Resampling.average)
+                    target.write(data, 1, window=Window(0, y0 // 2, width, data.shape[0]))
+        coarser = [factor // 2 for factor in factors if factor > 2]
+        if coarser:
+            with _open(part_path, 'r+') as target:
+                target.build_overviews(coarser, Resampling.average)
+        os.replace(part_path, ovr_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+
+class RasterSource:
+    def __init__(self, path, build_overviews=True, cache_bytes=CACHE_BYTES):
+        self.path = path
+        self._lock = threading.Lock()
+        self._blocks = OrderedDict()  # (factor, bx, by) -> array, in LRU order
+        self._cache_bytes = 0
+        self.max_cache_bytes = cache_bytes
+        self._builder = None  # Thread building the .ovr
+
+        self.dataset = _open(path)
+        self.width = self.dataset.width
+        self.height = self.dataset.height
+        self.shape = (self.height, self.width)
+        self.nodata = self.dataset.nodata
+
+        self.array = None
+        self.overview_error = None  # Why the .ovr could not be built, if it failed
+        if self.width * self.height <= IN_MEMORY_PIXELS:
+            self.array = self._mask_nodata(self.dataset.read(1))
+            self.dataset.close()
+            self.dataset = None
+            self.overview_factors = []
+        else:
+            self.overview_factors = self.dataset.overviews(1)
+            if not self.overview_factors and build_overviews:
+                self.build_pyramid()
+
+    @property
+    def in_memory(self):
+        return self.array is not None
+
+    @property
+    def building_overviews(self):
+        return self._builder is not None and self._builder.is_alive()
+
+    def close(self):
+        with self._lock:
+            if self.dataset is not None:
+                self.dataset.close()
+                self.dataset = None
+            self._blocks.clear()
+            self._cache_bytes = 0
+
+    def _mask_nodata(self, data):
+        # Nodata (outside the mosaic footprint) becomes NaN so statistics and
+        # colormaps can ignore it
+        if self.nodata is None:
+            return data
+        if not np.issubdtype(data.dtype, np.floating):
+            data = data.astype(np.float32)
+        data[data == self.nodata] = np.nan
+        return data
+
+    def build_pyramid(self, background=True):
+        # Write an external .ovr next to the mosaic (see the top of the file)
+        # and switch to it when done. If that isn't possible (read-only media,
+        # no write permission) the reason is kept in overview_error and reads
+        # keep decimating on the fly.
+        factors = []
+        factor = 2
+        while min(self.width, self.height) / factor >= MIN_OVERVIEW_SIZE:
+            factors.append(factor)
+            factor *= 2
+        if not factors:
+            return
+        if background:
+            self._builder = threading.Thread(target=self._build_pyramid, args=(factors,), daemon=True,
+                                             name=f"overviews {os.path.basename(self.path)}")
+            self._builder.start()
+        else:
+            self._build_pyramid(factors)
+
+    def _build_pyramid(self, factors):
+        log.info("Building overviews %s for %s", factors, os.path.basename(self.path))
+        try:
+            write_overviews(self.path, factors)
+        except Exception as e:
+            self.overview_error = str(e)
+            log.warning("Error building overviews for %s: %s", self.path, e)
+            return
+        with self._lock:
+            if self.dataset is None:
+                return  # Closed meanwhile
+            self.dataset.close()
+            self.dataset = _open(self.path)
+            self.overview_factors = self.dataset.overviews(1)
+            # Blocks read by decimation are replaced by overview reads
+            self._blocks.clear()
+            self._cache_bytes = 0
+
+    def factor_for_scale(self, scale):
+        # Coarsest available level that still has at least one pixel per
+        # screen pixel; `scale` is image pixels per screen pixel
+        factor = 1
+        if self.in_memory or not self.overview_factors:
+            # Any power of two: decimated levels are views of the array, or
+            # for a mosaic without overviews decimated on read (out_shape)
+            while factor * 2 <= scale:
+                factor *= 2
+            return factor
+        for candidate in self.overview_factors:
+            if candidate <= scale:
+                factor = max(factor, candidate)
+        return factor
+
+    def _read_block(self, factor, bx, by):
+        key = (factor, bx, by)
+        block = self._blocks.get(key)
+        if block is not None:
+            self._blocks.move_to_end(key)
+            return block
+
+        span = BLOCK_SIZE * factor
+        x0, y0 = bx * span, by * span
+        w = min(span, self.width - x0)
+        h = min(span, self.height - y0)
+        out_shape = (math.ceil(h / factor), math.ceil(w / factor))
+        block = self.dataset.read(1, window=Window(x0, y0, w, h), out_shape=out_shape,
+                                  resampling=Resampling.nearest)
+        block = self._mask_nodata(block)
+
+        self._blocks[key] = block
+        self._cache_bytes += block.nbytes
+        while self._cache_bytes > self.max_cache_bytes and len(self._blocks) > 1:
+            _, evicted = self._blocks.popitem(last=False)
+            self._cache_bytes -= evicted.nbytes
+        return block
+
+    def read_window(self, x0, y0, x1, y1, scale=1.0):
+        # Data covering the full-resolution window [x0, x1) x [y0, y1) at the
+        # level matching `scale`. Returns (array, (x0, y0, x1, y1)) where the
+        # bounds are the full-resolution area actually covered by the array
+        # (the request expanded to whole blocks).
+        x0 = max(0, int(math.floor(x0)))
+        y0 = max(0, int(math.floor(y0)))
+        x1 = min(self.width, int(math.ceil(x1)))
+        y1 = min(self.height, int(math.ceil(y1)))
+        if x1 <= x0 or y1 <= y0:
+            return np.empty((0, 0), dtype=np.float32), (x0, y0, x0, y0)
+
+        factor = self.factor_for_scale(scale)
+        if self.in_memory:
+            # Aligned to the decimation so a pixel always samples the same spot
+            x0 -= x0 % factor
+            y0 -= y0 % factor
+            data = self.array[y0:y1:factor, x0:x1:factor]
+            return data, (x0, y0, x0 + data.shape[1] * factor, y0 + data.shape[0] * factor)
+
+        span = BLOCK_SIZE * factor
+        bx0, bx1 = x0 // span, (x1 - 1) // span
+        by0, by1 = y0 // span, (y1 - 1) // span
+        with self._lock:
+            rows = []
+            for by in range(by0, by1 + 1):
+                rows.append(np.hstack([self._read_block(factor, bx, by) for bx in range(bx0, bx1 + 1)]))
+            data = np.vstack(rows)
+        bounds = (bx0 * span, by0 * span,
+                  min(self.width, (bx1 + 1) * span), min(self.height, (by1 + 1) * span))
+        return data, bounds
+
+    def read_region(self, x0, y0, x1, y1):
+        # Full-resolution pixels of [x0, x1) x [y0, y1) (already clipped)
+        if self.in_memory:
+            return self.array[y0:y1, x0:x1]
+        with self._lock:
+            data = self.dataset.read(1, window=Window(x0, y0, x1 - x0, y1 - y0))
+        return self._mask_nodata(data)
+
+    def sample(self, x, y):
+        # Temperature of one full-resolution pixel
+        x, y = int(x), int(y)
+        if self.in_memory:
+            return self.array[y, x]
+        span = BLOCK_SIZE
+        with self._lock:
+            block = self._blocks.get((1, x // span, y // span))
+        if block is not None:
+            return block[y % span, x % span]
+        return self.read_region(x, y, x + 1, y + 1)[0, 0]
+
+    def preview(self, max_size=2048):
+        # Whole raster at the coarsest level that is still at least max_size
+        # pixels on its longer side (or full resolution if in memory)
+        return self.read_window(0, 0, self.width, self.height,
+                                scale=max(self.width, self.height) / max_size)
+
+    def min_max(self):
+        # Exact for in-memory frames, estimated from the preview for mosaics
+        data = self.array if self.in_memory else self.preview()[0]
+        return float(np.nanmin(data)), float(np.nanmax(data))
@@ -0,0 +1,59 @@
+import numpy as np
+
+from hotspot_detect import label_runs, mask_runs
+
+# Click-to-grow region ROIs.
+#
+# A box drawn around an irregular hot region (a junction box, a cluster of
+# cells) also holds the cold background around it, which dilutes its
+# average. A region grows from one clicked pixel over the 8-connected pixels
+# within a tolerance of the seed's temperature (or at / above a threshold),
+# inside a window around the seed, and is kept as a mask so its min / mean /
+# max and area are those of its own pixels only. Growing is one comparison
+# and one run labeling of the window (as in hotspot_detect), about a
+# millisecond for the default window, so the viewer grows the region again
+# on every tolerance change for a live preview.
+
+# Side of the square around the seed a region can grow in, in pixels
+REGION_WINDOW = 256
+
+# Degrees a pixel may differ from the seed's temperature
+TOLERANCE = 2.0
+
+
+def seed_window(shape, x, y, size=REGION_WINDOW):
+    # (x0, y0, x1, y1) of the size x size window centred on a seed pixel,
+    # clipped to an image of `shape`
+    height, width = shape
+    x0, y0 = max(0, int(x) - size // 2), max(0, int(y) - size // 2)
+    return x0, y0, min(width, x0 + size), min(height, y0 + size)
+
+
+def grow_region(data, seed_x, seed_y, tolerance=TOLERANCE, threshold=None):
+    # (x, y, mask) of the region grown from data[seed_y, seed_x]: the
+    # 8-connected pixels within `tolerance` of the seed's temperature, or at
+    # or above `threshold` if one is given. The mask covers the region's
+    # bounds, whose top-left pixel is (x, y). None if the seed has no data or
+    # is below the threshold.
+    seed = data[seed_y, seed_x]
+    if np.isnan(seed) or (threshold is not None and seed < threshold):
+        return None
+    # In float: integer rasters (no nodata) would wrap below the seed
+    with np.errstate(invalid='ignore'):
+        if threshold is not None:
+            candidates = data >= threshold
+        else:
+            candidates = np.abs(data.astype(np.float64) - float(seed)) <= tolerance
+    rows, starts, ends = mask_runs(candidates)
+    labels, _ = label_runs(rows, starts, ends, data.shape[1])
+    seed_run = np.flatnonzero((rows == seed_y) & (starts <= seed_x) & (ends > seed_x))[0]
+    mine = labels == labels[seed_run]
+    rows, starts, ends = rows[mine], starts[mine], ends[mine]
+
+    x0, y0 = int(starts.min()), int(rows.min())
+    mask = np.zeros((int(rows.max()) + 1 - y0, int(ends.max()) - x0), dtype=bool)
+    lengths = ends - starts
+    first = (rows - y0) * mask.shape[1] + starts - x0
+    offsets = np.repeat(first - (np.cumsum(lengths) - lengths), lengths)
+    mask.ravel()[offsets + np.arange(lengths.sum())] = True
+    return x0, y0, mask
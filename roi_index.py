@@ -0,0 +1,179 @@
+import numpy as np
+
+from thermal_core import clip_box, roi_statistics
+
+# Per-image index for fast box (ROI) statistics.
+#
+# Built once when an image is loaded:
+#   - summed-area tables of the temperatures and of their squares, so the
+#     sum, mean and standard deviation of any box take four lookups each;
+#   - min and max pyramids (each level is the 2x2 block min / max of the
+#     level below), so a box's min / max is the reduction of the few whole
+#     blocks it contains at the coarsest possible level plus its thin edges
+#     at finer levels, O(log n) blocks instead of every pixel.
+# Positions of the min / max are the first in row-major order, exactly like
+# np.argmin / np.argmax on the box, found by bisecting the rows.
+#
+# Median and percentiles are not decomposable this way; use
+# thermal_core.roi_percentiles for those.
+
+# Boxes (or box pieces) up to this many pixels are reduced directly
+SMALL_BOX_PIXELS = 64 * 64
+
+
+def _integral(values):
+    # Summed-area table with a leading row and column of zeros
+    sat = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=np.float64)
+    np.cumsum(values, axis=0, out=sat[1:, 1:])
+    np.cumsum(sat[1:, 1:], axis=1, out=sat[1:, 1:])
+    return sat
+
+
+def _box_sum(sat, x1, y1, x2, y2):
+    return sat[y2, x2] - sat[y1, x2] - sat[y2, x1] + sat[y1, x1]
+
+
+def _fill_values(dtype):
+    # Neutral elements of min / max for a dtype (NaN pixels are replaced by these)
+    if np.issubdtype(dtype, np.floating):
+        return np.inf, -np.inf
+    info = np.iinfo(dtype)
+    return info.max, info.min
+
+
+def _pyramid(level, fill, reduce):
+    levels = [level]
+    while max(level.shape) > 1:
+        h, w = level.shape
+        if h % 2 or w % 2:
+            padded = np.full((h + h % 2, w + w % 2), fill, dtype=level.dtype)
+            padded[:h, :w] = level
+            level = padded
+        level = reduce(level.reshape(level.shape[0] // 2, 2, level.shape[1] // 2, 2), axis=(1, 3))
+        levels.append(level)
+    return levels
+
+
+class RoiIndex:
+    def __init__(self, thermal_data):
+        self.data = data = thermal_data
+        self.shape = thermal_data.shape
+        nan_mask = None
+        if np.issubdtype(data.dtype, np.floating):
+            nan_mask = np.isnan(data)
+            if not nan_mask.any():
+                nan_mask = None
+
+        # Temperatures are shifted by the image mean before summing so the
+        # sum of squares doesn't lose the precision needed for the std
+        values = data.astype(np.float64)
+        if nan_mask is not None:
+            values[nan_mask] = 0.0
+            self._count = _integral(~nan_mask)
+            valid_count = values.size - int(nan_mask.sum())
+        else:
+            self._count = None
+            valid_count = values.size
+        self.shift = float(values.sum() / valid_count) if valid_count else 0.0
+        values -= self.shift
+        if nan_mask is not None:
+            values[nan_mask] = 0.0
+        self._sum = _integral(values)
+        np.multiply(values, values, out=values)
+        self._sum_sq = _integral(values)
+        del values
+
+        min_fill, max_fill = _fill_values(data.dtype)
+        min_base = max_base = data
+        if nan_mask is not None:
+            min_base = np.where(nan_mask, min_fill, data).astype(data.dtype)
+            max_base = np.where(nan_mask, max_fill, data).astype(data.dtype)
+        self._min_levels = _pyramid(min_base, min_fill, np.min)
+        self._max_levels = _pyramid(max_base, max_fill, np.max)
+
+    @property
+    def nbytes(self):
+        total = self._sum.nbytes + self._sum_sq.nbytes
+        if self._count is not None:
+            total += self._count.nbytes
+        # Level 0 is the image itself unless it had to be copied for NaNs
+        first = 1 if self._count is None else 0
+        for levels in (self._min_levels, self._max_levels):
+            total += sum(level.nbytes for level in levels[first:])
+        return total
+
+    def count(self, x1, y1, x2, y2):
+        if self._count is None:
+            return (x2 - x1) * (y2 - y1)
+        return int(round(_box_sum(self._count, x1, y1, x2, y2)))
+
+    def _extreme(self, levels, reduce, combine, x1, y1, x2, y2):
+        # reduce() over [x1, x2) x [y1, y2) of the base level
+        if (x2 - x1) * (y2 - y1) <= SMALL_BOX_PIXELS:
+            return reduce(levels[0][y1:y2, x1:x2])
+        # Coarsest level with at least one whole block inside the box
+        for k in range(len(levels) - 1, 0, -1):
+            size = 1 << k
+            bx1, by1 = -(-x1 // size), -(-y1 // size)
+            bx2, by2 = x2 // size, y2 // size
+            if bx2 > bx1 and by2 > by1:
+                break
+        else:
+            return reduce(levels[0][y1:y2, x1:x2])
+        result = reduce(levels[k][by1:by2, bx1:bx2])
+        # The edges left around the whole blocks are thinner than a block
+        X1, Y1, X2, Y2 = bx1 * size, by1 * size, bx2 * size, by2 * size
+        for part in ((x1, y1, x2, Y1), (x1, Y2, x2, y2), (x1, Y1, X1, Y2), (X2, Y1, x2, Y2)):
+            if part[2] > part[0] and part[3] > part[1]:
+                result = combine(result, self._extreme(levels, reduce, combine, *part))
+        return result
+
+    def _first_position(self, levels, reduce, combine, value, x1, y1, x2, y2):
+        # First (x, y) in row-major order holding `value`: bisect for the first
+        # row whose prefix of the box contains it, then scan that row
+        lo, hi = y1, y2 - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            # Rows [y1, lo) are known not to contain the value
+            if self._extreme(levels, reduce, combine, x1, lo, x2, mid + 1) == value:
+                hi = mid
+            else:
+                lo = mid + 1
+        row = levels[0][lo, x1:x2]
+        return x1 + int(np.argmax(row == value)), lo
+
+    def min_max(self, x1, y1, x2, y2):
+        # ((min_x, min_y, min), (max_x, max_y, max)) of a clipped, non-empty box
+        minimum = self._extreme(self._min_levels, np.min, min, x1, y1, x2, y2)
+        maximum = self._extreme(self._max_levels, np.max, max, x1, y1, x2, y2)
+        min_x, min_y = self._first_position(self._min_levels, np.min, min, minimum, x1, y1, x2, y2)
+        max_x, max_y = self._first_position(self._max_levels, np.max, max, maximum, x1, y1, x2, y2)
+        return (min_x, min_y, float(minimum)), (max_x, max_y, float(maximum))
+
+    def query(self, x_start, y_start, width, height):
+        # Same keys as thermal_core.roi_statistics without median / percentiles;
+        # None if the box holds no data
+        x1, y1, x2, y2 = clip_box(self.shape, x_start, y_start, width, height)
+        if x2 <= x1 or y2 <= y1:
+            return None
+        if (x2 - x1) * (y2 - y1) <= SMALL_BOX_PIXELS:
+            # Scanning a small box directly is as fast and exact
+            return roi_statistics(self.data, [(x1, y1, x2 - x1, y2 - y1)], ())[0]
+        n = self.count(x1, y1, x2, y2)
+        if n == 0:
+            return None
+        shifted_mean = _box_sum(self._sum, x1, y1, x2, y2) / n
+        variance = _box_sum(self._sum_sq, x1, y1, x2, y2) / n - shifted_mean * shifted_mean
+        min_point, max_point = self.min_max(x1, y1, x2, y2)
+        return {
+            'count': n,
+            'min': min_point[2],
+            'min_pos': min_point[:2],
+            'max': max_point[2],
+            'max_pos': max_point[:2],
+            'mean': float(shifted_mean + self.shift),
+            'std': float(np.sqrt(max(0.0, variance))),
+        }
+
+    def statistics(self, boxes):
+        return [self.query(*box) for box in boxes]
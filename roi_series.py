@@ -0,0 +1,200 @@
+import argparse
+import csv
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import annotation_sidecar
+from raster_source import RasterSource
+from thermal_batch import collect_images
+from thermal_core import clip_box
+
+# The same boxes, regions and points measured on every frame of a series.
+#
+# For repeated inspections of the same panel rows or transformer bays the
+# annotations of one frame are a template. All frames of the template's size
+# are stacked into one memory-mapped (frames, height, width) float32 array,
+# then every box's min / mean / max over all frames comes from reductions
+# over the stack's (frames, box) slices (only the masked pixels for regions),
+# a chunk of frames at a time, instead of one measurement per box per frame.
+# The result is a long table: one row per frame and annotation.
+#
+#   python roi_series.py template.tif "D:\Flights\Bay_3" -o bay_3.csv
+
+# Frames reduced together (bounds the memory of a pass)
+CHUNK_FRAMES = 64
+
+# Threads decoding frames into the stack
+LOAD_WORKERS = min(8, os.cpu_count() or 1)
+
+COLUMNS = ('frame', 'image', 'annotation', 'kind', 'min', 'mean', 'max')
+
+
+def template_from_records(records):
+    # (name, kind, (x, y, width, height) | (x, y), region mask | None) of
+    # annotation_store records
+    return [(record.name, record.kind, record.coords, getattr(record, 'mask', None)) for record in records]
+
+
+def load_template(image_path):
+    saved = annotation_sidecar.load(image_path)
+    if saved is None or not saved['annotations']:
+        raise ValueError(f"No saved annotations for {os.path.basename(image_path)}")
+    return template_from_records(saved['annotations'])
+
+
+def _read_frame(path):
+    source = RasterSource(path, build_overviews=False)
+    try:
+        if not source.in_memory:
+            return None
+        return source.array
+    finally:
+        source.close()
+
+
+def stack_frames(paths, shape, stack_path, workers=LOAD_WORKERS):
+    # Decode the frames of `shape` into a .npy memory map; returns
+    # (stack, paths used). Frames of other sizes are skipped.
+    height, width = shape
+    stack = np.lib.format.open_memmap(stack_path, mode='w+', dtype=np.float32, shape=(len(paths), height, width))
+    used = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for path, frame in zip(paths, executor.map(_read_frame, paths)):
+            if frame is None or frame.shape != (height, width):
+                print(f"Skipped {os.path.basename(path)} (not a {width}x{height} frame)", file=sys.stderr)
+                continue
+            stack[len(used)] = frame
+            used.append(path)
+    stack.flush()
+    return stack[:len(used)], used
+
+
+def series_statistics(stack, template, chunk=CHUNK_FRAMES):
+    # {annotation index: (min, mean, max) arrays over the frames}
+    frames, height, width = stack.shape
+    regions = []
+    for _, kind, coords, mask in template:
+        if kind == 'point':
+            x1, y1, x2, y2 = clip_box((height, width), int(coords[0]), int(coords[1]), 1, 1)
+        else:
+            x1, y1, x2, y2 = clip_box((height, width), *coords)
+        if x2 <= x1 or y2 <= y1:
+            regions.append(None)
+            continue
+        if mask is not None:
+            # The part of a region's mask inside the frame
+            x, y = int(coords[0]), int(coords[1])
+            mask = mask[y1 - y:y2 - y, x1 - x:x2 - x]
+            if not mask.any():
+                regions.append(None)
+                continue
+        regions.append((x1, y1, x2, y2, mask))
+
+    results = {index: (np.full(frames, np.nan), np.full(frames, np.nan), np.full(frames, np.nan))
+               for index in range(len(template))}
+    for start in range(0, frames, chunk):
+        block = np.asarray(stack[start:start + chunk])
+        has_nan = np.isnan(block).any()
+        for index, region in enumerate(regions):
+            if region is None:
+                continue
+            x1, y1, x2, y2, mask = region
+            if mask is None:
+                values = block[:, y1:y2, x1:x2].reshape(block.shape[0], -1)
+            else:
+                values = block[:, y1:y2, x1:x2][:, mask]
+            minimum, mean, maximum = results[index]
+            if has_nan:
+                with warnings.catch_warnings():
+                    # All-NaN boxes (outside a frame's footprint) give NaN
+                    warnings.simplefilter('ignore', RuntimeWarning)
+                    minimum[start:start + chunk] = np.nanmin(values, axis=1)
+                    mean[start:start + chunk] = np.nanmean(values, axis=1, dtype=np.float64)
+                    maximum[start:start + chunk] = np.nanmax(values, axis=1)
+            else:
+                minimum[start:start + chunk] = values.min(axis=1)
+                mean[start:start + chunk] = values.mean(axis=1, dtype=np.float64)
+                maximum[start:start + chunk] = values.max(axis=1)
+    return results
+
+
+def series_rows(paths, template, results):
+    for frame, path in enumerate(paths):
+        for index, (name, kind, _, _) in enumerate(template):
+            minimum, mean, maximum = (values[frame] for values in results[index])
+            yield (frame, os.path.basename(path), name, kind,
+                   *(None if np.isnan(value) else round(float(value), 3) for value in (minimum, mean, maximum)))
+
+
+def write_table(out, rows):
+    writer = csv.writer(out)
+    writer.writerow(COLUMNS)
+    writer.writerows(rows)
+
+
+def run_series(template, paths, shape, out, stack_path, keep_stack=False, progress=None):
+    # Stack, measure and write the table; returns (frames, load seconds,
+    # statistics seconds)
+    start = time.perf_counter()
+    stack, used = stack_frames(paths, shape, stack_path)
+    mapping = stack._mmap
+    try:
+        loaded = time.perf_counter()
+        if progress is not None:
+            progress(f"{len(used)} frames stacked")
+        results = series_statistics(stack, template)
+        measured = time.perf_counter()
+        write_table(out, series_rows(used, template, results))
+    finally:
+        # Unmap before removing the file: Windows can't delete a mapped file.
+        # Arrays still viewing the map (e.g. held by a traceback) keep it
+        # open until they are collected, and the file is left behind.
+        del stack
+        try:
+            mapping.close()
+        except BufferError:
+            keep_stack = True
+        if not keep_stack:
+            os.remove(stack_path)
+    return len(used), loaded - start, measured - loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply the annotations of one frame to a series of frames")
+    parser.add_argument('template', help="Frame whose saved annotations are the template")
+    parser.add_argument('inputs', nargs='+', help="Image directories, files or glob patterns of the series")
+    parser.add_argument('-o', '--output', help="Output .csv (default: stdout)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="Search directories recursively")
+    parser.add_argument('--stack', help="Path of the memory-mapped frame stack (.npy, default: next to the output)")
+    parser.add_argument('--keep-stack', action='store_true', help="Keep the stack for later runs")
+    args = parser.parse_args(argv)
+
+    template = load_template(args.template)
+    paths = collect_images(args.inputs, recursive=args.recursive)
+    if not paths:
+        print("No TIFF images found", file=sys.stderr)
+        return 1
+    source = RasterSource(args.template, build_overviews=False)
+    shape = source.shape
+    source.close()
+    stack_path = args.stack or (os.path.splitext(args.output)[0] if args.output else "roi_series") + ".stack.npy"
+
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as out:
+            frames, load_s, stats_s = run_series(template, paths, shape, out, stack_path, args.keep_stack)
+    else:
+        frames, load_s, stats_s = run_series(template, paths, shape, sys.stdout, stack_path, args.keep_stack)
+
+    print(f"{len(template)} annotations on {frames} frames: stacked in {load_s:.1f} s "
+          f"({frames / max(load_s, 1e-9):.0f} frames/s), measured in {stats_s:.2f} s "
+          f"({frames / max(stats_s, 1e-9):.0f} frames/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
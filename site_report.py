@@ -0,0 +1,299 @@
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+from PIL import Image
+
+import annotation_sidecar
+from annotation_layer import record_items
+from exiftool_daemon import get_metadata_batch
+from export_renderer import render_view
+from pdf_writer import A4, Page, PdfWriter, fit_text
+from raster_source import RasterSource
+from thermal_batch import collect_images
+from thermal_core import format_decimal_degrees, format_date_taken
+
+# One PDF report for a whole site.
+#
+# Every box or region annotation saved with the images of a flight
+# (annotation_sidecar) is a finding. The report starts with the findings per
+# defect type and a summary table of all findings, followed by one page per
+# finding with its image (as exported by export_renderer) and measurements.
+# Only the small summary rows are kept in memory: each image is rendered,
+# downscaled, JPEG-encoded and written when its first finding's page is
+# reached, then dropped (pdf_writer streams every page to disk). Findings on
+# the same image and the logo on every page share one stored image.
+#
+#   python site_report.py "D:\Flights\Site_A" -o site_a.pdf --project "Solar Farm A" --logo logo.png
+
+# Longer side of stored images, in pixels (~200 dpi over the page width)
+IMAGE_MAX_SIZE = 1400
+
+MARGIN = 40
+ROW_HEIGHT = 14
+FONT_SIZE = 8
+LOGO_HEIGHT = 28
+HEADER_HEIGHT = LOGO_HEIGHT + 24  # Below the top margin, to the first line of the body
+DETAIL_HEIGHT = 13  # Lines of the project details on the first page
+
+SUMMARY_COLUMNS = (  # Heading, width in points
+    ('#', 24), ('Image', 130), ('Annotation', 80), ('Defect', 100), ('Min °C', 44), ('Avg °C', 44),
+    ('Max °C', 44), ('Page', 49),
+)
+TYPE_COLUMNS = (('Defect type', 240), ('Findings', 80), ('Max °C', 80))
+
+
+class Finding:
+    __slots__ = ('number', 'image_path', 'name', 'defect', 'location', 'min_temp', 'avg_temp', 'max_temp',
+                 'coord_text', 'image_taken', 'radiation', 'page')
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+
+def _format_temp(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def collect_findings(paths, overrides=None):
+    # Findings (one per saved box or region) of the images, in image order,
+    # and the report fields of the first image (with overrides applied)
+    overrides = {name: value for name, value in (overrides or {}).items() if value not in (None, '')}
+    saved = []
+    for path in paths:
+        if annotation_sidecar.has_sidecar(path):
+            data = annotation_sidecar.load(path)
+            boxes = [record for record in data['annotations'] if record.kind != 'point']
+            if boxes:
+                saved.append((path, dict(data['fields'], **overrides), boxes))
+    metadata = get_metadata_batch([path for path, _, _ in saved]) if saved else {}
+
+    findings = []
+    for path, fields, boxes in saved:
+        info = metadata.get(path) or {}
+        coord_text = "GPS: Unknown"
+        if info.get('lat') is not None and info.get('lon') is not None:
+            coord_text = format_decimal_degrees(info['lat'], info['lon'])
+        image_taken = "Date: Unknown"
+        if info.get('date_taken'):
+            try:
+                image_taken = format_date_taken(info['date_taken'])
+            except ValueError:
+                image_taken = info['date_taken']
+        for box in boxes:
+            findings.append(Finding(number=len(findings) + 1, image_path=path, name=box.name,
+                                    defect=fields.get('defect') or "Unspecified",
+                                    location=fields.get('location', ''), min_temp=box.min_temp,
+                                    avg_temp=box.avg_temp, max_temp=box.max_temp, coord_text=coord_text,
+                                    image_taken=image_taken, radiation=fields.get('radiation', '')))
+    fields = dict(saved[0][1]) if saved else dict(overrides)
+    return findings, fields
+
+
+def _render_image(path):
+    # The image's saved view with all its annotations, at most IMAGE_MAX_SIZE wide
+    data = annotation_sidecar.load(path)
+    display = data['display']
+    source = RasterSource(path, build_overviews=False)
+    try:
+        data_range = source.min_max()
+        view = display.get('view') or (0, 0, source.width, source.height)
+        scale = min(display.get('scale', 1.0), IMAGE_MAX_SIZE / max(1.0, view[2] - view[0], view[3] - view[1]))
+        return render_view(source, display.get('cmap', 'magma'), display.get('vmin', data_range[0]),
+                           display.get('vmax', data_range[1]), view=view,
+                           annotations=[record_items(record) for record in data['annotations']],
+                           scale=scale, data_range=data_range)
+    finally:
+        source.close()
+
+
+class SiteReport:
+    def __init__(self, writer, title, fields, logo=None):
+        self.writer = writer
+        self.title = title
+        self.fields = fields
+        self.logo = None
+        if logo:
+            self.logo = writer.add_image('logo', Image.open(logo), max_size=400)
+
+    def new_page(self, heading):
+        # Page with the logo, heading and footer drawn
+        page = Page()
+        width, height = A4
+        top = height - MARGIN
+        if self.logo:
+            name, logo_w, logo_h = self.logo
+            draw_w = LOGO_HEIGHT * logo_w / logo_h
+            page.image(name, width - MARGIN - draw_w, top - LOGO_HEIGHT, draw_w, LOGO_HEIGHT)
+        page.text(MARGIN, top - 16, fit_text(heading, width - 2 * MARGIN - 100, 14), size=14, bold=True)
+        page.line(MARGIN, top - LOGO_HEIGHT - 6, width - MARGIN, top - LOGO_HEIGHT - 6)
+        footer = " | ".join(value for value in (self.fields.get('project'), self.fields.get('location')) if value)
+        page.text(MARGIN, MARGIN / 2, fit_text(footer, 400, FONT_SIZE), size=FONT_SIZE)
+        page.text(width - MARGIN - 40, MARGIN / 2, f"Page {self.writer.page_count + 1}", size=FONT_SIZE)
+        return page, height - MARGIN - HEADER_HEIGHT
+
+    def table(self, page, y, columns, rows):
+        # Rows of text under `y` with a shaded heading row; returns the y below
+        x0 = MARGIN
+        total_w = sum(width for _, width in columns)
+        page.rect(x0, y - ROW_HEIGHT, total_w, ROW_HEIGHT, fill_gray=0.85)
+        for index, row in enumerate([[heading for heading, _ in columns]] + rows):
+            x = x0
+            for value, (_, width) in zip(row, columns):
+                page.text(x + 3, y - ROW_HEIGHT + 4, fit_text(value, width - 6, FONT_SIZE), size=FONT_SIZE,
+                          bold=index == 0)
+                x += width
+            y -= ROW_HEIGHT
+            page.line(x0, y, x0 + total_w, y, width=0.3, gray=0.6)
+        return y
+
+    def summary_pages(self, findings):
+        # Defect type counts and the summary table, continued over pages
+        counts = Counter(finding.defect for finding in findings)
+        hottest = {}
+        for finding in findings:
+            if finding.max_temp is not None:
+                hottest[finding.defect] = max(hottest.get(finding.defect, finding.max_temp), finding.max_temp)
+
+        page, y = self.new_page(self.title)
+        details = [("Project", self.fields.get('project', '')), ("Owner", self.fields.get('owner', '')),
+                   ("Location", self.fields.get('location', '')),
+                   ("Images", str(len({finding.image_path for finding in findings}))),
+                   ("Findings", str(len(findings))), ("Generated", datetime.now().strftime("%d/%m/%Y %H:%M"))]
+        for label, value in details:
+            page.text(MARGIN, y, f"{label}:", size=9, bold=True)
+            page.text(MARGIN + 70, y, fit_text(value, 400, 9), size=9)
+            y -= DETAIL_HEIGHT
+        y -= 10
+        page.text(MARGIN, y, "Findings by defect type", size=11, bold=True)
+        y -= 6
+
+        type_rows = [[defect, str(count), _format_temp(hottest.get(defect))] for defect, count in counts.most_common()]
+        summary_rows = [[str(f.number), os.path.basename(f.image_path), f.name, f.defect, _format_temp(f.min_temp),
+                         _format_temp(f.avg_temp), _format_temp(f.max_temp), str(f.page)] for f in findings]
+        summary_started = False
+        for index, (types, rows) in enumerate(summary_layout(findings)):
+            if index:
+                page, y = self.new_page(f"{self.title} (continued)")
+            if types:
+                y = self.table(page, y, TYPE_COLUMNS, type_rows[:types])
+                type_rows = type_rows[types:]
+            if rows:
+                if not summary_started:
+                    if types:
+                        y -= 18  # Below the defect type table
+                    page.text(MARGIN, y, "Summary", size=11, bold=True)
+                    y -= 6
+                    summary_started = True
+                self.table(page, y, SUMMARY_COLUMNS, summary_rows[:rows])
+                summary_rows = summary_rows[rows:]
+            self.writer.add_page(page)
+
+    def finding_page(self, finding, total):
+        page, y = self.new_page(f"Finding {finding.number} of {total}: {finding.defect}")
+        width = A4[0] - 2 * MARGIN
+        # Rendered for the first finding of an image only
+        name, image_w, image_h = self.writer.add_image(finding.image_path, lambda: _render_image(finding.image_path),
+                                                       max_size=IMAGE_MAX_SIZE)
+        draw_w = min(width, 460 * image_w / image_h)
+        draw_h = draw_w * image_h / image_w
+        page.image(name, MARGIN + (width - draw_w) / 2, y - draw_h, draw_w, draw_h)
+        y -= draw_h + 20
+        rows = [["Image", os.path.basename(finding.image_path)], ["Annotation", finding.name],
+                ["Defect type", finding.defect], ["Location", finding.location],
+                ["Coordinates", finding.coord_text], ["Image taken", finding.image_taken],
+                ["Min temperature", f"{_format_temp(finding.min_temp)} °C"],
+                ["Avg temperature", f"{_format_temp(finding.avg_temp)} °C"],
+                ["Max temperature", f"{_format_temp(finding.max_temp)} °C"],
+                ["Radiation", f"{finding.radiation} W/m²" if finding.radiation != '' else "-"]]
+        self.table(page, y, (('Item', 140), ('Value', width - 140)), rows)
+        self.writer.add_page(page)
+
+
+def summary_layout(findings):
+    # [defect type rows, summary table rows] on each summary page, so finding
+    # page numbers are known before anything is written. The first page also
+    # holds the details; both tables continue on the next page when they
+    # reach the bottom margin (same layout as summary_pages).
+    def rows_fitting(y):
+        return int((y - MARGIN) // ROW_HEIGHT) - 1  # Less the heading row
+
+    body_top = A4[1] - MARGIN - HEADER_HEIGHT
+    remaining = len({finding.defect for finding in findings})
+    y = body_top - 6 * DETAIL_HEIGHT - 10 - 6
+    pages = []
+    while True:
+        rows = min(remaining, max(1, rows_fitting(y)))
+        pages.append([rows, 0])
+        remaining -= rows
+        if remaining <= 0:
+            break
+        y = body_top
+    y -= (rows + 1) * ROW_HEIGHT + 18 + 6
+    if rows_fitting(y) < 1:
+        # No room left for the summary heading and a row
+        pages.append([0, 0])
+        y = body_top - 6
+
+    remaining = len(findings)
+    while True:
+        pages[-1][1] = min(remaining, max(1, rows_fitting(y)))
+        remaining -= pages[-1][1]
+        if remaining <= 0:
+            break
+        pages.append([0, 0])
+        y = body_top
+    return pages
+
+
+def write_site_report(path, findings, fields, title="Thermal Inspection Site Report", logo=None, progress=None):
+    # Stream the report to `path`; progress(done, total) after every finding
+    start_page = len(summary_layout(findings)) + 1
+    for index, finding in enumerate(findings):
+        finding.page = start_page + index
+    with PdfWriter(path, info={'Title': title, 'Producer': 'GIM R-Tiff Tools'}) as writer:
+        report = SiteReport(writer, title, fields, logo)
+        report.summary_pages(findings)
+        for index, finding in enumerate(findings):
+            report.finding_page(finding, len(findings))
+            if progress is not None:
+                progress(index + 1, len(findings))
+        return writer.page_count, writer.image_bytes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="One PDF site report for all annotated images of a flight")
+    parser.add_argument('inputs', nargs='+', help="Image directories, files or glob patterns")
+    parser.add_argument('-o', '--output', default="site_report.pdf", help="Output .pdf (default: site_report.pdf)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="Search directories recursively")
+    parser.add_argument('--title', default="Thermal Inspection Site Report", help="Report title")
+    parser.add_argument('--logo', help="Logo image shown on every page")
+    for name in annotation_sidecar.FIELDS:
+        parser.add_argument(f'--{name}', help=f"Report {name} for all images (default: as saved per image)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    overrides = {name: getattr(args, name) for name in annotation_sidecar.FIELDS}
+    findings, fields = collect_findings(collect_images(args.inputs, recursive=args.recursive), overrides)
+    if not findings:
+        print("No annotated images found", file=sys.stderr)
+        return 1
+
+    def progress(done, total):
+        if done % 25 == 0 or done == total:
+            print(f"{done}/{total} findings", file=sys.stderr)
+
+    pages, image_bytes = write_site_report(args.output, findings, fields, args.title, args.logo, progress)
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(args.output)
+    print(f"Wrote {args.output}: {len(findings)} findings, {pages} pages, {size / 1e6:.1f} MB "
+          f"({image_bytes / 1e6:.1f} MB images) in {elapsed:.1f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
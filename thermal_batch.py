@@ -0,0 +1,106 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from exiftool_daemon import BATCH_SIZE
+from thermal_core import analyze_image, read_metadata_batch
+
+# Headless batch analysis of a whole flight.
+#
+#   python thermal_batch.py D:\Flights\Site_A -o site_a.jsonl
+#   python thermal_batch.py "D:\Flights\Site_A\*_T.tif" --workers 8
+#
+# One JSON object per image is written per line (JSON Lines) with
+# min/max/mean/argmax, GPS and capture time.
+
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+
+def collect_images(inputs, recursive=False):
+    # Expand directories and glob patterns into a sorted, de-duplicated list
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, '**', '*') if recursive else os.path.join(item, '*')
+            candidates = glob.glob(pattern, recursive=recursive)
+        else:
+            candidates = glob.glob(item, recursive=recursive) or [item]
+        paths.extend(p for p in candidates
+                     if os.path.isfile(p) and p.lower().endswith(TIFF_EXTENSIONS))
+    return sorted(set(paths))
+
+
+def iter_records(paths, workers=None, with_metadata=True, percentiles=(),
+                 metadata_reader=read_metadata_batch):
+    # Fan the images out over a process pool and yield records in input order.
+    # Each worker is a separate interpreter, so decoding scales with cores;
+    # chunking keeps the inter-process overhead low for small frames.
+    # Metadata is extracted here in the parent by one exiftool daemon, a
+    # batch at a time, while the workers keep decoding in the background.
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, min(32, len(paths) // (workers * 4)))
+    task = partial(analyze_image, with_metadata=False, percentiles=tuple(percentiles))
+
+    metadata = {}
+    if workers == 1:
+        results = map(task, paths)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(task, paths, chunksize=chunksize)
+    try:
+        for index, record in enumerate(results):
+            if with_metadata:
+                if index % BATCH_SIZE == 0:
+                    metadata = metadata_reader(paths[index:index + BATCH_SIZE])
+                record.update(metadata[record['path']])
+            yield record
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def run_batch(paths, out, workers=None, with_metadata=True):
+    # Stream JSON Lines records to `out`, returns the number of failed images
+    errors = 0
+    for record in iter_records(paths, workers, with_metadata):
+        if 'error' in record:
+            errors += 1
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch analysis of thermal TIFF images (JSON Lines output)")
+    parser.add_argument('inputs', nargs='+', help="Image directories, files or glob patterns")
+    parser.add_argument('-o', '--output', help="Output .jsonl file (default: stdout)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Number of worker processes (default: all cores)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="Search directories recursively")
+    parser.add_argument('--no-metadata', action='store_true', help="Skip exiftool (GPS / capture time)")
+    args = parser.parse_args(argv)
+
+    paths = collect_images(args.inputs, recursive=args.recursive)
+    if not paths:
+        print("No TIFF images found", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as out:
+            errors = run_batch(paths, out, args.workers, not args.no_metadata)
+    else:
+        errors = run_batch(paths, sys.stdout, args.workers, not args.no_metadata)
+    elapsed = time.perf_counter() - start
+
+    print(f"Processed {len(paths)} images in {elapsed:.1f} s "
+          f"({len(paths) / elapsed:.1f} images/s, {errors} errors)", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
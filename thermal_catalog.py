@@ -0,0 +1,273 @@
+import argparse
+import json
+import math
+import os
+import sqlite3
+import sys
+import time
+
+from exiftool_daemon import get_metadata_batch
+from thermal_batch import collect_images, iter_records
+
+# Queryable on-disk catalog (SQLite) of a flight: GPS, altitude, capture time,
+# temperature statistics and dimensions per image.
+#
+#   python thermal_catalog.py site_a.db index D:\Flights\Site_A
+#   python thermal_catalog.py site_a.db query --min-max 75 --near 13.7563,100.5018 --radius 200 --sort delta
+#
+# Indexing is incremental: files whose mtime and size are unchanged since the
+# last run are skipped, the rest are analyzed in parallel.
+
+PERCENTILES = (5, 50, 95)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    lat REAL,
+    lon REAL,
+    altitude REAL,
+    captured TEXT,          -- 'YYYY-MM-DD HH:MM:SS', sortable
+    min_temp REAL,
+    max_temp REAL,
+    mean_temp REAL,
+    p5 REAL,
+    p50 REAL,
+    p95 REAL,
+    delta_t REAL,           -- max_temp - p50 (hot spot over median background)
+    argmax_x INTEGER,
+    argmax_y INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_images_max_temp ON images (max_temp);
+CREATE INDEX IF NOT EXISTS idx_images_delta_t ON images (delta_t);
+CREATE INDEX IF NOT EXISTS idx_images_lat_lon ON images (lat, lon);
+CREATE INDEX IF NOT EXISTS idx_images_captured ON images (captured);
+"""
+
+COLUMNS = ('path', 'mtime_ns', 'size', 'width', 'height', 'lat', 'lon', 'altitude', 'captured',
+           'min_temp', 'max_temp', 'mean_temp', 'p5', 'p50', 'p95', 'delta_t',
+           'argmax_x', 'argmax_y', 'error')
+
+# Filled in from exiftool; kept as stored when an index runs without metadata
+METADATA_COLUMNS = ('lat', 'lon', 'altitude', 'captured')
+
+SORT_COLUMNS = {
+    'delta': 'delta_t DESC',
+    'max': 'max_temp DESC',
+    'min': 'min_temp ASC',
+    'time': 'captured ASC',
+    'path': 'path ASC',
+}
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    # Great-circle (haversine) distance in meters
+    if lat1 is None or lon1 is None:
+        return None
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def open_catalog(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    conn.create_function("distance_m", 4, distance_m, deterministic=True)
+    return conn
+
+
+def _iso_captured(date_str):
+    # exiftool "2024:02:13 15:30:45" -> "2024-02-13 15:30:45"
+    if not date_str:
+        return None
+    date_part, _, time_part = date_str.partition(' ')
+    return f"{date_part.replace(':', '-')} {time_part[:8]}".strip()
+
+
+def _catalog_metadata(paths):
+    metadata = get_metadata_batch(paths)
+    return {path: {'lat': m['lat'], 'lon': m['lon'], 'altitude': m['altitude'],
+                   'captured': _iso_captured(m['date_taken'])}
+            for path, m in metadata.items()}
+
+
+def _row(record, stat):
+    row = {
+        'path': record['path'],
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'width': record.get('width'),
+        'height': record.get('height'),
+        'lat': record.get('lat'),
+        'lon': record.get('lon'),
+        'altitude': record.get('altitude'),
+        'captured': record.get('captured'),
+        'min_temp': record.get('min'),
+        'max_temp': record.get('max'),
+        'mean_temp': record.get('mean'),
+        'p5': record.get('p5'),
+        'p50': record.get('p50'),
+        'p95': record.get('p95'),
+        'delta_t': None,
+        'argmax_x': record['argmax'][0] if 'argmax' in record else None,
+        'argmax_y': record['argmax'][1] if 'argmax' in record else None,
+        'error': record.get('error'),
+    }
+    if row['max_temp'] is not None and row['p50'] is not None:
+        row['delta_t'] = row['max_temp'] - row['p50']
+    return tuple(row[column] for column in COLUMNS)
+
+
+def update_catalog(conn, paths, workers=None, with_metadata=True, prune=False, progress=None):
+    # Add new / changed images to the catalog, and retry the ones that
+    # failed before. Returns (indexed, skipped, removed).
+    paths = [os.path.abspath(p) for p in paths]
+    known = {row['path']: (row['mtime_ns'], row['size'])
+             for row in conn.execute("SELECT path, mtime_ns, size FROM images WHERE error IS NULL")}
+
+    stats = {}
+    for path in paths:
+        stat = os.stat(path)
+        if known.get(path) != (stat.st_mtime_ns, stat.st_size):
+            stats[path] = stat
+    changed = list(stats)
+
+    removed = 0
+    if prune:
+        gone = {row['path'] for row in conn.execute("SELECT path FROM images")} - set(paths)
+        conn.executemany("DELETE FROM images WHERE path = ?", [(p,) for p in gone])
+        removed = len(gone)
+
+    # Without metadata, the GPS / capture columns of known images are kept
+    updated = [column for column in COLUMNS
+               if column != 'path' and (with_metadata or column not in METADATA_COLUMNS)]
+    insert = (f"INSERT INTO images ({', '.join(COLUMNS)}) "
+              f"VALUES ({', '.join('?' * len(COLUMNS))}) "
+              f"ON CONFLICT (path) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in updated)}")
+    pending = []
+    records = iter_records(changed, workers, with_metadata, PERCENTILES,
+                           metadata_reader=_catalog_metadata)
+    for count, record in enumerate(records, 1):
+        pending.append(_row(record, stats[record['path']]))
+        # Commit in chunks so an interrupted run keeps what it already did
+        if len(pending) >= 256:
+            with conn:
+                conn.executemany(insert, pending)
+            pending.clear()
+        if progress:
+            progress(count, len(changed))
+    with conn:
+        conn.executemany(insert, pending)
+    return len(changed), len(paths) - len(changed), removed
+
+
+def query_images(conn, min_max_temp=None, min_delta_t=None, near=None, radius_m=None,
+                 captured_from=None, captured_to=None, sort='delta', limit=None):
+    # Filter the catalog; `near` is (lat, lon) and needs `radius_m`.
+    # The radius is first turned into a lat/lon bounding box so the
+    # (lat, lon) index does the heavy lifting, then refined exactly.
+    clauses = ["error IS NULL"]
+    params = []
+    select = "*"
+    if min_max_temp is not None:
+        clauses.append("max_temp > ?")
+        params.append(min_max_temp)
+    if min_delta_t is not None:
+        clauses.append("delta_t > ?")
+        params.append(min_delta_t)
+    if captured_from:
+        clauses.append("captured >= ?")
+        params.append(captured_from)
+    if captured_to:
+        clauses.append("captured <= ?")
+        params.append(captured_to)
+    if near is not None:
+        if radius_m is None:
+            raise ValueError("radius_m is required together with near")
+        lat0, lon0 = near
+        dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+        dlon = dlat / max(math.cos(math.radians(lat0)), 1e-6)
+        clauses.append("lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?")
+        params.extend([lat0 - dlat, lat0 + dlat, lon0 - dlon, lon0 + dlon])
+        clauses.append("distance_m(lat, lon, ?, ?) <= ?")
+        params.extend([lat0, lon0, radius_m])
+        select = "*, distance_m(lat, lon, ?, ?) AS distance"
+        params = [lat0, lon0] + params
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Unknown sort key: {sort}")
+
+    sql = f"SELECT {select} FROM images WHERE {' AND '.join(clauses)} ORDER BY {SORT_COLUMNS[sort]}"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return [dict(row) for row in conn.execute(sql, params)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SQLite catalog of thermal images")
+    parser.add_argument('database', help="Catalog file (.db), created if missing")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    index_parser = commands.add_parser('index', help="Add new or changed images")
+    index_parser.add_argument('inputs', nargs='+', help="Image directories, files or glob patterns")
+    index_parser.add_argument('-j', '--workers', type=int, default=None, help="Number of worker processes")
+    index_parser.add_argument('-r', '--recursive', action='store_true', help="Search directories recursively")
+    index_parser.add_argument('--no-metadata', action='store_true', help="Skip exiftool (GPS / capture time)")
+    index_parser.add_argument('--prune', action='store_true', help="Remove catalog entries not found in the inputs")
+
+    query_parser = commands.add_parser('query', help="Search the catalog")
+    query_parser.add_argument('--min-max', type=float, help="Only images with max temperature above this (°C)")
+    query_parser.add_argument('--min-delta', type=float, help="Only images with ΔT above this (°C)")
+    query_parser.add_argument('--near', help="lat,lon in decimal degrees")
+    query_parser.add_argument('--radius', type=float, default=100.0, help="Search radius around --near in meters")
+    query_parser.add_argument('--from', dest='captured_from', help="Captured at or after 'YYYY-MM-DD[ HH:MM:SS]'")
+    query_parser.add_argument('--to', dest='captured_to', help="Captured at or before 'YYYY-MM-DD[ HH:MM:SS]'")
+    query_parser.add_argument('--sort', choices=sorted(SORT_COLUMNS), default='delta')
+    query_parser.add_argument('--limit', type=int)
+    query_parser.add_argument('--json', action='store_true', help="Print JSON Lines instead of a table")
+    args = parser.parse_args(argv)
+
+    conn = open_catalog(args.database)
+    if args.command == 'index':
+        paths = collect_images(args.inputs, recursive=args.recursive)
+        start = time.perf_counter()
+        indexed, skipped, removed = update_catalog(conn, paths, args.workers,
+                                                   not args.no_metadata, args.prune)
+        elapsed = time.perf_counter() - start
+        print(f"Indexed {indexed} images, {skipped} unchanged, {removed} removed in {elapsed:.1f} s",
+              file=sys.stderr)
+        return 0
+
+    near = None
+    if args.near:
+        lat, lon = (float(v) for v in args.near.split(','))
+        near = (lat, lon)
+    start = time.perf_counter()
+    rows = query_images(conn, args.min_max, args.min_delta, near, args.radius if near else None,
+                        args.captured_from, args.captured_to, args.sort, args.limit)
+    elapsed = time.perf_counter() - start
+    for row in rows:
+        if args.json:
+            print(json.dumps(row, ensure_ascii=False))
+        else:
+            distance = f"  {row['distance']:7.1f} m" if 'distance' in row else ""
+            print(f"{row['max_temp']:6.1f} °C  ΔT {row['delta_t']:5.1f}  "
+                  f"{row['captured'] or '-':19}{distance}  {row['path']}")
+    print(f"{len(rows)} images in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
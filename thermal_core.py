@@ -0,0 +1,321 @@
+import sys
+import warnings
+
+import numpy as np
+import rasterio
+
+from exiftool_daemon import get_metadata, get_metadata_batch
+
+# GUI-free core of the Thermal Image Viewer.
+# Everything in here works on plain arrays / paths so it can be used from the
+# Tk application as well as from headless tools (see thermal_batch.py).
+# Diagnostics go to stderr so they never mix with machine-readable stdout.
+
+
+def read_thermal_band(tiff_path):
+    # Read the first band of a (radiometric) TIFF as a 2-D temperature array.
+    # Nodata pixels (outside a mosaic's footprint) become NaN, as in
+    # RasterSource, so statistics leave them out.
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=rasterio.errors.NotGeoreferencedWarning)
+        with rasterio.open(tiff_path) as dataset:
+            data = dataset.read(1)
+            nodata = dataset.nodata
+    if nodata is None:
+        return data
+    if not np.issubdtype(data.dtype, np.floating):
+        data = data.astype(np.float32)
+    data[data == nodata] = np.nan
+    return data
+
+
+def parse_decimal_degrees(gps_str):
+    # Convert an exiftool "GPS Position" string such as
+    # 13 deg 45' 12.34" N, 100 deg 30' 1.00" E  ->  (13.753428, 100.500278)
+    lat_str, lon_str = gps_str.split(',')
+
+    # Process latitude
+    lat_parts = lat_str.strip().split()
+    lat_deg = float(lat_parts[0])
+    lat_min = float(lat_parts[2].replace("'", ""))
+    lat_sec = float(lat_parts[3].replace('"', ""))
+    lat_dir = lat_parts[4]
+
+    # Process longitude
+    lon_parts = lon_str.strip().split()
+    lon_deg = float(lon_parts[0])
+    lon_min = float(lon_parts[2].replace("'", ""))
+    lon_sec = float(lon_parts[3].replace('"', ""))
+    lon_dir = lon_parts[4]
+
+    # Convert to decimal degrees
+    lat_decimal = lat_deg + (lat_min / 60) + (lat_sec / 3600)
+    lon_decimal = lon_deg + (lon_min / 60) + (lon_sec / 3600)
+
+    # Apply direction
+    if lat_dir == 'S':
+        lat_decimal = -lat_decimal
+    if lon_dir == 'W':
+        lon_decimal = -lon_decimal
+
+    return lat_decimal, lon_decimal
+
+
+def format_decimal_degrees(lat, lon):
+    return f"{lat:.6f}°, {lon:.6f}°"
+
+
+def convert_to_decimal_degrees(gps_str):
+    try:
+        return format_decimal_degrees(*parse_decimal_degrees(gps_str))
+    except Exception as e:
+        print(f"Error converting GPS coordinates: {e}", file=sys.stderr)
+    return "GPS: Unknown"
+
+
+def format_date_taken(date_str):
+    # Format an EXIF date ("2024:02:13 15:30:45") as DD/MM/YYYY HH:mm:ss.
+    # Raises ValueError if the string is not in the expected format.
+    date_part, time_part = date_str.split()
+    year, month, day = date_part.split(':')
+    return f"{day}/{month}/{year} {time_part}"
+
+
+def clip_box(shape, x_start, y_start, width, height):
+    # Integer pixel bounds (x1, y1, x2, y2) of a box clipped to an image shape
+    x1 = max(0, int(x_start))
+    y1 = max(0, int(y_start))
+    x2 = min(shape[1], int(x_start + width))
+    y2 = min(shape[0], int(y_start + height))
+    return x1, y1, x2, y2
+
+
+def _has_nan(data):
+    return np.issubdtype(data.dtype, np.floating) and np.isnan(np.sum(data, dtype=np.float64))
+
+
+def find_min_max_temps(thermal_data, x_start, y_start, width, height):
+    x1, y1, x2, y2 = clip_box(thermal_data.shape, x_start, y_start, width, height)
+
+    # Get the region of interest
+    region = thermal_data[y1:y2, x1:x2]
+
+    if region.size == 0:
+        return (None, None, None), (None, None, None)
+
+    # argmin/argmax return the first occurrence in row-major order.
+    # Nodata pixels of mosaics are NaN and are ignored.
+    argmin, argmax = np.argmin, np.argmax
+    if _has_nan(region):
+        if np.isnan(region).all():
+            return (None, None, None), (None, None, None)
+        argmin, argmax = np.nanargmin, np.nanargmax
+    min_y, min_x = np.unravel_index(argmin(region), region.shape)
+    max_y, max_x = np.unravel_index(argmax(region), region.shape)
+
+    # Convert back to image coordinates
+    return ((int(min_x) + x1, int(min_y) + y1, region[min_y, min_x]),
+            (int(max_x) + x1, int(max_y) + y1, region[max_y, max_x]))
+
+
+def find_box_average_temp(thermal_data, x_start, y_start, width, height):
+    x1, y1, x2, y2 = clip_box(thermal_data.shape, x_start, y_start, width, height)
+    region = thermal_data[y1:y2, x1:x2]
+
+    if region.size == 0:
+        return None
+
+    if _has_nan(region):
+        if np.isnan(region).all():
+            return None
+        return np.nanmean(region)
+    return np.mean(region)
+
+
+def _percentiles_of_partitioned(values, percentiles):
+    # np.percentile's default 'linear' rule on an array already partitioned
+    # at all the needed ranks
+    n = values.size
+    result = []
+    for q in percentiles:
+        rank = (n - 1) * q / 100.0
+        lower = int(np.floor(rank))
+        upper = min(lower + 1, n - 1)
+        fraction = rank - lower
+        result.append(float(values[lower] + (values[upper] - values[lower]) * fraction))
+    return result
+
+
+def _percentile_ranks(n, percentiles):
+    ranks = set()
+    for q in percentiles:
+        rank = (n - 1) * q / 100.0
+        ranks.add(int(np.floor(rank)))
+        ranks.add(min(int(np.floor(rank)) + 1, n - 1))
+    return sorted(ranks)
+
+
+def _order_statistics(values, percentiles):
+    # Median and percentiles of a 1-D float64 array (partitioned in place)
+    wanted = (50,) + tuple(percentiles)
+    values.partition(_percentile_ranks(values.size, wanted))
+    median, *percentile_values = _percentiles_of_partitioned(values, wanted)
+    stats = {'median': median}
+    for q, value in zip(percentiles, percentile_values):
+        stats[f"p{q:g}"] = value
+    return stats
+
+
+def roi_percentiles(thermal_data, x_start, y_start, width, height, percentiles=(5, 95)):
+    # Only the order statistics (median, 'p5', ...) of a box, for callers that
+    # get the rest from an index; None if the box holds no data
+    x1, y1, x2, y2 = clip_box(thermal_data.shape, x_start, y_start, width, height)
+    values = thermal_data[y1:max(y2, y1), x1:max(x2, x1)].astype(np.float64).ravel()
+    if _has_nan(values):
+        values = values[~np.isnan(values)]
+    if values.size == 0:
+        return None
+    return _order_statistics(values, percentiles)
+
+
+def roi_statistics(thermal_data, boxes, percentiles=(5, 95), offset=(0, 0)):
+    # Statistics of many (x, y, width, height) boxes of one image.
+    # Per box: pixel count, min/max with their (x, y) positions (first
+    # occurrence in row-major order), mean, std, median and the requested
+    # percentiles ('p5', 'p95', ...). Positions are shifted by `offset` for
+    # arrays that are a window of a larger image. Empty boxes give None.
+    #
+    # The box is scanned for argmin and argmax, copied once to float64, then
+    # sum, sum of squares and a single multi-rank partition give everything
+    # else (instead of separate min / max / where / mean / median scans).
+    results = []
+    for x_start, y_start, width, height in boxes:
+        x1, y1, x2, y2 = clip_box(thermal_data.shape, x_start, y_start, width, height)
+        region = thermal_data[y1:max(y2, y1), x1:max(x2, x1)]
+        if region.size == 0:
+            results.append(None)
+            continue
+
+        values = region.astype(np.float64).ravel()
+        argmin, argmax = np.argmin, np.argmax
+        if _has_nan(region):
+            # Nodata pixels of mosaics are NaN and are ignored
+            valid = ~np.isnan(values)
+            if not valid.any():
+                results.append(None)
+                continue
+            argmin, argmax = np.nanargmin, np.nanargmax
+            values = values[valid]
+        min_index = argmin(region)
+        max_index = argmax(region)
+        min_y, min_x = divmod(int(min_index), region.shape[1])
+        max_y, max_x = divmod(int(max_index), region.shape[1])
+
+        n = values.size
+        total = values.sum()
+        mean = total / n
+        variance = max(0.0, float(np.dot(values, values)) / n - mean * mean)
+
+        stats = {
+            'count': int(n),
+            'min': float(region[min_y, min_x]),
+            'min_pos': (min_x + x1 + offset[0], min_y + y1 + offset[1]),
+            'max': float(region[max_y, max_x]),
+            'max_pos': (max_x + x1 + offset[0], max_y + y1 + offset[1]),
+            'mean': float(mean),
+            'std': float(np.sqrt(variance)),
+        }
+        stats.update(_order_statistics(values, percentiles))
+        results.append(stats)
+    return results
+
+
+def mask_statistics(region, mask, percentiles=(5, 95), offset=(0, 0)):
+    # Statistics of the pixels of `region` where `mask` is set (a region
+    # ROI), with the same keys as roi_statistics(); positions are shifted by
+    # `offset`. None if the mask holds no data.
+    indices = np.flatnonzero(mask)
+    values = region.ravel()[indices].astype(np.float64)
+    if _has_nan(values):
+        valid = ~np.isnan(values)
+        indices, values = indices[valid], values[valid]
+    if values.size == 0:
+        return None
+    min_y, min_x = divmod(int(indices[np.argmin(values)]), region.shape[1])
+    max_y, max_x = divmod(int(indices[np.argmax(values)]), region.shape[1])
+
+    n = values.size
+    mean = values.sum() / n
+    variance = max(0.0, float(np.dot(values, values)) / n - mean * mean)
+    stats = {
+        'count': int(n),
+        'min': float(region[min_y, min_x]),
+        'min_pos': (min_x + offset[0], min_y + offset[1]),
+        'max': float(region[max_y, max_x]),
+        'max_pos': (max_x + offset[0], max_y + offset[1]),
+        'mean': float(mean),
+        'std': float(np.sqrt(variance)),
+    }
+    stats.update(_order_statistics(values, percentiles))
+    return stats
+
+
+def image_statistics(thermal_data, percentiles=()):
+    # Whole-frame statistics; positions are (x, y) pixel coordinates.
+    # Requested percentiles are added as 'p5', 'p50', ... keys. NaN pixels
+    # (nodata, see read_thermal_band) are left out.
+    masked = np.issubdtype(thermal_data.dtype, np.floating) and np.isnan(thermal_data).any()
+    argmin, argmax, mean, percentile = ((np.nanargmin, np.nanargmax, np.nanmean, np.nanpercentile) if masked else
+                                        (np.argmin, np.argmax, np.mean, np.percentile))
+    min_y, min_x = np.unravel_index(argmin(thermal_data), thermal_data.shape)
+    max_y, max_x = np.unravel_index(argmax(thermal_data), thermal_data.shape)
+    stats = {
+        'width': int(thermal_data.shape[1]),
+        'height': int(thermal_data.shape[0]),
+        'min': float(thermal_data[min_y, min_x]),
+        'max': float(thermal_data[max_y, max_x]),
+        'mean': float(mean(thermal_data, dtype=np.float64)),
+        'argmin': [int(min_x), int(min_y)],
+        'argmax': [int(max_x), int(max_y)],
+    }
+    if percentiles:
+        values = percentile(thermal_data, percentiles)
+        for q, value in zip(percentiles, values):
+            stats[f"p{q:g}"] = float(value)
+    return stats
+
+
+def _format_metadata(metadata):
+    metadata = dict(metadata)
+    if metadata['date_taken']:
+        try:
+            metadata['date_taken'] = format_date_taken(metadata['date_taken'])
+        except ValueError:
+            pass  # Keep exiftool's original format
+    return metadata
+
+
+def read_metadata(tiff_path):
+    # GPS (signed decimal degrees), altitude (m ASL) and capture time of one
+    # image. Served by the shared exiftool daemon and cached per path/mtime.
+    return _format_metadata(get_metadata(tiff_path))
+
+
+def read_metadata_batch(paths):
+    # Same as read_metadata for many files with one exiftool request per batch
+    return {path: _format_metadata(metadata)
+            for path, metadata in get_metadata_batch(paths).items()}
+
+
+def analyze_image(tiff_path, with_metadata=True, percentiles=()):
+    # Full headless analysis of one image as a JSON-serialisable dict.
+    # Errors are reported in the record instead of raised so one bad frame
+    # doesn't abort a whole flight.
+    record = {'path': tiff_path}
+    try:
+        record.update(image_statistics(read_thermal_band(tiff_path), percentiles))
+        if with_metadata:
+            record.update(read_metadata(tiff_path))
+    except Exception as e:
+        record['error'] = str(e)
+    return record
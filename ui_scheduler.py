@@ -0,0 +1,90 @@
+import time
+from collections import OrderedDict
+
+# Frame-budgeted coalescing of UI work.
+#
+# Tk delivers slider, motion, wheel and <Configure> events far faster than the
+# figure can be redrawn. Instead of doing the work in each handler, handlers
+# request a job under a key; all jobs requested before the next frame tick run
+# once, with the latest arguments. Older arguments for the same key are
+# dropped (or combined with `merge`, e.g. to sum wheel steps).
+
+# ~60 frames per second
+FRAME_MS = 16
+
+
+class FrameScheduler:
+    def __init__(self, root, frame_ms=FRAME_MS):
+        self.root = root
+        self.frame_ms = frame_ms
+        self._jobs = OrderedDict()  # key -> (callback, args)
+        self._after_id = None
+        self._last_frame = 0.0
+        self.stats = {
+            'requested': 0,    # Jobs requested by event handlers
+            'coalesced': 0,    # Requests merged into a job already pending
+            'executed': 0,     # Jobs actually run
+            'dropped': 0,      # Pending jobs cancelled before they ran
+            'frames': 0,       # Frame ticks that ran jobs
+            'over_budget': 0,  # Frames whose jobs took longer than frame_ms
+        }
+
+    def request(self, key, callback, *args, merge=None):
+        # Run callback(*args) in the next frame; a later request with the same
+        # key replaces the arguments (or merge(old_args, new_args) combines them)
+        self.stats['requested'] += 1
+        pending = self._jobs.get(key)
+        if pending is not None:
+            self.stats['coalesced'] += 1
+            if merge is not None:
+                args = merge(pending[1], args)
+        self._jobs[key] = (callback, args)
+        if self._after_id is None:
+            elapsed_ms = (time.perf_counter() - self._last_frame) * 1000
+            self._after_id = self.root.after(max(1, int(self.frame_ms - elapsed_ms)), self._run_frame)
+
+    def pending(self, key):
+        return key in self._jobs
+
+    def cancel(self, key):
+        if self._jobs.pop(key, None) is not None:
+            self.stats['dropped'] += 1
+
+    def flush(self, key):
+        # Run a pending job now (e.g. the final pan step on mouse release)
+        job = self._jobs.pop(key, None)
+        if job is not None:
+            self._execute(key, *job)
+
+    def _execute(self, key, callback, args):
+        self.stats['executed'] += 1
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"Error in scheduled {key}: {e}")
+
+    def _run_frame(self):
+        self._after_id = None
+        self._last_frame = start = time.perf_counter()
+        if not self._jobs:
+            return
+        self.stats['frames'] += 1
+        # Jobs requested while the frame runs (e.g. a label update asking for
+        # a render) still run in this frame, but every key at most once
+        ran = set()
+        while True:
+            ready = [key for key in self._jobs if key not in ran]
+            if not ready:
+                break
+            for key in ready:
+                callback, args = self._jobs.pop(key)
+                ran.add(key)
+                self._execute(key, callback, args)
+        if (time.perf_counter() - start) * 1000 > self.frame_ms:
+            self.stats['over_budget'] += 1
+
+    def summary(self):
+        stats = self.stats
+        return (f"UI frames: {stats['frames']}, jobs executed: {stats['executed']} of "
+                f"{stats['requested']} requested ({stats['coalesced']} coalesced, "
+                f"{stats['dropped']} dropped), {stats['over_budget']} frames over budget")